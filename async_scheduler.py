@@ -0,0 +1,270 @@
+import asyncio
+from datetime import datetime, timedelta
+import logging
+import os
+import signal
+import httpx
+from dotenv import load_dotenv
+from pytz import timezone
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from database.async_db import init_async_db
+from database.managers.async_manager import AsyncManager
+from utils.async_tasks import (
+    analyze_async, combine_results_async, save_analysis_result_async, send_analysis_result_async)
+from utils.env import env_flag, env_int
+from utils.logging_setup import log_context
+from utils.pipeline import ChatDag
+from utils.run_ledger import track_run_async
+from utils.slots import build_hour_plan
+
+load_dotenv()
+# Настройка таймзоны Новосибирска
+novosibirsk_tz = timezone('Asia/Novosibirsk')
+
+# Сколько чатов одновременно обрабатывается на одном цикле событий
+ASYNC_CONCURRENCY = env_int('ASYNC_CONCURRENCY', 100)
+SCHEDULE_SPREAD_MINUTES = env_int('SCHEDULE_SPREAD_MINUTES', 0)
+SCHEDULE_SPREAD_MODE = os.getenv('SCHEDULE_SPREAD_MODE', 'hash')
+ANALYSIS_WAIT_MINUTES = env_int('ANALYSIS_WAIT_MINUTES', 60)
+# Сколько секунд при остановке ждать выполняющиеся анализы и отправки
+SHUTDOWN_DRAIN_SECONDS = env_int('SHUTDOWN_DRAIN_SECONDS', 60)
+
+# Возможности синхронного планировщика, которых асинхронный режим не реализует:
+# (переменная, значение по умолчанию). Включённая — ошибка при старте, а не молчаливый пропуск
+UNSUPPORTED_SETTINGS = (
+    ('INCREMENTAL_ANALYSIS', False),
+    ('BATCH_SMALL_CHATS', False),
+    ('DIGEST_MODE', False),
+    ('EARLY_START', False),
+    ('LLM_CHECKPOINTS', True),
+)
+
+scheduler = AsyncIOScheduler(timezone='Asia/Novosibirsk')
+
+_state = {
+    "session_factory": None,
+    "client": None,
+    "semaphore": None,
+    "plan": None,
+}
+_plan_lock = asyncio.Lock()
+chat_dag = ChatDag()
+# Ссылки на фоновые задачи, чтобы их не собрал сборщик мусора
+_background_tasks = set()
+
+
+async def get_hour_plan(now):
+    """
+    Возвращает план запусков на текущий час (см. scheduler.get_hour_plan).
+    """
+    key = now.strftime('%Y-%m-%dT%H')
+    async with _plan_lock:
+        plan = _state["plan"]
+        if plan is None or plan.key != key:
+            async with _state["session_factory"]() as session:
+                manager = AsyncManager(session)
+                chats = await manager.get_all_chats()
+                volumes = {}
+                if SCHEDULE_SPREAD_MODE == 'load':
+                    now_utc = datetime.utcnow()
+                    for chat in chats:
+                        if chat.schedule_analysis and chat.analysis_time and chat.analysis_time.hour == now.hour:
+                            volumes[chat.chat_id] = await manager.count_messages(
+                                chat.chat_id, now_utc - timedelta(days=1), now_utc)
+            new_plan = build_hour_plan(
+                key, chats, now.hour, SCHEDULE_SPREAD_MINUTES,
+                mode=SCHEDULE_SPREAD_MODE, volume_fn=lambda chat_id: volumes.get(chat_id, 0))
+            if plan is None:
+                new_plan.drop_before(now.minute)
+            else:
+                new_plan.carry_over(plan.take_due_analyses(59))
+            for chat_id in new_plan.analysis_slots:
+                chat_dag.expect(chat_id, 'analysis', key)
+            _state["plan"] = new_plan
+            logging.info(f"""План на {key}: анализов {len(new_plan.analysis_slots)}, отправок {
+                         len(new_plan.send_slots)}.""")
+        return _state["plan"]
+
+
+async def execute_analysis_async(chat_id, analysis_time):
+    """
+    Выполняет и сохраняет анализ чата; по завершении запускает ожидающую отправку.
+    """
+    try:
+        async with _state["semaphore"]:
+            with log_context(job='analysis', chat_id=chat_id):
+                logging.info("Выполнение анализа для чата %s в %s.", chat_id, analysis_time)
+                async with track_run_async('analysis', chat_id, _state["session_factory"]) as run:
+                    async with _state["session_factory"]() as session:
+                        data = await analyze_async(session, _state["client"], chat_id, analysis_time)
+                        await save_analysis_result_async(session, data)
+                    if run:
+                        run.set_counts(
+                            tokens_input=sum(item["tokens_input"] or 0 for item in data),
+                            tokens_output=sum(item["tokens_output"] or 0 for item in data))
+                        if not any(item["analysis_result"] for item in data):
+                            run.outcome = 'empty'
+                logging.info("Анализ завершён для чата %s.", chat_id)
+    except Exception as e:
+        logging.error(f"Ошибка при выполнении анализа для чата {chat_id}: {e}")
+    finally:
+        for ready_chat_id, _ in chat_dag.complete(chat_id, 'analysis'):
+            task = asyncio.create_task(send_chat_result_async(ready_chat_id))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+
+
+async def send_chat_result_async(chat_id):
+    """
+    Отправляет последний результат анализа чата за сутки.
+    """
+    try:
+        async with _state["semaphore"]:
+            with log_context(job='send', chat_id=chat_id):
+                async with track_run_async('send', chat_id, _state["session_factory"]):
+                    await _send_chat_result(chat_id)
+    except Exception as e:
+        logging.error(f"Ошибка при выполнении задачи для чата {chat_id}: {e}", exc_info=True)
+
+
+async def _send_chat_result(chat_id):
+    async with _state["session_factory"]() as session:
+        # Результаты за последние 24 часа (по одному на промпт)
+        analysis_results = await AsyncManager(session).get_today_analyses(chat_id)
+        text = await combine_results_async(
+            session, chat_id, analysis_results) if analysis_results else None
+        if not text:
+            logging.warning(f"""Результат анализа для чата {
+                            chat_id} за последние 24 часа не найден.""")
+            text = "Результат анализа не найден."
+        await send_analysis_result_async(session, _state["client"], chat_id, text)
+
+
+async def check_and_execute_tasks_async():
+    """
+    Запускает анализы, чей слот наступил, параллельно (не больше ASYNC_CONCURRENCY).
+    """
+    now = datetime.now(novosibirsk_tz)
+    try:
+        plan = await get_hour_plan(now)
+        tasks_to_execute = plan.take_due_analyses(now.minute)
+        if tasks_to_execute:
+            logging.info(f"Найдено {len(tasks_to_execute)} задач для выполнения.")
+            await asyncio.gather(*(
+                execute_analysis_async(chat_id, analysis_time)
+                for chat_id, analysis_time in tasks_to_execute
+            ))
+    except Exception as e:
+        logging.error(f"Ошибка при проверке задач: {e}")
+
+
+async def send_tasks_async():
+    """
+    Отправляет результаты, чей слот наступил; ожидающие анализ уходят по его завершении.
+    """
+    now = datetime.now(novosibirsk_tz)
+    try:
+        plan = await get_hour_plan(now)
+        tasks_to_execute = [
+            chat_id for chat_id in plan.take_due_sends(now.minute)
+            if chat_dag.request(chat_id, 'send', now)
+        ]
+        for chat_id, _ in chat_dag.expire(now, timedelta(minutes=ANALYSIS_WAIT_MINUTES)):
+            logging.warning(f"Анализ чата {chat_id} не завершился вовремя, отправляем без ожидания.")
+            tasks_to_execute.append(chat_id)
+        if tasks_to_execute:
+            logging.info(f"Чатов с задачами на текущую минуту: {len(tasks_to_execute)}.")
+            await asyncio.gather(*(send_chat_result_async(chat_id) for chat_id in tasks_to_execute))
+    except Exception as e:
+        logging.error(f"Ошибка при проверке задач: {e}", exc_info=True)
+
+
+def check_async_settings():
+    """
+    Проверяет, что не включены возможности, которых нет в асинхронном режиме.
+
+    :raises ValueError: Перечислены включённые неподдерживаемые переменные.
+    """
+    enabled = [name for name, default in UNSUPPORTED_SETTINGS if env_flag(name, default)]
+    if enabled:
+        raise ValueError(
+            f"SCHEDULER_MODE=async не поддерживает {', '.join(enabled)}: "
+            f"задайте =false или используйте SCHEDULER_MODE=threaded.")
+
+
+def create_tables():
+    """
+    Служебные таблицы планировщика (chat_prompts, job_runs, ...) создаются
+    синхронным движком — так же, как в синхронном режиме и командах.
+    """
+    from database import create_scheduler_tables, init_db
+
+    engine, _, _ = init_db(os.getenv('DATABASE_URL'), pool_size=1, max_overflow=0)
+    try:
+        create_scheduler_tables(engine)
+    finally:
+        engine.dispose()
+
+
+def start_async_scheduler():
+    """
+    Инициализирует асинхронные БД/HTTP-клиенты и запускает AsyncIOScheduler.
+    Вызывается из работающего цикла событий.
+    """
+    check_async_settings()
+    create_tables()
+    _, session_factory = init_async_db(
+        os.getenv('DATABASE_URL'),
+        pool_size=env_int('DB_POOL_SIZE', min(ASYNC_CONCURRENCY, 20)),
+        max_overflow=env_int('DB_MAX_OVERFLOW', 2)
+    )
+    _state["session_factory"] = session_factory
+    _state["semaphore"] = asyncio.Semaphore(ASYNC_CONCURRENCY)
+    _state["client"] = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=ASYNC_CONCURRENCY))
+
+    scheduler.add_job(check_and_execute_tasks_async, 'cron', hour='*', minute='*',
+                      id='Analysis_schedule', max_instances=5, replace_existing=True)
+    scheduler.add_job(send_tasks_async, 'cron', hour='*', minute='*',
+                      id='Send_schedule', replace_existing=True)
+    scheduler.start()
+    logging.info(f"Асинхронный планировщик запущен (параллельность {ASYNC_CONCURRENCY}).")
+
+
+async def drain_tasks(timeout):
+    """
+    Дожидается выполняющихся задач цикла (тики, анализы, отправки) не дольше
+    timeout секунд; оставшиеся отменяет. Результаты, не успевшие сохраниться,
+    не восстанавливаются (чекпоинтов в асинхронном режиме нет).
+    """
+    pending = asyncio.all_tasks() - {asyncio.current_task()}
+    if not pending:
+        return
+    logging.info(f"Ожидание {len(pending)} выполняющихся задач (до {timeout} с).")
+    _, pending = await asyncio.wait(pending, timeout=timeout)
+    if pending:
+        logging.warning(f"Не завершились за {timeout} с и отменены задач: {len(pending)}.")
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def run_async_scheduler():
+    """
+    Запускает асинхронный режим и держит цикл событий до SIGTERM/SIGINT.
+    При остановке новые задачи не запускаются, выполняющиеся дожидаются
+    SHUTDOWN_DRAIN_SECONDS.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+    start_async_scheduler()
+    try:
+        await stop.wait()
+        logging.info("Получен сигнал остановки.")
+    finally:
+        scheduler.shutdown(wait=False)
+        await drain_tasks(SHUTDOWN_DRAIN_SECONDS)
+        await _state["client"].aclose()
+        logging.info("Планировщик остановлен.")
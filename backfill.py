@@ -0,0 +1,257 @@
+"""
+Дозаполнение анализов за прошедшие дни — после смены промпта или подключения чата.
+
+    python backfill.py --start 2025-01-01 --end 2025-01-08 [--chats 1,2 | --scheduled]
+                       [--prompt PROMPT_ID] [--workers 4] [--processes 2]
+                       [--state backfill_state.json] [--fresh] [--dry-run]
+
+Окно дня — сутки до analysis_time чата (без analysis_time — до полуночи) по
+Новосибирску, как у ежедневного анализа. Окна выполняются пулом из --workers
+потоков (у каждого своя единица работы и соединение с БД, поэтому это и предел
+одновременных запросов к модели); кодирование сообщений в JSON вынесено в пул
+из --processes процессов (0 — в потоке окна).
+Промпты, по которым результат за окно уже есть, пропускаются. Завершённые окна,
+в том числе пустые, записываются в файл состояния: повторный запуск продолжает
+с незавершённых (--fresh — начать заново). Результаты помечаются filters.backfill
+и в ежедневную отправку не попадают.
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import date, datetime, time, timedelta
+from multiprocessing import get_context
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Строк в одной порции кодирования: крупные окна делятся между процессами
+ENCODE_CHUNK_ROWS = 5000
+
+
+class BackfillState:
+    """
+    Завершённые окна в JSON-файле; запись атомарная после каждого окна.
+    """
+
+    def __init__(self, path, fresh=False):
+        self.path = path
+        self._lock = threading.Lock()
+        self._done = set()
+        if not fresh and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self._done = set(json.load(f).get('done', []))
+
+    @staticmethod
+    def key(chat_id, day, prompt_id=None):
+        return f"{chat_id}/{day.isoformat()}/{prompt_id or '*'}"
+
+    def is_done(self, key):
+        return key in self._done
+
+    def mark(self, key):
+        with self._lock:
+            self._done.add(key)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'done': sorted(self._done)}, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+def day_windows(analysis_time, start, end):
+    """
+    Окна (день, начало, конец в UTC) за дни [start, end): окно дня заканчивается
+    в analysis_time этого дня по Новосибирску.
+    """
+    from utils.tasks import analysis_window, novosibirsk_tz
+
+    day = start
+    while day < end:
+        window = analysis_window(
+            analysis_time, novosibirsk_tz.localize(datetime.combine(day, time(12))))
+        yield (day, *window)
+        day += timedelta(days=1)
+
+
+def pool_encoder(pool):
+    """
+    encode для analyze: строки читаются и имена разрешаются в потоке окна,
+    а JSON собирается в процессах пула.
+    """
+    from utils.yandex_funcs import _name_lookups, format_rows_named
+
+    def encode(rows, session=None):
+        rows = [tuple(row) for row in rows if row[3]]
+        user_name, chat_name = _name_lookups(session)
+        user_names = {user_id: user_name(user_id) for user_id in {row[0] for row in rows}}
+        chat_names = {chat_id: chat_name(chat_id) for chat_id in {row[1] for row in rows}}
+        chunks = [rows[i:i + ENCODE_CHUNK_ROWS] for i in range(0, len(rows), ENCODE_CHUNK_ROWS)]
+        encoded = pool.map(format_rows_named, chunks,
+                           [user_names] * len(chunks), [chat_names] * len(chunks))
+        return [message for chunk in encoded for message in chunk]
+
+    return encode
+
+
+def run_window(chat_id, window, prompt_ids, encode=None):
+    """
+    Анализирует одно окно чата и сохраняет результаты.
+
+    :return: Число сохранённых результатов (0 — в окне нет сообщений).
+    :raises CompletionError: Запрос к модели не выполнен или вернул пустой ответ хотя бы
+        по одному промпту (полученные результаты сохраняются, окно повторится).
+    """
+    from database import unit_of_work
+    from utils import analyze, save_analysis_result
+    from utils.run_ledger import track_run
+    from utils.yandex_funcs import CompletionError
+
+    with track_run('backfill', chat_id) as run, unit_of_work() as session:
+        data = analyze(chat_id, None, session, window=window,
+                       prompt_ids=prompt_ids, encode=encode)
+        save_analysis_result(data, session)
+        saved = sum(1 for item in data if item["analysis_result"])
+        if run:
+            run.set_counts(tokens_input=sum(item["tokens_input"] or 0 for item in data),
+                           tokens_output=sum(item["tokens_output"] or 0 for item in data))
+            if not saved:
+                run.outcome = 'empty'
+        # Модель выбирается только для окна с сообщениями: без ответа — это сбой, а не пустое окно
+        if saved < len(data) and any("model" in item["filters"] for item in data):
+            raise CompletionError(
+                f"Пустой ответ модели по {len(data) - saved} из {len(data)} промптов.", 'EmptyResult')
+    return saved
+
+
+def plan_windows(chat_ids, start, end, prompt_id, state):
+    """
+    Окна, которые нужно выполнить: [(ключ состояния, chat_id, окно, промпты)],
+    и счётчики пропущенных.
+    """
+    from database.managers.analysis_manager import AnalysisManager
+    from database.managers.chat_manager import ChatManager
+    from database.managers.chat_prompt_manager import ChatPromptManager
+
+    analysis_manager = AnalysisManager()
+    chat_manager = ChatManager()
+    chat_prompt_manager = ChatPromptManager()
+    tasks = []
+    skipped = {"state": 0, "exists": 0}
+    for chat_id in chat_ids:
+        chat = chat_manager.get_chat_by_id(chat_id)
+        if not chat:
+            logging.error(f"Чат {chat_id} не найден, пропускаем.")
+            continue
+        prompt_ids = [prompt_id] if prompt_id else chat_prompt_manager.get_prompt_ids(
+            chat_id, chat['default_prompt_id'])
+        if not prompt_ids:
+            logging.error(f"У чата {chat_id} не задан ни один промпт, пропускаем.")
+            continue
+        analysis_time = time.fromisoformat(chat['analysis_time']) if chat['analysis_time'] else time()
+        for day, window_start, window_end in day_windows(analysis_time, start, end):
+            key = BackfillState.key(chat_id, day, prompt_id)
+            if state.is_done(key):
+                skipped["state"] += 1
+                continue
+            existing = analysis_manager.get_window_prompt_ids(
+                chat_id, window_start.isoformat(), window_end.isoformat())
+            missing = [pid for pid in prompt_ids if pid not in existing]
+            if not missing:
+                skipped["exists"] += 1
+                state.mark(key)
+                continue
+            tasks.append((key, chat_id, (window_start, window_end), missing))
+    return tasks, skipped
+
+
+def backfill(chat_ids, start, end, prompt_id=None, workers=4, processes=2,
+             state_path='backfill_state.json', fresh=False, dry_run=False):
+    """
+    Дозаполняет анализы чатов за дни [start, end). Возвращает dict со счётчиками.
+    """
+    state = BackfillState(state_path, fresh)
+    tasks, skipped = plan_windows(chat_ids, start, end, prompt_id, state)
+    logging.info(f"""Окон к выполнению: {len(tasks)}; уже выполнено: {
+                 skipped['state']}, результат уже есть: {skipped['exists']}.""")
+    stats = {"planned": len(tasks), "skipped_state": skipped["state"],
+             "skipped_exists": skipped["exists"], "saved": 0, "empty": 0, "failed": 0}
+    if dry_run or not tasks:
+        return stats
+
+    # spawn: процессы не наследуют потоки и соединения пула БД
+    process_pool = ProcessPoolExecutor(processes, mp_context=get_context('spawn')) \
+        if processes > 0 else None
+    encode = pool_encoder(process_pool) if process_pool else None
+    try:
+        with ThreadPoolExecutor(workers, thread_name_prefix='backfill') as pool:
+            futures = {pool.submit(run_window, chat_id, window, prompt_ids, encode): (key, chat_id, window)
+                       for key, chat_id, window, prompt_ids in tasks}
+            for future in as_completed(futures):
+                key, chat_id, window = futures[future]
+                try:
+                    saved = future.result()
+                except Exception as e:
+                    # Окно не отмечается завершённым: следующий запуск повторит его
+                    # (в том числе при сбое запроса к модели — CompletionError)
+                    stats["failed"] += 1
+                    logging.error(f"""Ошибка дозаполнения чата {chat_id} за {
+                                  window[0]} - {window[1]}: {e}""")
+                    continue
+                stats["saved" if saved else "empty"] += 1
+                state.mark(key)
+    finally:
+        if process_pool:
+            process_pool.shutdown()
+    return stats
+
+
+def main():
+    from database import create_scheduler_tables, init_db, set_db_globals
+    from utils.env import env_int
+    from utils.logging_setup import setup_logging
+    from utils.tasks import novosibirsk_tz
+
+    parser = argparse.ArgumentParser(
+        description="Дозаполнение анализов за прошедшие дни.")
+    parser.add_argument('--start', type=date.fromisoformat, required=True,
+                        help="Первый день (по Новосибирску, включительно).")
+    parser.add_argument('--end', type=date.fromisoformat,
+                        help="Последний день (не включительно); по умолчанию — сегодня.")
+    chats = parser.add_mutually_exclusive_group(required=True)
+    chats.add_argument('--chats', help="chat_id через запятую.")
+    chats.add_argument('--scheduled', action='store_true',
+                       help="Все чаты с анализом по расписанию.")
+    parser.add_argument('--prompt', help="Промпт вместо промптов чата.")
+    parser.add_argument('--workers', type=int, default=4,
+                        help="Окон одновременно (потоков и соединений с БД).")
+    parser.add_argument('--processes', type=int, default=env_int('SCHEDULER_PROCESSES', 2),
+                        help="Процессов для кодирования сообщений (0 — без пула).")
+    parser.add_argument('--state', default='backfill_state.json',
+                        help="Файл состояния для продолжения.")
+    parser.add_argument('--fresh', action='store_true',
+                        help="Игнорировать файл состояния.")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Только посчитать окна.")
+    args = parser.parse_args()
+
+    setup_logging()
+    engine, Session, Base = init_db(
+        os.getenv('DATABASE_URL'), pool_size=args.workers + 1, max_overflow=0)
+    set_db_globals(engine, Session, Base)
+    # Журнал запусков (job_runs) — служебная таблица планировщика
+    create_scheduler_tables(engine)
+
+    if args.scheduled:
+        from database.managers.chat_manager import ChatManager
+        chat_ids = [row.chat_id for row in ChatManager().get_scheduled_chats()]
+    else:
+        chat_ids = [int(chat_id) for chat_id in args.chats.split(',') if chat_id.strip()]
+    stats = backfill(chat_ids, args.start, args.end or datetime.now(novosibirsk_tz).date(), args.prompt,
+                     args.workers, args.processes, args.state, args.fresh, args.dry_run)
+    print(json.dumps(stats, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,3 @@
-from .db_setup import init_db
-from .db_globals import set_db_globals
+from .db_setup import init_db, create_scheduler_tables
+from .db_globals import set_db_globals, unit_of_work
 
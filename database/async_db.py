@@ -0,0 +1,34 @@
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+async_engine = None
+AsyncSession = None
+
+
+def to_async_url(database_url):
+    """
+    Переводит URL PostgreSQL на асинхронный драйвер asyncpg.
+    """
+    for prefix in ('postgresql+psycopg2://', 'postgresql://', 'postgres://'):
+        if database_url.startswith(prefix):
+            return 'postgresql+asyncpg://' + database_url[len(prefix):]
+    return database_url
+
+
+def init_async_db(database_url, pool_size=10, max_overflow=2):
+    """
+    Создаёт асинхронный движок и фабрику сессий для асинхронного режима планировщика.
+    """
+    global async_engine, AsyncSession  # pylint: disable=global-statement
+    async_engine = create_async_engine(
+        to_async_url(database_url),
+        pool_pre_ping=True,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=30,
+        echo=False,
+        # Таймаут в миллисекундах
+        connect_args={"server_settings": {"statement_timeout": "30000"}},
+        isolation_level="READ COMMITTED"
+    )
+    AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
+    return async_engine, AsyncSession
@@ -1,3 +1,5 @@
+from contextlib import contextmanager
+
 engine = None
 Session = None
 Base = None
@@ -8,3 +10,35 @@ def set_db_globals(engine_instance, session_instance, base_instance):
     engine = engine_instance
     Session = session_instance
     Base = base_instance
+
+
+@contextmanager
+def unit_of_work():
+    """
+    Одна сессия (и одно соединение из пула) на всю задачу.
+    Передаётся в менеджеры: ChatManager(session), MessageManager(session) и т.д.
+
+    Это общее соединение, а не одна транзакция: методы менеджеров, которые пишут
+    (save_analysis_result, record_run и др.), сами вызывают commit()/rollback(),
+    и их изменения фиксируются сразу. Коммит в конце блока фиксирует лишь то,
+    что менеджеры не зафиксировали сами; откат при исключении не отменяет уже
+    закоммиченное.
+    """
+    session = Session()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def release_connection(session):
+    """
+    Завершает текущую транзакцию сессии, чтобы соединение вернулось в пул
+    на время долгой внешней операции (например, запроса к модели).
+    """
+    if session is not None:
+        session.commit()
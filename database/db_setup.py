@@ -1,17 +1,90 @@
-from sqlalchemy import create_engine
+import logging
+import threading
+import time
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import QueuePool
+from database.routing import RoutingSession
 
 
 Base = declarative_base()
 
+# Порог ожидания соединения из пула, после которого пишем предупреждение (сек)
+POOL_WAIT_WARN_SECONDS = 0.5
 
-def init_db(database_url):
-    engine = create_engine(
+
+class PoolStats:
+    """
+    Статистика ожидания соединений из пула.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+
+    def record(self, wait):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def snapshot(self, reset=False):
+        with self._lock:
+            data = {
+                "checkouts": self.checkouts,
+                "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 2) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 2),
+            }
+        if reset:
+            self.reset()
+        return data
+
+
+pool_stats = PoolStats()
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool, замеряющий время ожидания свободного соединения.
+    """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            wait = time.perf_counter() - started
+            pool_stats.record(wait)
+            if wait > POOL_WAIT_WARN_SECONDS:
+                logging.warning(f"""Ожидание соединения из пула: {
+                                wait:.2f} с (размер {self.size()}, занято {self.checkedout()}).""")
+
+
+def _create_engine(database_url, pool_size, max_overflow):
+    if database_url.startswith('sqlite'):
+        # Локальные прогоны (soak.py): соединения пула переходят между потоками
+        return create_engine(
+            database_url,
+            poolclass=TimedQueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            echo=False,
+            connect_args={"check_same_thread": False, "timeout": 30},
+            pool_timeout=30,
+        )
+    return create_engine(
         database_url,
+        poolclass=TimedQueuePool,
         pool_pre_ping=True,  # Проверяет соединение перед использованием
-        pool_size=10,        # Размер пула
-        max_overflow=20,     # Дополнительные соединения сверх пула
+        pool_size=pool_size,        # Размер пула
+        max_overflow=max_overflow,     # Дополнительные соединения сверх пула
         echo=False,           # Отключить детальный вывод SQL
         # Таймаут в миллисекундах
         connect_args={"options": "-c statement_timeout=30000"},
@@ -19,6 +92,87 @@ def init_db(database_url):
         # isolation_level="SERIALIZABLE"
         isolation_level="READ COMMITTED"
     )
-    Session = sessionmaker(bind=engine)
+
+
+def init_db(database_url, pool_size=10, max_overflow=20, replica_url=None):
+    """
+    Создаёт движок основной БД и фабрику сессий.
+    Если задан replica_url, чтения в блоке database.routing.read_only() идут на реплику.
+    """
+    engine = _create_engine(database_url, pool_size, max_overflow)
+    replica_engine = _create_engine(
+        replica_url, pool_size, max_overflow) if replica_url else None
+    Session = sessionmaker(
+        bind=engine, class_=RoutingSession, replica_bind=replica_engine)
 
     return engine, Session, Base
+
+
+def create_scheduler_tables(engine):
+    """
+    Создаёт служебные таблицы планировщика, если их ещё нет.
+    Общие таблицы (chats, messages, ...) не трогаем — ими владеет основной сервис;
+    на chats в PostgreSQL вешаем только триггер версии расписаний.
+
+    :return: True, если триггер версии расписаний установлен.
+    """
+    from database.models.summary import MessageSummary
+    from database.models.run_stats import ChatRunStats
+    from database.models.activity import MessageActivity
+    from database.models.chat_prompt import ChatPrompt
+    from database.models.job_run import JobRun
+    from database.models.schedule_version import ScheduleVersion
+    from database.models.llm_checkpoint import LlmCheckpoint
+
+    Base.metadata.create_all(
+        engine,
+        tables=[
+            MessageSummary.__table__,
+            ChatRunStats.__table__,
+            MessageActivity.__table__,
+            ChatPrompt.__table__,
+            JobRun.__table__,
+            ScheduleVersion.__table__,
+            LlmCheckpoint.__table__,
+        ]
+    )
+    return engine.dialect.name == 'postgresql' and create_schedule_trigger(engine)
+
+
+def create_schedule_trigger(engine):
+    """
+    Триггер на chats: любое изменение расписаний (в том числе записью основного
+    сервиса напрямую) увеличивает schedule_version и шлёт NOTIFY слушателям.
+
+    :return: True, если триггер установлен.
+    """
+    from database.managers.schedule_version_manager import SCHEDULE_CHANNEL
+
+    with engine.begin() as connection:
+        if connection.execute(text("SELECT to_regclass('chats')")).scalar() is None:
+            logging.warning("Таблица chats не найдена, триггер версии расписаний не создан.")
+            return False
+        connection.execute(text(f"""
+            CREATE OR REPLACE FUNCTION bump_schedule_version() RETURNS trigger AS $$
+            BEGIN
+                INSERT INTO schedule_version (id, version, updated_at)
+                VALUES (1, 1, now() AT TIME ZONE 'utc')
+                ON CONFLICT (id) DO UPDATE
+                SET version = schedule_version.version + 1, updated_at = EXCLUDED.updated_at;
+                PERFORM pg_notify('{SCHEDULE_CHANNEL}', '');
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """))
+        exists = connection.execute(text(
+            "SELECT 1 FROM pg_trigger WHERE tgname = 'chats_schedule_version' "
+            "AND tgrelid = 'chats'::regclass")).scalar()
+        if not exists:
+            # Уровень оператора: массовое обновление chats — одно увеличение версии
+            connection.execute(text("""
+                CREATE TRIGGER chats_schedule_version
+                AFTER INSERT OR DELETE OR UPDATE OF schedule_analysis, analysis_time, send_time
+                ON chats FOR EACH STATEMENT EXECUTE PROCEDURE bump_schedule_version()
+            """))
+            logging.info("Создан триггер версии расписаний на chats.")
+    return True
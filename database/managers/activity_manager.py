@@ -0,0 +1,209 @@
+import logging
+from datetime import datetime
+from dateutil.parser import isoparse
+from sqlalchemy import func
+from database.models.activity import MessageActivity
+from database.models.messages import Message
+from database.managers.base_manager import BaseManager
+from database.routing import to_naive_utc
+
+
+def hour_bucket(value):
+    """Начало часа (naive UTC) для метки времени сообщения."""
+    if isinstance(value, str):
+        value = isoparse(value)
+    return to_naive_utc(value).replace(minute=0, second=0, microsecond=0)
+
+
+def _insert_for(session):
+    dialect = session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert
+
+
+class ActivityManager(BaseManager):
+    """
+    Почасовые счётчики сообщений (message_activity): ответы на вопросы
+    «есть ли сообщения» и «сколько их» без чтения таблицы messages.
+    Окна округляются до часа наружу, поэтому объём — оценка сверху.
+    """
+
+    # Отрезок [_rebuilt_from, _rebuilt_until), на котором счётчики сверены с messages
+    # пересчётами (rebuild) этого процесса; сообщения позже него основной сервис
+    # мог записать в обход счётчиков.
+    _rebuilt_from = None
+    _rebuilt_until = None
+
+    def record(self, chat_id, user_id, timestamp, chars, count=1):
+        """
+        Увеличивает счётчики часа. С внешней сессией коммит — на стороне
+        вызывающего (запись идёт в той же транзакции, что и само сообщение);
+        со своей сессией менеджер фиксирует запись сам.
+        """
+        with self._session() as session:
+            values = {
+                "chat_id": chat_id,
+                "user_id": user_id,
+                "hour": hour_bucket(timestamp),
+                "message_count": count,
+                "char_count": chars or 0,
+            }
+            insert = _insert_for(session)
+            if insert is not None:
+                stmt = insert(MessageActivity).values(**values)
+                session.execute(stmt.on_conflict_do_update(
+                    index_elements=['chat_id', 'user_id', 'hour'],
+                    set_={
+                        "message_count": MessageActivity.message_count + stmt.excluded.message_count,
+                        "char_count": MessageActivity.char_count + stmt.excluded.char_count,
+                    }
+                ))
+            else:
+                row = session.get(MessageActivity,
+                                  (chat_id, user_id, values["hour"]))
+                if row is None:
+                    session.add(MessageActivity(**values))
+                else:
+                    row.message_count += count
+                    row.char_count += values["char_count"]
+            if self._external_session is None:
+                session.commit()
+
+    def _range(self, query, start, end):
+        if start is not None:
+            query = query.filter(MessageActivity.hour >= hour_bucket(start))
+        if end is not None:
+            query = query.filter(MessageActivity.hour <= hour_bucket(end))
+        return query
+
+    def has_activity(self, chat_id, start, end):
+        """
+        Были ли в чате сообщения в часы, пересекающие [start, end]. Если счётчиков
+        за окно нет, messages проверяется только для времени после последнего
+        rebuild — более ранние часы счётчики уже покрывают.
+        """
+        with self._session() as session:
+            query = session.query(MessageActivity.hour).filter(
+                MessageActivity.chat_id == chat_id)
+            if self._range(query, start, end).first() is not None:
+                return True
+            rebuilt_from = ActivityManager._rebuilt_from
+            rebuilt_until = ActivityManager._rebuilt_until
+            if rebuilt_from is not None and start is not None and to_naive_utc(start) >= rebuilt_from:
+                if end is not None and to_naive_utc(end) < rebuilt_until:
+                    return False
+                start = max(to_naive_utc(start), rebuilt_until)
+            query = session.query(Message.message_id).filter(Message.chat_id == chat_id)
+            if start is not None:
+                query = query.filter(Message.timestamp >= to_naive_utc(start))
+            if end is not None:
+                query = query.filter(Message.timestamp <= to_naive_utc(end))
+            return query.first() is not None
+
+    def get_volume(self, chat_id, start, end):
+        """Возвращает (число сообщений, длина текстов) чата за часы окна."""
+        with self._session() as session:
+            query = session.query(
+                func.coalesce(func.sum(MessageActivity.message_count), 0),
+                func.coalesce(func.sum(MessageActivity.char_count), 0)
+            ).filter(MessageActivity.chat_id == chat_id)
+            count, chars = self._range(query, start, end).one()
+            return int(count), int(chars)
+
+    def get_volume_by_chat(self, start, end, chat_ids=None):
+        """Возвращает dict chat_id -> (число сообщений, длина текстов) за часы окна."""
+        with self._session() as session:
+            query = session.query(
+                MessageActivity.chat_id,
+                func.sum(MessageActivity.message_count),
+                func.sum(MessageActivity.char_count)
+            )
+            if chat_ids is not None:
+                query = query.filter(MessageActivity.chat_id.in_(list(chat_ids)))
+            query = self._range(query, start, end).group_by(
+                MessageActivity.chat_id)
+            return {chat_id: (int(count), int(chars)) for chat_id, count, chars in query.all()}
+
+    def get_user_activity(self, chat_id, start, end):
+        """Активность участников чата за окно, по убыванию числа сообщений."""
+        with self._session() as session:
+            query = session.query(
+                MessageActivity.user_id,
+                func.sum(MessageActivity.message_count).label('message_count'),
+                func.sum(MessageActivity.char_count).label('char_count')
+            ).filter(MessageActivity.chat_id == chat_id)
+            rows = (
+                self._range(query, start, end)
+                .group_by(MessageActivity.user_id)
+                .order_by(func.sum(MessageActivity.message_count).desc())
+                .all()
+            )
+            return [
+                {"user_id": user_id, "message_count": int(count), "char_count": int(chars)}
+                for user_id, count, chars in rows
+            ]
+
+    @classmethod
+    def _mark_rebuilt(cls, start, until):
+        """Расширяет сверенный отрезок; несмежный пересчёт начинает новый."""
+        if cls._rebuilt_from is None or start > cls._rebuilt_until:
+            cls._rebuilt_from, cls._rebuilt_until = start, until
+        else:
+            cls._rebuilt_from = min(cls._rebuilt_from, start)
+            cls._rebuilt_until = max(cls._rebuilt_until, until)
+
+    def rebuild(self, start, end):
+        """
+        Пересчитывает счётчики часов [start, end) по таблице messages —
+        для сообщений, записанных в обход add_message (основным сервисом);
+        планировщик вызывает его по расписанию (scheduler.refresh_activity).
+        """
+        start, end = hour_bucket(start), hour_bucket(end)
+        # Сообщения, пришедшие во время пересчёта, могут в него не попасть
+        checked_at = min(datetime.utcnow(), end)
+        with self._session() as session:
+            try:
+                if session.get_bind().dialect.name == 'postgresql':
+                    bucket = func.date_trunc('hour', Message.timestamp)
+                else:
+                    bucket = func.strftime('%Y-%m-%d %H:00:00', Message.timestamp)
+                rows = (
+                    session.query(
+                        Message.chat_id,
+                        Message.user_id,
+                        bucket,
+                        func.count(Message.message_id),
+                        func.coalesce(func.sum(func.length(Message.text)), 0)
+                    )
+                    .filter(Message.timestamp >= start)
+                    .filter(Message.timestamp < end)
+                    .group_by(Message.chat_id, Message.user_id, bucket)
+                    .all()
+                )
+                session.query(MessageActivity).filter(
+                    MessageActivity.hour >= start,
+                    MessageActivity.hour < end
+                ).delete(synchronize_session=False)
+                session.add_all([
+                    MessageActivity(
+                        chat_id=chat_id,
+                        user_id=user_id,
+                        hour=hour if isinstance(
+                            hour, datetime) else datetime.fromisoformat(hour),
+                        message_count=count,
+                        char_count=int(chars)
+                    )
+                    for chat_id, user_id, hour, count, chars in rows
+                ])
+                session.commit()
+                ActivityManager._mark_rebuilt(start, checked_at)
+                return len(rows)
+            except Exception as e:
+                session.rollback()
+                logging.error(f"Ошибка при пересчёте активности: {e}")
+                raise
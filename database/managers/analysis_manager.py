@@ -3,17 +3,15 @@ import json
 from datetime import datetime, timedelta
 from pytz import timezone, UTC
 from database.models.analysis import AnalysisResult
-from database.db_globals import Session
+from database.managers.base_manager import BaseManager
 from utils.db_get import get_prompt_name
 
 
-class AnalysisManager:
-    def __init__(self):
-        self.Session = Session
+class AnalysisManager(BaseManager):
 
     def save_analysis_result(self, prompt_id, result_text, filters, tokens_input, tokens_output):
         """Сохраняет результат анализа."""
-        with self.Session() as session:
+        with self._session() as session:
             try:
                 analysis_id = AnalysisResult().save(
                     session=session,
@@ -31,7 +29,7 @@ class AnalysisManager:
 
     def get_analysis_all(self, offset=0, limit=10):
         """Получает все анализы с пагинацией."""
-        with self.Session() as session:
+        with self._session() as session:
             try:
                 analyses = (
                     session.query(AnalysisResult)
@@ -47,7 +45,7 @@ class AnalysisManager:
                     {
                         'analysis_id': analysis.analysis_id,
                         'prompt_id': analysis.prompt_id,
-                        'prompt_name': get_prompt_name(analysis.prompt_id),
+                        'prompt_name': get_prompt_name(analysis.prompt_id, session),
                         'filters': json.loads(analysis.filters) if analysis.filters else 'Не указаны',
                         'timestamp': analysis.timestamp.isoformat(),
                         'preview': analysis.result_text[:100] + '...' if len(analysis.result_text) > 100 else analysis.result_text
@@ -61,7 +59,7 @@ class AnalysisManager:
 
     def get_analysis_by_id(self, analysis_id):
         """Получает анализ по его ID."""
-        with self.Session() as session:
+        with self._session() as session:
             try:
                 analysis = session.query(AnalysisResult).filter_by(
                     analysis_id=analysis_id).first()
@@ -82,7 +80,7 @@ class AnalysisManager:
                     return {
                         'analysis_id': analysis.analysis_id,
                         'prompt_id': analysis.prompt_id,
-                        'prompt_name': get_prompt_name(analysis.prompt_id),
+                        'prompt_name': get_prompt_name(analysis.prompt_id, session),
                         'timestamp': analysis.timestamp.isoformat(),
                         'result_text': analysis.result_text,
                         'filters': filters_readable or 'Не указаны',
@@ -94,11 +92,39 @@ class AnalysisManager:
                 logging.error(f"Ошибка при получении анализа по ID: {e}")
                 raise
 
+    def get_window_prompt_ids(self, chat_id, start_date, end_date):
+        """
+        Промпты, по которым у чата уже есть результат за окно [start_date, end_date]
+        (значения — как в filters: ISO-строки).
+        """
+        with self._session() as session:
+            # filters хранится строкой JSON: сужаем выборку по началу окна, остальное сверяем в памяти
+            rows = session.query(AnalysisResult.prompt_id, AnalysisResult.filters).filter(
+                AnalysisResult.filters.like(f'%"start_date": "{start_date}"%')
+            ).all()
+            prompt_ids = set()
+            for prompt_id, raw_filters in rows:
+                try:
+                    filters = json.loads(raw_filters)
+                except json.JSONDecodeError:
+                    continue
+                if str(filters.get("chat_id")) == str(chat_id) and filters.get("end_date") == end_date:
+                    prompt_ids.add(prompt_id)
+            return prompt_ids
+
     def get_today_analysis(self, chat_id):
         """
         Возвращает результат анализа для указанного chat_id, проведённого за последние 24 часа по Новосибирскому времени.
         """
-        with self.Session() as session:
+        results = self.get_today_analyses(chat_id)
+        return results[0] if results else None
+
+    def get_today_analyses(self, chat_id):
+        """
+        Возвращает последние результаты анализа чата за 24 часа — по одному на промпт,
+        от более свежих к более старым.
+        """
+        with self._session() as session:
             try:
                 # Текущее время в Новосибирске
                 novosibirsk_tz = timezone('Asia/Novosibirsk')
@@ -112,8 +138,8 @@ class AnalysisManager:
                     UTC)
                 now_utc = now_nsk.astimezone(UTC)
 
-                logging.info(f"""Ищем результаты анализа для чата {chat_id} за период {
-                             last_24_hours_start_utc} - {now_utc} (UTC).""")
+                logging.debug("Ищем результаты анализа для чата %s за период %s - %s (UTC).",
+                              chat_id, last_24_hours_start_utc, now_utc)
 
                 # Извлекаем все записи за последние 24 часа (UTC)
                 results = (
@@ -124,39 +150,34 @@ class AnalysisManager:
                     .all()
                 )
 
-                if results:
-                    logging.info(
-                        f"Найдено {len(results)} записей для чата {chat_id}.")
-                    # Фильтруем записи в памяти
-                    for result in results:
-                        try:
-                            filters = json.loads(
-                                result.filters) if result.filters else {}
-                            stored_chat_id = filters.get("chat_id")
-                            logging.info(f"""Проверяем запись с chat_id={
-                                         stored_chat_id} для чата {chat_id}.""")
-
-                            # Логирование перед сравнением
-                            logging.info(f"Проверяем запись с chat_id={repr(stored_chat_id)} ({
-                                         type(stored_chat_id)}) для чата {repr(chat_id)} ({type(chat_id)}).")
-
-                            # Сравниваем, приведение chat_id к строке
-                            if str(stored_chat_id).strip() == str(chat_id).strip():
-                                logging.info(
-                                    f"Подходящий результат найден для чата {chat_id}.")
-                                return result
-                            else:
-                                logging.warning(f"""Несоответствие chat_id: запись содержит {
-                                                repr(stored_chat_id)}, ожидается {repr(chat_id)}.""")
-
-                        except json.JSONDecodeError:
-                            logging.error(f"""Некорректный JSON в поле filters: {
-                                          result.filters}""")
-                else:
+                if not results:
                     logging.info(f"""Нет результатов анализа для чата {
                                  chat_id} за последние 24 часа.""")
-                return None
+                    return []
+
+                logging.debug(
+                    "Найдено %s записей для поиска результата чата %s.", len(results), chat_id)
+                # Фильтруем записи в памяти
+                expected_chat_id = str(chat_id).strip()
+                latest = {}
+                for result in results:
+                    try:
+                        filters = json.loads(
+                            result.filters) if result.filters else {}
+                        stored_chat_id = filters.get("chat_id")
+
+                        # Сравниваем, приведение chat_id к строке; дозаполненные прошлые дни не берём
+                        if str(stored_chat_id).strip() == expected_chat_id and not filters.get("backfill"):
+                            latest.setdefault(result.prompt_id, result)
+
+                    except json.JSONDecodeError:
+                        logging.error(f"""Некорректный JSON в поле filters: {
+                                      result.filters}""")
+                if latest:
+                    logging.info(
+                        "Найдено результатов для чата %s: %s.", chat_id, len(latest))
+                return list(latest.values())
             except Exception as e:
                 logging.error(f"""Ошибка при поиске результатов анализа для чата {
                               chat_id}: {e}""", exc_info=True)
-                return None
+                return []
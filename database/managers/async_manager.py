@@ -0,0 +1,141 @@
+import logging
+import json
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import select, func
+from database.models.analysis import AnalysisResult
+from database.models.chat import Chat
+from database.models.chat_prompt import ChatPrompt
+from database.models.job_run import JobRun
+from database.models.messages import Message
+from database.models.prompt import Prompt
+from database.models.user import User
+
+
+class AsyncManager:
+    """
+    Запросы асинхронного режима планировщика (AsyncSession).
+    Повторяет нужные конвейеру методы синхронных менеджеров.
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+    async def get_all_chats(self):
+        result = await self.session.execute(select(Chat))
+        return result.scalars().all()
+
+    async def get_chat_by_id(self, chat_id):
+        chat = await self.session.get(Chat, chat_id)
+        return chat.to_dict() if chat else None
+
+    async def get_prompt_text(self, prompt_id):
+        prompt = await self.session.get(Prompt, prompt_id)
+        return prompt.text if prompt else None
+
+    async def get_prompt_name(self, prompt_id):
+        prompt = await self.session.get(Prompt, prompt_id)
+        return prompt.prompt_name if prompt else None
+
+    async def get_prompt_ids(self, chat_id, default_prompt_id=None):
+        """
+        Промпты чата по порядку (см. ChatPromptManager.get_prompt_ids).
+        """
+        result = await self.session.execute(
+            select(ChatPrompt.prompt_id)
+            .where(ChatPrompt.chat_id == chat_id)
+            .order_by(ChatPrompt.position, ChatPrompt.prompt_id)
+        )
+        prompt_ids = [default_prompt_id] if default_prompt_id else []
+        for prompt_id in result.scalars().all():
+            if prompt_id not in prompt_ids:
+                prompt_ids.append(prompt_id)
+        return prompt_ids
+
+    async def get_filtered_messages(self, start_date, end_date, chat_id):
+        result = await self.session.execute(
+            select(Message)
+            .where(Message.chat_id == chat_id)
+            .where(Message.timestamp >= start_date)
+            .where(Message.timestamp <= end_date)
+        )
+        return [msg.to_dict() for msg in result.scalars().all()]
+
+    async def count_messages(self, chat_id, start_date, end_date):
+        result = await self.session.execute(
+            select(func.count(Message.message_id))
+            .where(Message.chat_id == chat_id)
+            .where(Message.timestamp >= start_date)
+            .where(Message.timestamp <= end_date)
+        )
+        return result.scalar() or 0
+
+    async def get_names(self, user_ids, chat_ids):
+        """
+        Имена пользователей и чатов одним запросом на таблицу.
+        """
+        user_names = {}
+        chat_names = {}
+        if user_ids:
+            result = await self.session.execute(
+                select(User.user_id, User.username).where(User.user_id.in_(user_ids)))
+            user_names = dict(result.all())
+        if chat_ids:
+            result = await self.session.execute(
+                select(Chat.chat_id, Chat.chat_name).where(Chat.chat_id.in_(chat_ids)))
+            chat_names = dict(result.all())
+        return user_names, chat_names
+
+    async def save_analysis_result(self, prompt_id, result_text, filters, tokens_input, tokens_output):
+        analysis_result = AnalysisResult(
+            analysis_id=str(uuid.uuid4()),
+            prompt_id=prompt_id,
+            result_text=result_text,
+            timestamp=datetime.utcnow(),
+            filters=json.dumps(filters) if filters else None,
+            tokens_input=tokens_input,
+            tokens_output=tokens_output,
+        )
+        self.session.add(analysis_result)
+        try:
+            await self.session.commit()
+        except Exception as e:
+            await self.session.rollback()
+            logging.error(f"Ошибка при сохранении анализа: {e}")
+            raise
+        return analysis_result.analysis_id
+
+    async def get_today_analyses(self, chat_id):
+        """
+        Последние результаты анализа чата за 24 часа — по одному на промпт
+        (см. AnalysisManager.get_today_analyses).
+        """
+        # asyncpg не сравнивает aware-даты со столбцами без часового пояса
+        now_utc = datetime.utcnow()
+        result = await self.session.execute(
+            select(AnalysisResult)
+            .where(AnalysisResult.timestamp >= now_utc - timedelta(days=1))
+            .where(AnalysisResult.timestamp < now_utc)
+            .order_by(AnalysisResult.timestamp.desc())
+        )
+        latest = {}
+        for analysis in result.scalars().all():
+            try:
+                filters = json.loads(
+                    analysis.filters) if analysis.filters else {}
+            except json.JSONDecodeError:
+                continue
+            # Дозаполненные прошлые дни (backfill.py) не отправляются как сегодняшние
+            if str(filters.get("chat_id")).strip() == str(chat_id).strip() and not filters.get("backfill"):
+                latest.setdefault(analysis.prompt_id, analysis)
+        return list(latest.values())
+
+    async def add_run(self, **fields):
+        """Записывает запуск в журнал job_runs (см. JobRunManager.add_run)."""
+        self.session.add(JobRun(**fields))
+        try:
+            await self.session.commit()
+        except Exception as e:
+            await self.session.rollback()
+            logging.error(
+                f"Ошибка при записи запуска {fields.get('job')} для чата {fields.get('chat_id')}: {e}")
@@ -0,0 +1,22 @@
+from contextlib import nullcontext
+from database import db_globals
+
+
+class BaseManager:
+    """
+    Общая часть менеджеров: своя сессия на каждый вызов
+    или внешняя сессия единицы работы (см. db_globals.unit_of_work).
+    """
+
+    def __init__(self, session=None):
+        self._external_session = session
+
+    @property
+    def Session(self):
+        # Фабрику берём в момент вызова: set_db_globals мог выполниться после импорта
+        return db_globals.Session
+
+    def _session(self):
+        if self._external_session is not None:
+            return nullcontext(self._external_session)
+        return self.Session()
@@ -1,36 +1,34 @@
 import logging
 from sqlalchemy import text
 from database.models.chat import Chat
-from database.db_globals import Session
+from database.managers.base_manager import BaseManager
+from database.managers.schedule_version_manager import ScheduleVersionManager
 from utils import parse_time
 
 
-class ChatManager:
-    def __init__(self):
-        self.Session = Session
+class ChatManager(BaseManager):
 
     def add_chat(self, chat_id, chat_name=None):
-        with self.Session() as session:
+        with self._session() as session:
             try:
                 session.execute(text("""
                     INSERT INTO chats (chat_id, chat_name)
                     VALUES (:chat_id, :chat_name)
                     ON CONFLICT (chat_id) DO NOTHING;
                 """), {"chat_id": chat_id, "chat_name": chat_name})
+                ScheduleVersionManager(session).bump()
                 session.commit()
             except Exception as e:
                 session.rollback()
                 raise e
 
     def get_chat_by_id(self, chat_id):
-        with self.Session() as session:
+        with self._session() as session:
             try:
-                logging.info(
-                    f"Открытие сессии для получения чата {chat_id}")
                 chat = session.query(Chat).filter(
                     Chat.chat_id == chat_id).first()
                 if chat:
-                    logging.info(f"чат найден: {chat}")
+                    logging.debug("Чат найден: %s", chat_id)
                     return chat.to_dict()
                 else:
                     logging.warning(f"Чат с ID {chat_id} не найден.")
@@ -41,7 +39,7 @@ class ChatManager:
                 raise
 
     def update_chat_name(self, chat_id, new_name):
-        with self.Session() as session:
+        with self._session() as session:
             try:
                 chat = session.query(Chat).filter_by(chat_id=chat_id).first()
                 if chat:
@@ -54,14 +52,22 @@ class ChatManager:
                 raise e
 
     def get_all_chats(self):
-        with self.Session() as session:
+        with self._session() as session:
             return session.query(Chat).all()
 
+    def get_scheduled_chats(self):
+        """
+        Чаты с анализом по расписанию: только поля расписания (chat_id, analysis_time, send_time).
+        """
+        with self._session() as session:
+            return session.query(Chat.chat_id, Chat.analysis_time, Chat.send_time).filter(
+                Chat.schedule_analysis.is_(True)).all()
+
     def update_schedule(self, chat_id, schedule_analysis, prompt_id=None, analysis_time=None, send_time=None):
         """
         Обновить расписание для чата.
         """
-        with self.Session() as session:
+        with self._session() as session:
             try:
                 chat = session.query(Chat).filter_by(chat_id=chat_id).first()
                 if not chat:
@@ -73,18 +79,20 @@ class ChatManager:
                     chat.analysis_time = parse_time(analysis_time)
                 if send_time:
                     chat.send_time = parse_time(send_time)
+                ScheduleVersionManager(session).bump()
                 session.commit()
             except Exception as e:
                 session.rollback()
                 raise e
 
     def delete_chat(self, chat_id):
-        with self.Session() as session:
+        with self._session() as session:
             try:
                 logging.info(f"Удаление чата '{chat_id}'")
                 chat = session.query(Chat).filter_by(chat_id=chat_id).first()
                 if chat:
                     session.delete(chat)
+                    ScheduleVersionManager(session).bump()
                     session.commit()
                     logging.info(f"Чат '{chat_id}' успешно удален.")
                 else:
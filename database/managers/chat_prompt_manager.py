@@ -0,0 +1,58 @@
+import logging
+from database.models.chat_prompt import ChatPrompt
+from database.managers.base_manager import BaseManager
+
+
+class ChatPromptManager(BaseManager):
+
+    def get_prompt_ids(self, chat_id, default_prompt_id=None):
+        """
+        Возвращает промпты чата по порядку: сначала промпт по умолчанию,
+        затем дополнительные (без повторов).
+        """
+        with self._session() as session:
+            rows = (
+                session.query(ChatPrompt.prompt_id)
+                .filter(ChatPrompt.chat_id == chat_id)
+                .order_by(ChatPrompt.position, ChatPrompt.prompt_id)
+                .all()
+            )
+        prompt_ids = [default_prompt_id] if default_prompt_id else []
+        for (prompt_id,) in rows:
+            if prompt_id not in prompt_ids:
+                prompt_ids.append(prompt_id)
+        return prompt_ids
+
+    def add_chat_prompt(self, chat_id, prompt_id, position=0):
+        """Подключает к чату дополнительный промпт."""
+        with self._session() as session:
+            try:
+                link = session.get(ChatPrompt, (chat_id, prompt_id))
+                if link is None:
+                    session.add(ChatPrompt(
+                        chat_id=chat_id, prompt_id=prompt_id, position=position))
+                else:
+                    link.position = position
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                logging.error(
+                    f"Ошибка при добавлении промпта {prompt_id} к чату {chat_id}: {e}")
+                raise
+
+    def remove_chat_prompt(self, chat_id, prompt_id):
+        """Отключает дополнительный промпт от чата."""
+        with self._session() as session:
+            try:
+                deleted = (
+                    session.query(ChatPrompt)
+                    .filter(ChatPrompt.chat_id == chat_id, ChatPrompt.prompt_id == prompt_id)
+                    .delete(synchronize_session=False)
+                )
+                session.commit()
+                return deleted > 0
+            except Exception as e:
+                session.rollback()
+                logging.error(
+                    f"Ошибка при удалении промпта {prompt_id} у чата {chat_id}: {e}")
+                raise
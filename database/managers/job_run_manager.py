@@ -0,0 +1,67 @@
+import logging
+from database.models.job_run import JobRun
+from database.managers.base_manager import BaseManager
+
+
+class JobRunManager(BaseManager):
+
+    def add_run(self, **fields):
+        """Записывает запуск задачи в журнал (поля — столбцы JobRun)."""
+        with self._session() as session:
+            try:
+                session.add(JobRun(**fields))
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                logging.error(
+                    f"Ошибка при записи запуска {fields.get('job')} для чата {fields.get('chat_id')}: {e}")
+
+    def get_runs(self, start, end, job=None):
+        """Возвращает запуски (dict), начавшиеся в [start, end), по времени начала."""
+        with self._session() as session:
+            query = session.query(JobRun).filter(
+                JobRun.started_at >= start, JobRun.started_at < end)
+            if job:
+                query = query.filter(JobRun.job == job)
+            return [run.to_dict() for run in query.order_by(JobRun.started_at).all()]
+
+    def get_chat_history(self, chat_ids, since, jobs=('analysis', 'analysis_batch_chat'), limit=20):
+        """
+        Последние успешные запуски чатов для прогноза длительности:
+        dict chat_id -> [(message_count, total_seconds, llm_seconds)], от новых к старым.
+        Пакетные анализы учитываются долями чатов (analysis_batch_chat).
+        """
+        if not chat_ids:
+            return {}
+        with self._session() as session:
+            rows = (
+                session.query(JobRun.chat_id, JobRun.message_count,
+                              JobRun.total_ms, JobRun.llm_ms)
+                .filter(JobRun.job.in_(jobs), JobRun.outcome == 'ok',
+                        JobRun.started_at >= since,
+                        JobRun.chat_id.in_(list(chat_ids)))
+                .order_by(JobRun.started_at.desc())
+                .all()
+            )
+            history = {}
+            for chat_id, message_count, total_ms, llm_ms in rows:
+                runs = history.setdefault(chat_id, [])
+                if len(runs) < limit:
+                    runs.append((message_count, total_ms / 1000, (llm_ms or 0) / 1000))
+            return history
+
+    def delete_older_than(self, before):
+        """Удаляет запуски, начавшиеся раньше указанного момента."""
+        with self._session() as session:
+            try:
+                deleted = (
+                    session.query(JobRun)
+                    .filter(JobRun.started_at < before)
+                    .delete(synchronize_session=False)
+                )
+                session.commit()
+                return deleted
+            except Exception as e:
+                session.rollback()
+                logging.error(f"Ошибка при удалении старых запусков: {e}")
+                raise
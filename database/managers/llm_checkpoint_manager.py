@@ -0,0 +1,94 @@
+import json
+import logging
+from datetime import datetime
+from database.models.llm_checkpoint import LlmCheckpoint
+from database.managers.base_manager import BaseManager
+
+
+class LlmCheckpointManager(BaseManager):
+
+    def add(self, chat_id, data, status='llm'):
+        """
+        Сохраняет ответ модели (результат analyze) или, со статусом queued, параметры
+        незавершённого анализа и сразу фиксирует транзакцию.
+
+        :return: checkpoint_id или None, если записать не удалось.
+        """
+        with self._session() as session:
+            try:
+                now = datetime.utcnow()
+                checkpoint = LlmCheckpoint(
+                    chat_id=chat_id, payload=json.dumps(data, ensure_ascii=False),
+                    status=status, created_at=now, updated_at=now)
+                session.add(checkpoint)
+                session.commit()
+                return checkpoint.checkpoint_id
+            except Exception as e:
+                session.rollback()
+                logging.error(f"Ошибка при записи чекпоинта для чата {chat_id}: {e}")
+                return None
+
+    def mark(self, checkpoint_ids, status):
+        """Переводит чекпоинты в статус status."""
+        checkpoint_ids = [checkpoint_id for checkpoint_id in checkpoint_ids if checkpoint_id]
+        if not checkpoint_ids:
+            return
+        with self._session() as session:
+            session.query(LlmCheckpoint).filter(
+                LlmCheckpoint.checkpoint_id.in_(checkpoint_ids)
+            ).update({"status": status, "updated_at": datetime.utcnow()},
+                     synchronize_session=False)
+            session.commit()
+
+    def mark_sent(self, chat_ids):
+        """Отмечает сохранённые чекпоинты чатов отправленными."""
+        chat_ids = list(chat_ids)
+        if not chat_ids:
+            return
+        with self._session() as session:
+            try:
+                session.query(LlmCheckpoint).filter(
+                    LlmCheckpoint.chat_id.in_(chat_ids), LlmCheckpoint.status == 'saved'
+                ).update({"status": 'sent', "updated_at": datetime.utcnow()},
+                         synchronize_session=False)
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                logging.error(f"Ошибка при отметке отправки чекпоинтов чатов {chat_ids}: {e}")
+
+    def get_unfinished(self, since):
+        """
+        Незавершённые чекпоинты (queued, llm, saved), созданные после since, от старых к новым:
+        список dict с разобранным payload.
+        """
+        with self._session() as session:
+            rows = (
+                session.query(LlmCheckpoint)
+                .filter(LlmCheckpoint.status.in_(('queued', 'llm', 'saved')),
+                        LlmCheckpoint.created_at >= since)
+                .order_by(LlmCheckpoint.created_at)
+                .all()
+            )
+            return [{
+                "checkpoint_id": row.checkpoint_id,
+                "chat_id": row.chat_id,
+                "status": row.status,
+                "created_at": row.created_at,
+                "data": json.loads(row.payload),
+            } for row in rows]
+
+    def delete_older_than(self, before):
+        """Удаляет чекпоинты, созданные раньше указанного момента."""
+        with self._session() as session:
+            try:
+                deleted = (
+                    session.query(LlmCheckpoint)
+                    .filter(LlmCheckpoint.created_at < before)
+                    .delete(synchronize_session=False)
+                )
+                session.commit()
+                return deleted
+            except Exception as e:
+                session.rollback()
+                logging.error(f"Ошибка при удалении старых чекпоинтов: {e}")
+                raise
@@ -1,19 +1,39 @@
+import base64
+import json
 import uuid
 import logging
+from contextlib import nullcontext
 from datetime import datetime
 from dateutil.parser import isoparse
+from sqlalchemy import Float, and_, cast, func, literal_column, or_
 from database.models.messages import Message
-from database.db_globals import Session
+from database.managers.base_manager import BaseManager
+from database.routing import read_only, replica_cutoff, routed_all, routed_iter, routed_scalar_sum, to_naive_utc
+from database.search import search_clauses
 
 
-class MessageManager:
-    def __init__(self):
-        self.Session = Session
+def _encode_cursor(rank, timestamp, message_id):
+    raw = json.dumps([rank, timestamp.isoformat(), message_id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor):
+    try:
+        rank, timestamp, message_id = json.loads(
+            base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return float(rank), datetime.fromisoformat(timestamp), message_id
+    except Exception as e:
+        raise ValueError(f"Некорректный курсор поиска: {cursor}") from e
+
+
+class MessageManager(BaseManager):
 
     def add_message(self, timestamp, user_id, chat_id, text=None, s3_key=None):
-        with self.Session() as session:
+        from database.managers.activity_manager import ActivityManager
+
+        with self._session() as session:
             try:
-                message_id = uuid.uuid4()
+                message_id = str(uuid.uuid4())
                 message_data = Message(
                     message_id=message_id,
                     timestamp=timestamp,
@@ -24,6 +44,9 @@ class MessageManager:
                 )
                 # Сохранение данных в базу
                 session.add(message_data)
+                # Почасовые счётчики обновляются в той же транзакции
+                ActivityManager(session).record(
+                    chat_id, user_id, timestamp or datetime.utcnow(), len(text or ''))
                 session.commit()
                 # logging.info(f"Сообщение {message_id} успешно записано в базу данных.")
             except Exception as e:
@@ -32,8 +55,9 @@ class MessageManager:
                 session.rollback()
 
     def get_filtered_messages(self, start_date=None, end_date=None, user_id=None, chat_id=None):
-        with self.Session() as session:
+        with self._session() as session:
             query = session.query(Message)
+            end_date_parsed = None
             if start_date:
                 start_date_parsed = isoparse(start_date) if isinstance(
                     start_date, str) else start_date
@@ -47,16 +71,96 @@ class MessageManager:
             if chat_id:
                 query = query.filter(Message.chat_id == chat_id)
             try:
-                # results = session.execute(query).scalars().all()
-                results = query.all()
+                # Основная часть окна читается с реплики, свежий хвост — с основной БД
+                results = routed_all(
+                    session, query, Message.timestamp, end_date_parsed)
 
                 return results
             except Exception as e:
                 logging.error(f"Ошибка выполнения запроса: {e}")
                 raise
 
+    def iter_filtered_messages(self, start_date=None, end_date=None, user_id=None, chat_id=None,
+                               batch_size=1000):
+        """
+        Потоковое чтение окна для кодирования в запрос к модели: лёгкие строки
+        (user_id, chat_id, timestamp, text) по времени, только с непустым текстом.
+        В памяти одновременно не больше batch_size строк из БД.
+        """
+        with self._session() as session:
+            query = session.query(
+                Message.user_id, Message.chat_id, Message.timestamp, Message.text
+            ).filter(Message.text.isnot(None), Message.text != '')
+            end_date_parsed = None
+            if start_date:
+                query = query.filter(Message.timestamp >= to_naive_utc(
+                    isoparse(start_date) if isinstance(start_date, str) else start_date))
+            if end_date:
+                end_date_parsed = isoparse(end_date) if isinstance(
+                    end_date, str) else end_date
+                query = query.filter(Message.timestamp <= to_naive_utc(end_date_parsed))
+            if user_id:
+                query = query.filter(Message.user_id == user_id)
+            if chat_id:
+                query = query.filter(Message.chat_id == chat_id)
+            query = query.order_by(Message.timestamp)
+            try:
+                yield from routed_iter(
+                    session, query, Message.timestamp, end_date_parsed, batch_size)
+            except Exception as e:
+                logging.error(f"Ошибка выполнения запроса: {e}")
+                raise
+
+    def count_messages(self, start_date=None, end_date=None, user_id=None, chat_id=None):
+        """Считает сообщения по тем же фильтрам, что и get_filtered_messages."""
+        with self._session() as session:
+            query = session.query(func.count(Message.message_id))
+            end_date_parsed = None
+            if start_date:
+                start_date_parsed = isoparse(start_date) if isinstance(
+                    start_date, str) else start_date
+                query = query.filter(Message.timestamp >= start_date_parsed)
+            if end_date:
+                end_date_parsed = isoparse(end_date) if isinstance(
+                    end_date, str) else end_date
+                query = query.filter(Message.timestamp <= end_date_parsed)
+            if user_id:
+                query = query.filter(Message.user_id == user_id)
+            if chat_id:
+                query = query.filter(Message.chat_id == chat_id)
+            try:
+                return routed_scalar_sum(
+                    session, query, Message.timestamp, end_date_parsed)
+            except Exception as e:
+                logging.error(f"Ошибка выполнения запроса: {e}")
+                raise
+
+    def get_volume_by_chat(self, start_date, end_date, chat_ids=None):
+        """
+        Возвращает dict chat_id -> (число сообщений, суммарная длина текстов) за период.
+        """
+        with self._session() as session:
+            query = (
+                session.query(
+                    Message.chat_id,
+                    func.count(Message.message_id),
+                    func.coalesce(func.sum(func.length(Message.text)), 0)
+                )
+                .filter(Message.timestamp >= to_naive_utc(start_date))
+                .filter(Message.timestamp <= to_naive_utc(end_date))
+                .group_by(Message.chat_id)
+            )
+            if chat_ids is not None:
+                query = query.filter(Message.chat_id.in_(list(chat_ids)))
+            volumes = {}
+            # Строки с реплики и с основной БД могут относиться к одному чату — складываем
+            for chat_id, count, chars in routed_all(session, query, Message.timestamp, end_date):
+                prev_count, prev_chars = volumes.get(chat_id, (0, 0))
+                volumes[chat_id] = (prev_count + count, prev_chars + int(chars))
+            return volumes
+
     def get_paginated_messages(self, start_date=None, end_date=None, user_id=None, chat_id=None, limit=10, offset=0):
-        with self.Session() as session:
+        with self._session() as session:
             query = session.query(Message)
             try:
                 # Фильтры
@@ -97,13 +201,94 @@ class MessageManager:
                 if chat_id:
                     query = query.filter(Message.chat_id == int(chat_id))
 
-                # Общее количество сообщений (для пагинации)
-                total_count = query.count()
+                # Исторические страницы читаем с реплики, если её данным можно доверять
+                cutoff = replica_cutoff(session)
+                use_replica = cutoff is not None and end_date and to_naive_utc(
+                    end_date_parsed) <= cutoff
+                if use_replica:
+                    with read_only(session):
+                        return self._paginate(query, limit, offset)
+                return self._paginate(query, limit, offset)
+            except Exception as e:
+                logging.error(f"""Ошибка в базе данных: {e}""")
+
+    @staticmethod
+    def _paginate(query, limit, offset):
+        # Общее количество сообщений (для пагинации)
+        total_count = query.count()
 
-                # Применяем limit и offset
-                query = query.order_by(Message.timestamp.desc()
-                                       ).limit(limit).offset(offset)
+        # Применяем limit и offset
+        query = query.order_by(Message.timestamp.desc()
+                               ).limit(limit).offset(offset)
 
-                return query.all(), total_count
+        return query.all(), total_count
+
+    def search_messages(self, query, chat_id=None, user_id=None, start_date=None, end_date=None,
+                        limit=20, cursor=None):
+        """
+        Полнотекстовый поиск по текстам сообщений (индекс — database.search.ensure_search_index).
+
+        Результаты упорядочены по релевантности, затем по времени (новые выше).
+        Следующая страница запрашивается по next_cursor, без OFFSET.
+
+        :return: {"results": [dict сообщения + rank, highlight], "next_cursor": str | None}
+        """
+        with self._session() as session:
+            join_table, match, rank, headline = search_clauses(
+                session.get_bind().dialect.name, query)
+            # Релевантность в double precision: значение из курсора должно сравниваться точно
+            rank = cast(rank, Float(precision=53))
+
+            search = session.query(Message, rank.label('rank'),
+                                   headline.label('highlight'))
+            if join_table is not None:
+                search = search.join(
+                    join_table, join_table.c.rowid == literal_column('messages.rowid'))
+            search = search.filter(match)
+            if start_date:
+                search = search.filter(Message.timestamp >= to_naive_utc(
+                    isoparse(start_date) if isinstance(start_date, str) else start_date))
+            if end_date:
+                search = search.filter(Message.timestamp <= to_naive_utc(
+                    isoparse(end_date) if isinstance(end_date, str) else end_date))
+            if user_id:
+                search = search.filter(Message.user_id == int(user_id))
+            if chat_id:
+                search = search.filter(Message.chat_id == int(chat_id))
+            if cursor:
+                last_rank, last_timestamp, last_id = _decode_cursor(cursor)
+                search = search.filter(or_(
+                    rank < last_rank,
+                    and_(rank == last_rank, or_(
+                        Message.timestamp < last_timestamp,
+                        and_(Message.timestamp == last_timestamp,
+                             Message.message_id < last_id)
+                    ))
+                ))
+            search = search.order_by(
+                rank.desc(), Message.timestamp.desc(), Message.message_id.desc()
+            ).limit(limit + 1)
+
+            # Поиску достаточно данных реплики, если она не отстаёт сверх допустимого
+            source = read_only(session) if replica_cutoff(
+                session) is not None else nullcontext()
+            try:
+                with source:
+                    rows = search.all()
             except Exception as e:
-                logging.error(f"""Ошибка в базе данных: {e}""")
+                logging.error(f"Ошибка полнотекстового поиска: {e}")
+                raise
+
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                last_message, last_rank, _ = rows[-1]
+                next_cursor = _encode_cursor(
+                    last_rank, last_message.timestamp, last_message.message_id)
+            results = []
+            for message, message_rank, highlight in rows:
+                item = message.to_dict()
+                item["rank"] = message_rank
+                item["highlight"] = highlight
+                results.append(item)
+            return {"results": results, "next_cursor": next_cursor}
@@ -1,12 +1,10 @@
 import logging
 import uuid
 from database.models.prompt import Prompt
-from database.db_globals import Session
+from database.managers.base_manager import BaseManager
 
 
-class PromptManager:
-    def __init__(self):
-        self.Session = Session
+class PromptManager(BaseManager):
 
     def add_prompt(self, prompt_name, text, use_automatic=False):
         """Добавляем новый промпт"""
@@ -18,7 +16,7 @@ class PromptManager:
             use_automatic=use_automatic
         )
 
-        with self.Session() as session:
+        with self._session() as session:
             try:
                 session.add(new_prompt)
                 session.commit()
@@ -31,22 +29,22 @@ class PromptManager:
 
     def get_prompts(self):
         """Получаем все промпты"""
-        with self.Session() as session:
+        with self._session() as session:
             logging.info("Получение всех промптов")
             prompts = session.query(Prompt).all()
             return [[p.prompt_name, p.text, p.prompt_id, p.use_automatic] for p in prompts]
 
     def get_prompt_by_prompt_id(self, prompt_id):
         """Получаем промпт по его ID"""
-        with self.Session() as session:
-            logging.info(f"Получение промпта по prompt_id: {prompt_id}")
+        with self._session() as session:
+            logging.debug("Получение промпта по prompt_id: %s", prompt_id)
             prompt = session.query(Prompt).filter_by(
                 prompt_id=prompt_id).first()
             return prompt.to_dict() if prompt else None
 
     def get_prompt_by_prompt_name(self, prompt_name):
         """Получаем промпт по его имени"""
-        with self.Session() as session:
+        with self._session() as session:
             logging.info(f"Получение промпта по имени: {prompt_name}")
             prompt = session.query(Prompt).filter_by(
                 prompt_name=prompt_name).first()
@@ -54,7 +52,7 @@ class PromptManager:
 
     def edit_prompt(self, prompt_id, new_text, new_prompt_name):
         """Редактируем существующий промпт"""
-        with self.Session() as session:
+        with self._session() as session:
             try:
                 logging.info(f"Редактирование промпта '{prompt_id}'")
                 prompt = session.query(Prompt).filter_by(
@@ -75,7 +73,7 @@ class PromptManager:
 
     def delete_prompt(self, prompt_id):
         """Удаляем промпт по его ID"""
-        with self.Session() as session:
+        with self._session() as session:
             try:
                 logging.info(f"Удаление промпта '{prompt_id}'")
                 prompt = session.query(Prompt).filter_by(
@@ -93,7 +91,7 @@ class PromptManager:
 
     def get_automatic_prompt(self):
         """Получаем автоматический промпт"""
-        with self.Session() as session:
+        with self._session() as session:
             logging.info("Поиск автоматического промпта")
             prompt = session.query(Prompt).filter_by(
                 use_automatic=True).first()
@@ -107,7 +105,7 @@ class PromptManager:
 
     def reset_automatic_flag(self):
         """Сбрасываем флаг 'use_automatic' для всех промптов"""
-        with self.Session() as session:
+        with self._session() as session:
             try:
                 logging.info("Сброс флага 'use_automatic' для всех промптов")
                 prompts = session.query(Prompt).filter_by(
@@ -123,7 +121,7 @@ class PromptManager:
 
     def set_automatic_flag(self, prompt_id, use_automatic):
         """Устанавливаем флаг 'use_automatic' для указанного промпта"""
-        with self.Session() as session:
+        with self._session() as session:
             try:
                 logging.info(
                     f"Установка флага 'use_automatic' для промпта ID: {prompt_id}")
@@ -145,6 +143,6 @@ class PromptManager:
 
     def get_all_prompts(self):
         """Получаем все промпты"""
-        with self.Session() as session:
+        with self._session() as session:
             logging.info("Получение всех промптов")
             return session.query(Prompt).all()
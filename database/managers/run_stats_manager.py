@@ -0,0 +1,71 @@
+import logging
+from datetime import datetime
+from database.models.run_stats import ChatRunStats
+from database.managers.base_manager import BaseManager
+
+# Вес последнего запуска в скользящем среднем
+EWMA_ALPHA = 0.3
+
+
+def _ewma(previous, value):
+    if previous is None:
+        return value
+    return EWMA_ALPHA * value + (1 - EWMA_ALPHA) * previous
+
+
+class RunStatsManager(BaseManager):
+
+    def get_stats(self, chat_ids):
+        """Возвращает dict chat_id -> статистика запусков (dict) для указанных чатов."""
+        if not chat_ids:
+            return {}
+        with self._session() as session:
+            rows = (
+                session.query(ChatRunStats)
+                .filter(ChatRunStats.chat_id.in_(list(chat_ids)))
+                .all()
+            )
+            return {row.chat_id: row.to_dict() for row in rows}
+
+    def record_run(self, chat_id, message_count, seconds, tokens_input=None, tokens_output=None):
+        """Учитывает длительность и токены очередного анализа чата в скользящих средних."""
+        with self._session() as session:
+            try:
+                stats = session.get(ChatRunStats, chat_id)
+                if stats is None:
+                    stats = ChatRunStats(chat_id=chat_id, priority=0, runs=0)
+                    session.add(stats)
+                stats.avg_seconds = _ewma(stats.avg_seconds, seconds)
+                if message_count:
+                    stats.avg_seconds_per_message = _ewma(
+                        stats.avg_seconds_per_message, seconds / message_count)
+                    if tokens_input:
+                        stats.avg_tokens_per_message = _ewma(
+                            stats.avg_tokens_per_message, tokens_input / message_count)
+                if tokens_output:
+                    stats.avg_tokens_output = _ewma(
+                        stats.avg_tokens_output, tokens_output)
+                stats.last_message_count = message_count
+                stats.runs = (stats.runs or 0) + 1
+                stats.updated_at = datetime.utcnow()
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                logging.error(
+                    f"Ошибка при сохранении статистики запуска для чата {chat_id}: {e}")
+
+    def set_priority(self, chat_id, priority):
+        """Задаёт приоритет чата (больше — раньше в очереди)."""
+        with self._session() as session:
+            try:
+                stats = session.get(ChatRunStats, chat_id)
+                if stats is None:
+                    stats = ChatRunStats(chat_id=chat_id, runs=0)
+                    session.add(stats)
+                stats.priority = priority
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                logging.error(
+                    f"Ошибка при изменении приоритета чата {chat_id}: {e}")
+                raise
@@ -0,0 +1,50 @@
+from datetime import datetime
+from sqlalchemy import select, text
+from database.models.schedule_version import ScheduleVersion
+from database.managers.base_manager import BaseManager
+from database.managers.activity_manager import _insert_for
+
+# Канал PostgreSQL NOTIFY об изменении расписаний (см. utils.schedule_cache)
+SCHEDULE_CHANNEL = 'chat_schedule'
+
+
+class ScheduleVersionManager(BaseManager):
+    """
+    Счётчик изменений расписаний: планировщик перечитывает чаты,
+    только когда версия изменилась.
+    """
+
+    def get_version(self):
+        with self._session() as session:
+            return session.execute(
+                select(ScheduleVersion.version).where(ScheduleVersion.id == 1)
+            ).scalar() or 0
+
+    def bump(self):
+        """
+        Увеличивает версию и (в PostgreSQL) шлёт NOTIFY. Коммит — на стороне
+        вызывающего: версия меняется в той же транзакции, что и сам чат.
+        """
+        with self._session() as session:
+            insert = _insert_for(session)
+            if insert is not None:
+                stmt = insert(ScheduleVersion).values(
+                    id=1, version=1, updated_at=datetime.utcnow())
+                session.execute(stmt.on_conflict_do_update(
+                    index_elements=['id'],
+                    set_={
+                        "version": ScheduleVersion.version + 1,
+                        "updated_at": stmt.excluded.updated_at,
+                    }
+                ))
+            else:
+                row = session.get(ScheduleVersion, 1)
+                if row is None:
+                    session.add(ScheduleVersion(id=1, version=1, updated_at=datetime.utcnow()))
+                else:
+                    row.version += 1
+                    row.updated_at = datetime.utcnow()
+            if session.get_bind().dialect.name == 'postgresql':
+                # Доставляется слушателям только после коммита транзакции
+                session.execute(text("SELECT pg_notify(:channel, '')"),
+                                {"channel": SCHEDULE_CHANNEL})
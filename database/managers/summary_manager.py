@@ -0,0 +1,68 @@
+import logging
+from database.models.summary import MessageSummary
+from database.managers.base_manager import BaseManager
+
+
+class SummaryManager(BaseManager):
+
+    def save_summary(self, chat_id, period_start, period_end, summary_text, message_count):
+        """Сохраняет часовую сводку сообщений чата."""
+        with self._session() as session:
+            try:
+                summary = MessageSummary(
+                    chat_id=chat_id,
+                    period_start=period_start,
+                    period_end=period_end,
+                    summary_text=summary_text or '',
+                    message_count=message_count
+                )
+                session.add(summary)
+                session.commit()
+                return summary.summary_id
+            except Exception as e:
+                session.rollback()
+                logging.error(
+                    f"Ошибка при сохранении сводки для чата {chat_id}: {e}")
+                raise
+
+    def get_summaries(self, chat_id, start, end):
+        """
+        Возвращает сводки чата, целиком лежащие внутри [start, end], по возрастанию времени.
+        """
+        with self._session() as session:
+            summaries = (
+                session.query(MessageSummary)
+                .filter(MessageSummary.chat_id == chat_id)
+                .filter(MessageSummary.period_start >= start)
+                .filter(MessageSummary.period_end <= end)
+                .order_by(MessageSummary.period_start)
+                .all()
+            )
+            return [s.to_dict() for s in summaries]
+
+    def get_last_period_end(self, chat_id):
+        """Возвращает конец последнего просуммированного часа для чата или None."""
+        with self._session() as session:
+            summary = (
+                session.query(MessageSummary)
+                .filter(MessageSummary.chat_id == chat_id)
+                .order_by(MessageSummary.period_end.desc())
+                .first()
+            )
+            return summary.period_end if summary else None
+
+    def delete_older_than(self, before):
+        """Удаляет сводки, закончившиеся раньше указанного момента."""
+        with self._session() as session:
+            try:
+                deleted = (
+                    session.query(MessageSummary)
+                    .filter(MessageSummary.period_end < before)
+                    .delete(synchronize_session=False)
+                )
+                session.commit()
+                return deleted
+            except Exception as e:
+                session.rollback()
+                logging.error(f"Ошибка при удалении старых сводок: {e}")
+                raise
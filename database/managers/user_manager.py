@@ -1,17 +1,15 @@
 import logging
 from sqlalchemy import exists
 from database.models.user import User
-from database.db_globals import Session
+from database.managers.base_manager import BaseManager
 
 
-class UserManager:
-    def __init__(self):
-        self.Session = Session
+class UserManager(BaseManager):
 
     def add_user(self, user_id, username=None):
         """Добавляем пользователя стандартно"""
         new_user = User(user_id=user_id, username=username)
-        with self.Session() as session:
+        with self._session() as session:
             try:
                 session.add(new_user)
                 session.commit()
@@ -25,19 +23,17 @@ class UserManager:
 
     def user_exists(self, user_id):
         """Проверка существования пользователя по ID"""
-        with self.Session() as session:
+        with self._session() as session:
             return session.query(exists().where(User.user_id == user_id)).scalar()
 
     def get_user_by_user_id(self, user_id):
         """Получаем пользователя по его ID"""
-        with self.Session() as session:
+        with self._session() as session:
             try:
-                logging.info(
-                    f"Открытие сессии для получения пользователя {user_id}")
                 user = session.query(User).filter(
                     User.user_id == user_id).first()
                 if user:
-                    logging.info(f"Пользователь найден: {user}")
+                    logging.debug("Пользователь найден: %s", user_id)
                     return user.to_dict()
                 else:
                     logging.warning(f"Пользователь с ID {user_id} не найден.")
@@ -50,7 +46,7 @@ class UserManager:
 
     def delete_user(self, user_id):
         """Удаление пользователя по user_id"""
-        with self.Session() as session:
+        with self._session() as session:
             try:
                 user = session.query(User).filter_by(user_id=user_id).first()
                 if user:
@@ -69,7 +65,7 @@ class UserManager:
 
     def get_users(self):
         """Получаем всех пользователей"""
-        with self.Session() as session:
+        with self._session() as session:
             try:
                 users = session.query(User).all()
                 return users
@@ -79,7 +75,7 @@ class UserManager:
 
     def update_username(self, user_id, username):
         """Обновляем имя пользователя"""
-        with self.Session() as session:
+        with self._session() as session:
             try:
                 user_in_db = session.query(User).filter_by(
                     user_id=user_id).first()
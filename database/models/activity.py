@@ -0,0 +1,29 @@
+from sqlalchemy import Column, BigInteger, Integer, DateTime, Index
+from database.db_setup import Base
+
+
+class MessageActivity(Base):
+    __tablename__ = 'message_activity'
+
+    chat_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    user_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    # Начало часа (naive UTC, как метки времени сообщений)
+    hour = Column(DateTime, primary_key=True)
+    message_count = Column(Integer, nullable=False, default=0)
+    char_count = Column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        Index('ix_message_activity_chat_hour', 'chat_id', 'hour'),
+    )
+
+    def __repr__(self):
+        return f"<MessageActivity(chat_id={self.chat_id}, user_id={self.user_id}, hour={self.hour}, message_count={self.message_count})>"
+
+    def to_dict(self):
+        return {
+            "chat_id": self.chat_id,
+            "user_id": self.user_id,
+            "hour": self.hour.isoformat() if self.hour else None,
+            "message_count": self.message_count,
+            "char_count": self.char_count,
+        }
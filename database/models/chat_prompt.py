@@ -0,0 +1,22 @@
+from sqlalchemy import Column, String, BigInteger, Integer
+from database.db_setup import Base
+
+
+class ChatPrompt(Base):
+    __tablename__ = 'chat_prompts'
+
+    # Дополнительные промпты чата (к Chat.default_prompt_id)
+    chat_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    prompt_id = Column(String, primary_key=True)
+    # Порядок результатов в отправляемом сообщении
+    position = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ChatPrompt(chat_id={self.chat_id}, prompt_id={self.prompt_id}, position={self.position})>"
+
+    def to_dict(self):
+        return {
+            "chat_id": self.chat_id,
+            "prompt_id": self.prompt_id,
+            "position": self.position,
+        }
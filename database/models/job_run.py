@@ -0,0 +1,56 @@
+from sqlalchemy import Column, BigInteger, Integer, String, DateTime, Index
+from database.db_setup import Base
+
+
+class JobRun(Base):
+    __tablename__ = 'job_runs'
+
+    run_id = Column(Integer, primary_key=True, autoincrement=True)
+    # analysis, analysis_batch (доли чатов пакета — analysis_batch_chat), send
+    job = Column(String(32), nullable=False)
+    # Для пакетного анализа не задан: запросы к модели общие для нескольких чатов
+    chat_id = Column(BigInteger, nullable=True)
+    # Начало и конец запуска (naive UTC)
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=False)
+    # Собственное время этапов, мс (вложенные этапы не входят в объемлющий)
+    fetch_ms = Column(Integer, nullable=True)
+    encode_ms = Column(Integer, nullable=True)
+    llm_ms = Column(Integer, nullable=True)
+    save_ms = Column(Integer, nullable=True)
+    send_ms = Column(Integer, nullable=True)
+    total_ms = Column(Integer, nullable=False)
+    message_count = Column(Integer, nullable=True)
+    tokens_input = Column(Integer, nullable=True)
+    tokens_output = Column(Integer, nullable=True)
+    # ok, empty (нечего анализировать/сохранять), error
+    outcome = Column(String(16), nullable=False)
+    error_class = Column(String(128), nullable=True)
+
+    __table_args__ = (
+        Index('ix_job_runs_started_at', 'started_at'),
+        Index('ix_job_runs_chat_started_at', 'chat_id', 'started_at'),
+    )
+
+    def __repr__(self):
+        return f"<JobRun(job={self.job}, chat_id={self.chat_id}, total_ms={self.total_ms}, outcome={self.outcome})>"
+
+    def to_dict(self):
+        return {
+            "run_id": self.run_id,
+            "job": self.job,
+            "chat_id": self.chat_id,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "fetch_ms": self.fetch_ms,
+            "encode_ms": self.encode_ms,
+            "llm_ms": self.llm_ms,
+            "save_ms": self.save_ms,
+            "send_ms": self.send_ms,
+            "total_ms": self.total_ms,
+            "message_count": self.message_count,
+            "tokens_input": self.tokens_input,
+            "tokens_output": self.tokens_output,
+            "outcome": self.outcome,
+            "error_class": self.error_class,
+        }
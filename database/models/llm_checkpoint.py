@@ -0,0 +1,25 @@
+from sqlalchemy import Column, BigInteger, Integer, String, Text, DateTime, Index
+from database.db_setup import Base
+
+
+class LlmCheckpoint(Base):
+    __tablename__ = 'llm_checkpoints'
+
+    checkpoint_id = Column(Integer, primary_key=True, autoincrement=True)
+    chat_id = Column(BigInteger, nullable=False)
+    # Результат analyze (JSON): по элементу на промпт — текст, токены, filters;
+    # для queued — параметры анализа (analysis_time, message_count, nominal)
+    payload = Column(Text, nullable=False)
+    # llm — ответ модели получен, saved — сохранён в analysis_results, sent — отправлен;
+    # queued — анализ не выполнен к остановке, resumed — поставлен снова при старте
+    status = Column(String(16), nullable=False, default='llm')
+    # naive UTC
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('ix_llm_checkpoints_status_created_at', 'status', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f"<LlmCheckpoint(chat_id={self.chat_id}, status={self.status}, created_at={self.created_at})>"
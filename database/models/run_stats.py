@@ -0,0 +1,34 @@
+from datetime import datetime
+from sqlalchemy import Column, BigInteger, Integer, Float, DateTime
+from database.db_setup import Base
+
+
+class ChatRunStats(Base):
+    __tablename__ = 'chat_run_stats'
+
+    chat_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    # Приоритет чата: задачи более высокого уровня запускаются раньше (задаётся вручную)
+    priority = Column(Integer, nullable=False, default=0)
+    # Скользящие средние (EWMA) по прошлым запускам анализа
+    avg_seconds = Column(Float, nullable=True)
+    avg_seconds_per_message = Column(Float, nullable=True)
+    avg_tokens_per_message = Column(Float, nullable=True)
+    avg_tokens_output = Column(Float, nullable=True)
+    last_message_count = Column(Integer, nullable=True)
+    runs = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<ChatRunStats(chat_id={self.chat_id}, priority={self.priority}, avg_seconds={self.avg_seconds})>"
+
+    def to_dict(self):
+        return {
+            "chat_id": self.chat_id,
+            "priority": self.priority,
+            "avg_seconds": self.avg_seconds,
+            "avg_seconds_per_message": self.avg_seconds_per_message,
+            "avg_tokens_per_message": self.avg_tokens_per_message,
+            "avg_tokens_output": self.avg_tokens_output,
+            "last_message_count": self.last_message_count,
+            "runs": self.runs,
+        }
@@ -0,0 +1,15 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, BigInteger, DateTime
+from database.db_setup import Base
+
+
+class ScheduleVersion(Base):
+    __tablename__ = 'schedule_version'
+
+    # Одна строка (id = 1): счётчик изменений расписаний чатов
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<ScheduleVersion(version={self.version}, updated_at={self.updated_at})>"
@@ -0,0 +1,36 @@
+import uuid
+from datetime import datetime
+from sqlalchemy import Column, String, Text, DateTime, BigInteger, Integer, Index
+from database.db_setup import Base
+
+
+class MessageSummary(Base):
+    __tablename__ = 'message_summaries'
+
+    summary_id = Column(String, primary_key=True,
+                        default=lambda: str(uuid.uuid4()))
+    chat_id = Column(BigInteger, nullable=False)
+    # Границы часа, за который составлена сводка (UTC, [start, end))
+    period_start = Column(DateTime, nullable=False)
+    period_end = Column(DateTime, nullable=False)
+    # Текст сводки (пустой, если за час не было сообщений)
+    summary_text = Column(Text, nullable=False, default='')
+    message_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index('ix_message_summaries_chat_period', 'chat_id', 'period_start'),
+    )
+
+    def __repr__(self):
+        return f"<MessageSummary(chat_id={self.chat_id}, period_start={self.period_start}, message_count={self.message_count})>"
+
+    def to_dict(self):
+        return {
+            "summary_id": self.summary_id,
+            "chat_id": self.chat_id,
+            "period_start": self.period_start.isoformat() if self.period_start else None,
+            "period_end": self.period_end.isoformat() if self.period_end else None,
+            "summary_text": self.summary_text,
+            "message_count": self.message_count,
+        }
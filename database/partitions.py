@@ -0,0 +1,201 @@
+"""
+Секционирование таблицы messages по месяцам (PostgreSQL, PARTITION BY RANGE).
+
+Разовый перевод существующей таблицы:
+    python -m database.partitions migrate
+Создание будущих секций и применение политики хранения (то же делает задача планировщика):
+    python -m database.partitions maintain
+"""
+import logging
+import os
+import re
+import sys
+from datetime import date, datetime
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+load_dotenv()
+
+PARENT_TABLE = 'messages'
+ARCHIVE_SCHEMA = 'archive'
+_PARTITION_NAME = re.compile(r'^messages_p(\d{4})_(\d{2})$')
+
+
+def _month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def _add_months(value, months):
+    month_index = value.year * 12 + value.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{PARENT_TABLE}_p{month.year:04d}_{month.month:02d}"
+
+
+def is_partitioned(connection):
+    """Проверяет, секционирована ли уже таблица messages."""
+    return bool(connection.execute(text("""
+        SELECT 1 FROM pg_partitioned_table pt
+        JOIN pg_class c ON c.oid = pt.partrelid
+        WHERE c.relname = :table AND c.relnamespace = 'public'::regnamespace
+    """), {"table": PARENT_TABLE}).scalar())
+
+
+def _create_partition(connection, month):
+    name = partition_name(month)
+    connection.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE}
+        FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')
+    """))
+    return name
+
+
+def ensure_partitions(engine, months_ahead=2, today=None):
+    """
+    Создаёт секции на текущий и months_ahead следующих месяцев.
+    """
+    current = _month_start(today or datetime.utcnow())
+    created = []
+    with engine.begin() as connection:
+        if not is_partitioned(connection):
+            logging.warning(
+                "Таблица messages не секционирована, создание секций пропущено.")
+            return created
+        for offset in range(months_ahead + 1):
+            created.append(_create_partition(
+                connection, _add_months(current, offset)))
+    return created
+
+
+def list_partitions(connection):
+    """Возвращает [(имя секции, первый день месяца)] по возрастанию."""
+    rows = connection.execute(text("""
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = :table
+    """), {"table": PARENT_TABLE}).scalars().all()
+    partitions = []
+    for name in rows:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            partitions.append(
+                (name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda item: item[1])
+
+
+def apply_retention(engine, retention_months, mode='detach', today=None):
+    """
+    Отцепляет секции, целиком старше retention_months месяцев.
+
+    :param mode: 'detach' — оставить отдельной таблицей, 'archive' — перенести
+                 в схему archive, 'drop' — удалить.
+    """
+    if retention_months <= 0:
+        return []
+    if mode not in ('detach', 'archive', 'drop'):
+        raise ValueError(f"Неизвестный режим хранения секций: {mode}")
+
+    oldest_kept = _add_months(
+        _month_start(today or datetime.utcnow()), -retention_months)
+    processed = []
+    with engine.begin() as connection:
+        if not is_partitioned(connection):
+            return processed
+        if mode == 'archive':
+            connection.execute(
+                text(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}"))
+        for name, month in list_partitions(connection):
+            if _add_months(month, 1) > oldest_kept:
+                continue
+            connection.execute(
+                text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+            if mode == 'drop':
+                connection.execute(text(f"DROP TABLE {name}"))
+            elif mode == 'archive':
+                connection.execute(
+                    text(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}"))
+            logging.info(f"Секция {name} обработана в режиме {mode}.")
+            processed.append(name)
+    return processed
+
+
+def migrate_messages_to_partitioned(engine, months_ahead=2):
+    """
+    Разово переводит messages в секционированную таблицу.
+    Старая таблица сохраняется как messages_legacy — удалите её вручную после проверки.
+    """
+    with engine.begin() as connection:
+        if is_partitioned(connection):
+            logging.info("Таблица messages уже секционирована.")
+            return False
+
+        bounds = connection.execute(text(
+            f'SELECT min("timestamp"), max("timestamp") FROM {PARENT_TABLE}')).one()
+        now = datetime.utcnow()
+        first_month = _month_start(bounds[0] or now)
+        last_month = _add_months(_month_start(max(bounds[1] or now, now)), months_ahead)
+
+        connection.execute(
+            text(f"ALTER TABLE {PARENT_TABLE} RENAME TO {PARENT_TABLE}_legacy"))
+        connection.execute(text(f"""
+            CREATE TABLE {PARENT_TABLE} (LIKE {PARENT_TABLE}_legacy INCLUDING DEFAULTS INCLUDING GENERATED)
+            PARTITION BY RANGE ("timestamp")
+        """))
+        # Ключ секционированной таблицы обязан включать столбец секционирования
+        connection.execute(text(
+            f'ALTER TABLE {PARENT_TABLE} ADD PRIMARY KEY (message_id, "timestamp")'))
+        connection.execute(text(f"""
+            CREATE INDEX IF NOT EXISTS ix_{PARENT_TABLE}_chat_id_timestamp
+            ON {PARENT_TABLE} (chat_id, "timestamp")
+        """))
+
+        month = first_month
+        while month <= last_month:
+            _create_partition(connection, month)
+            month = _add_months(month, 1)
+
+        # Вычисляемые столбцы (например, text_tsv поиска) БД заполнит сама
+        columns = ', '.join(f'"{name}"' for name in connection.execute(text("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = 'public' AND table_name = :table AND is_generated = 'NEVER'
+            ORDER BY ordinal_position
+        """), {"table": f"{PARENT_TABLE}_legacy"}).scalars())
+        connection.execute(text(
+            f"INSERT INTO {PARENT_TABLE} ({columns}) SELECT {columns} FROM {PARENT_TABLE}_legacy"))
+    logging.info(f"""Таблица messages секционирована по месяцам ({
+                 first_month} - {last_month}).""")
+    return True
+
+
+def maintain_partitions(engine):
+    """
+    Создаёт будущие секции и применяет политику хранения из переменных окружения.
+    """
+    months_ahead = int(os.getenv('MESSAGES_PARTITION_MONTHS_AHEAD', '2'))
+    retention_months = int(os.getenv('MESSAGES_RETENTION_MONTHS', '0'))
+    retention_mode = os.getenv('MESSAGES_RETENTION_MODE', 'detach')
+
+    created = ensure_partitions(engine, months_ahead)
+    processed = apply_retention(engine, retention_months, retention_mode)
+    logging.info(f"""Обслуживание секций messages: актуальны {
+                 created}, отцеплены {processed}.""")
+    return created, processed
+
+
+if __name__ == '__main__':
+    from database.db_setup import init_db
+    from utils.logging_setup import setup_logging
+
+    setup_logging()
+    command = sys.argv[1] if len(sys.argv) > 1 else 'maintain'
+    engine, _, _ = init_db(os.getenv('DATABASE_URL'), pool_size=1, max_overflow=0)
+    if command == 'migrate':
+        migrate_messages_to_partitioned(engine)
+        maintain_partitions(engine)
+    elif command == 'maintain':
+        maintain_partitions(engine)
+    else:
+        sys.exit(f"Неизвестная команда: {command} (migrate | maintain)")
@@ -0,0 +1,167 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.orm import Session as OrmSession
+from sqlalchemy.sql.dml import UpdateBase
+
+load_dotenv()
+
+# Насколько реплике разрешено отставать; более свежие данные читаем с основной БД
+REPLICA_MAX_LAG_SECONDS = int(os.getenv('REPLICA_MAX_LAG_SECONDS', '60'))
+# Как часто перепроверять фактическое отставание реплики
+REPLICA_LAG_CHECK_SECONDS = int(os.getenv('REPLICA_LAG_CHECK_SECONDS', '30'))
+
+
+class RoutingSession(OrmSession):
+    """
+    Сессия, отправляющая чтения в блоке read_only() на реплику, а всё остальное
+    (записи, flush, чтения вне блока) — на основную БД.
+    """
+
+    def __init__(self, *args, replica_bind=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replica_bind = replica_bind
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if (
+            self.replica_bind is not None
+            and self.info.get('prefer_replica')
+            and not self._flushing
+            and not isinstance(clause, UpdateBase)
+        ):
+            return self.replica_bind
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+
+@contextmanager
+def read_only(session):
+    """
+    Направляет чтения сессии внутри блока на реплику (если она настроена).
+    """
+    previous = session.info.get('prefer_replica', False)
+    session.info['prefer_replica'] = True
+    try:
+        yield session
+    finally:
+        session.info['prefer_replica'] = previous
+
+
+class _LagCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._lag = None
+
+    def get(self, replica_bind):
+        with self._lock:
+            if time.monotonic() - self._checked_at < REPLICA_LAG_CHECK_SECONDS:
+                return self._lag
+            self._checked_at = time.monotonic()
+            self._lag = _measure_lag(replica_bind)
+            return self._lag
+
+
+def _measure_lag(replica_bind):
+    """
+    Отставание реплики в секундах; None, если реплика недоступна.
+    Для сервера не в режиме восстановления (не физическая реплика) считаем отставание нулевым.
+    """
+    try:
+        with replica_bind.connect() as connection:
+            lag = connection.execute(text("""
+                SELECT CASE
+                    WHEN NOT pg_is_in_recovery() THEN 0
+                    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+                END
+            """)).scalar()
+            return float(lag or 0)
+    except Exception as e:
+        logging.warning(f"Не удалось измерить отставание реплики: {e}")
+        return None
+
+
+_lag_cache = _LagCache()
+
+
+def replica_cutoff(session):
+    """
+    Момент (naive UTC), до которого данным реплики можно доверять,
+    или None, если читать нужно только с основной БД.
+    """
+    replica_bind = getattr(session, 'replica_bind', None)
+    if replica_bind is None:
+        return None
+    lag = _lag_cache.get(replica_bind)
+    if lag is None or lag > REPLICA_MAX_LAG_SECONDS:
+        if lag is not None:
+            logging.warning(
+                f"Реплика отстаёт на {lag:.0f} с, чтение идёт с основной БД.")
+        return None
+    return datetime.utcnow() - timedelta(seconds=REPLICA_MAX_LAG_SECONDS)
+
+
+def to_naive_utc(value):
+    """Приводит datetime к naive UTC, как хранятся метки времени сообщений."""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def routed_all(session, query, column, end_date=None):
+    """
+    Выполняет запрос на чтение: часть окна до границы доверия — с реплики,
+    свежий хвост (column > границы) — с основной БД.
+    """
+    cutoff = replica_cutoff(session)
+    if cutoff is None:
+        return query.all()
+    end_date = to_naive_utc(end_date)
+    if end_date is not None and end_date <= cutoff:
+        with read_only(session):
+            return query.all()
+    with read_only(session):
+        head = query.filter(column <= cutoff).all()
+    tail = query.filter(column > cutoff).all()
+    return head + tail
+
+
+def routed_iter(session, query, column, end_date=None, batch_size=1000):
+    """
+    Потоковый вариант routed_all: строки читаются порциями по batch_size
+    (курсор на стороне сервера), сначала с реплики, затем свежий хвост с основной БД.
+    """
+    cutoff = replica_cutoff(session)
+    if cutoff is None:
+        yield from query.yield_per(batch_size)
+        return
+    end_date = to_naive_utc(end_date)
+    if end_date is not None and end_date <= cutoff:
+        with read_only(session):
+            yield from query.yield_per(batch_size)
+        return
+    with read_only(session):
+        yield from query.filter(column <= cutoff).yield_per(batch_size)
+    yield from query.filter(column > cutoff).yield_per(batch_size)
+
+
+def routed_scalar_sum(session, query, column, end_date=None):
+    """
+    То же, что routed_all, для агрегатов-счётчиков: суммирует значения с реплики и основной БД.
+    """
+    cutoff = replica_cutoff(session)
+    if cutoff is None:
+        return query.scalar() or 0
+    end_date = to_naive_utc(end_date)
+    if end_date is not None and end_date <= cutoff:
+        with read_only(session):
+            return query.scalar() or 0
+    with read_only(session):
+        head = query.filter(column <= cutoff).scalar() or 0
+    tail = query.filter(column > cutoff).scalar() or 0
+    return head + tail
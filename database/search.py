@@ -0,0 +1,119 @@
+"""
+Полнотекстовый поиск по messages.
+
+PostgreSQL: вычисляемый столбец text_tsv (конфигурация 'russian') и GIN-индекс.
+SQLite (локальная отладка): таблица FTS5 messages_fts, синхронизируемая триггерами.
+
+Создание индекса — однократная миграция, не при старте планировщика:
+    python -m database.search
+В PostgreSQL добавление вычисляемого столбца переписывает всю таблицу messages
+под ACCESS EXCLUSIVE и блокирует запись основного сервиса: запускать в окно
+обслуживания.
+"""
+import logging
+import os
+from dotenv import load_dotenv
+from sqlalchemy import func, literal_column, text
+from sqlalchemy.sql import column, table
+
+load_dotenv()
+
+SEARCH_CONFIG = 'russian'
+HIGHLIGHT_START = '<b>'
+HIGHLIGHT_STOP = '</b>'
+
+_FTS_TABLE = table('messages_fts', column('rowid'))
+
+
+def ensure_search_index(engine):
+    """
+    Создаёт столбец/таблицу поиска и индекс, если их ещё нет.
+    Столбец text_tsv в модели Message не отображается: его заполняет сама БД.
+    """
+    with engine.begin() as connection:
+        if connection.dialect.name == 'postgresql':
+            connection.execute(text(f"""
+                ALTER TABLE messages ADD COLUMN IF NOT EXISTS text_tsv tsvector
+                GENERATED ALWAYS AS (to_tsvector('{SEARCH_CONFIG}', coalesce(text, ''))) STORED
+            """))
+        elif connection.dialect.name == 'sqlite':
+            exists = connection.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'")).scalar()
+            if exists:
+                return
+            connection.execute(text("""
+                CREATE VIRTUAL TABLE messages_fts USING fts5(
+                    text, content='messages', content_rowid='rowid', tokenize='unicode61'
+                )
+            """))
+            connection.execute(text("""
+                CREATE TRIGGER messages_fts_ai AFTER INSERT ON messages BEGIN
+                    INSERT INTO messages_fts(rowid, text) VALUES (new.rowid, new.text);
+                END
+            """))
+            connection.execute(text("""
+                CREATE TRIGGER messages_fts_ad AFTER DELETE ON messages BEGIN
+                    INSERT INTO messages_fts(messages_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+                END
+            """))
+            connection.execute(text("""
+                CREATE TRIGGER messages_fts_au AFTER UPDATE ON messages BEGIN
+                    INSERT INTO messages_fts(messages_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+                    INSERT INTO messages_fts(rowid, text) VALUES (new.rowid, new.text);
+                END
+            """))
+            connection.execute(
+                text("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')"))
+        else:
+            raise ValueError(
+                f"Полнотекстовый поиск не поддерживается для {connection.dialect.name}")
+    if engine.dialect.name == 'postgresql':
+        # Индекс строим без блокировки записи (CONCURRENTLY — вне транзакции)
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.execute(text(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_messages_text_tsv "
+                "ON messages USING GIN (text_tsv)"))
+    logging.info("Индекс полнотекстового поиска по сообщениям готов.")
+
+
+def _fts5_query(query):
+    # Каждое слово — отдельная фраза: спецсимволы FTS5 в запросе пользователя не работают
+    return ' '.join('"' + word.replace('"', '""') + '"' for word in query.split())
+
+
+def search_clauses(dialect, query):
+    """
+    Возвращает (таблица для join или None, условие соответствия,
+    выражение релевантности — больше лучше, выражение подсветки).
+    """
+    if dialect == 'postgresql':
+        tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, query)
+        tsv = literal_column('messages.text_tsv')
+        return (
+            None,
+            tsv.op('@@')(tsquery),
+            func.ts_rank_cd(tsv, tsquery),
+            func.ts_headline(
+                SEARCH_CONFIG, literal_column('messages.text'), tsquery,
+                f'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, MaxFragments=2')
+        )
+    if dialect == 'sqlite':
+        fts = literal_column('messages_fts')
+        return (
+            _FTS_TABLE,
+            fts.op('MATCH')(_fts5_query(query)),
+            # bm25 в FTS5: чем меньше, тем релевантнее
+            -func.bm25(fts),
+            func.snippet(fts, 0, HIGHLIGHT_START, HIGHLIGHT_STOP, '…', 16)
+        )
+    raise ValueError(
+        f"Полнотекстовый поиск не поддерживается для {dialect}")
+
+
+if __name__ == '__main__':
+    from database.db_setup import init_db
+    from utils.logging_setup import setup_logging
+
+    setup_logging()
+    engine, _, _ = init_db(os.getenv('DATABASE_URL'), pool_size=1, max_overflow=0)
+    ensure_search_index(engine)
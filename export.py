@@ -0,0 +1,279 @@
+"""
+Выгрузка messages и analysis_results в Parquet/CSV для аналитиков.
+
+    python export.py --out export [--tables messages,analysis_results]
+                     [--format parquet|csv] [--chunk-size 50000]
+                     [--start 2025-01-01] [--end 2025-02-01] [--fresh]
+
+Строки читаются курсором на стороне сервера порциями по chunk-size, поэтому
+память не зависит от размера таблицы. Файлы раскладываются по чату и дню:
+    <out>/<таблица>/chat_id=<id>/date=<YYYY-MM-DD>/part-00000.parquet
+Завершённые разделы записываются в <out>/<таблица>/_manifest.json; повторный
+запуск продолжает с первого незавершённого раздела (--fresh — выгрузить заново).
+По умолчанию выгружаются только завершённые сутки (до начала текущего дня UTC).
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+from contextlib import nullcontext
+from datetime import date, datetime, timedelta
+from dotenv import load_dotenv
+from sqlalchemy import and_, or_, select
+
+load_dotenv()
+
+MANIFEST_NAME = '_manifest.json'
+
+
+class TableSpec:
+    """
+    Что и в каком порядке выгружать.
+
+    unit(row) — раздел, после которого выгрузку можно продолжить: строки идут
+    в порядке разделов, поэтому смена раздела означает, что предыдущий завершён.
+    """
+
+    def __init__(self, name, columns, timestamp, order_by, unit, resume_filter, to_frame):
+        self.name = name
+        self.columns = columns
+        self.timestamp = timestamp
+        self.order_by = order_by
+        self.unit = unit
+        self.resume_filter = resume_filter
+        self.to_frame = to_frame
+
+
+def _day(value):
+    return value.date().isoformat()
+
+
+def _next_day_start(day):
+    return datetime.combine(date.fromisoformat(day) + timedelta(days=1), datetime.min.time())
+
+
+def messages_spec():
+    from database.models.messages import Message
+
+    def resume_filter(last_unit):
+        chat_id, day = last_unit
+        return or_(
+            Message.chat_id > chat_id,
+            and_(Message.chat_id == chat_id,
+                 Message.timestamp >= _next_day_start(day))
+        )
+
+    def to_frame(pd, rows):
+        return pd.DataFrame.from_records(
+            rows, columns=['message_id', 'timestamp', 'user_id', 'chat_id', 'text', 's3_key'])
+
+    return TableSpec(
+        name='messages',
+        columns=[Message.message_id, Message.timestamp, Message.user_id,
+                 Message.chat_id, Message.text, Message.s3_key],
+        timestamp=Message.timestamp,
+        order_by=[Message.chat_id, Message.timestamp],
+        unit=lambda row: [row.chat_id, _day(row.timestamp)],
+        resume_filter=resume_filter,
+        to_frame=to_frame,
+    )
+
+
+def analyses_spec():
+    from database.models.analysis import AnalysisResult
+
+    def to_frame(pd, rows):
+        frame = pd.DataFrame.from_records(rows, columns=[
+            'analysis_id', 'prompt_id', 'result_text', 'timestamp',
+            'filters', 'tokens_input', 'tokens_output'])
+        # chat_id хранится только внутри filters (JSON-строка)
+        frame['chat_id'] = [
+            (json.loads(filters) if filters else {}).get('chat_id') for filters in frame['filters']]
+        return frame
+
+    return TableSpec(
+        name='analysis_results',
+        columns=[AnalysisResult.analysis_id, AnalysisResult.prompt_id, AnalysisResult.result_text,
+                 AnalysisResult.timestamp, AnalysisResult.filters,
+                 AnalysisResult.tokens_input, AnalysisResult.tokens_output],
+        timestamp=AnalysisResult.timestamp,
+        # Чата нет в столбцах таблицы, поэтому раздел для продолжения — день
+        order_by=[AnalysisResult.timestamp, AnalysisResult.analysis_id],
+        unit=lambda row: [_day(row.timestamp)],
+        resume_filter=lambda last_unit: AnalysisResult.timestamp >= _next_day_start(
+            last_unit[0]),
+        to_frame=to_frame,
+    )
+
+
+SPECS = {
+    'messages': messages_spec,
+    'analysis_results': analyses_spec,
+}
+
+
+def load_manifest(table_dir):
+    path = os.path.join(table_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(table_dir, manifest):
+    path = os.path.join(table_dir, MANIFEST_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+class PartitionWriter:
+    """
+    Пишет порции строк в файлы chat_id=<id>/date=<день>/part-NNNNN.<формат>.
+    Каталог раздела, впервые встреченный за запуск, очищается от файлов
+    прерванной выгрузки.
+    """
+
+    def __init__(self, table_dir, file_format):
+        self.table_dir = table_dir
+        self.file_format = file_format
+        self._parts = {}
+
+    def write(self, frame):
+        frame['date'] = frame['timestamp'].dt.date
+        written = 0
+        for (chat_id, day), group in frame.groupby(['chat_id', 'date'], dropna=False, sort=False):
+            chat_dir = 'unknown' if chat_id is None or chat_id != chat_id else int(chat_id)
+            directory = os.path.join(
+                self.table_dir, f"chat_id={chat_dir}", f"date={day.isoformat()}")
+            if directory not in self._parts:
+                shutil.rmtree(directory, ignore_errors=True)
+                os.makedirs(directory, exist_ok=True)
+                self._parts[directory] = 0
+            path = os.path.join(
+                directory, f"part-{self._parts[directory]:05d}.{self.file_format}")
+            group = group.drop(columns=['date'])
+            if self.file_format == 'parquet':
+                group.to_parquet(path, index=False)
+            else:
+                group.to_csv(path, index=False)
+            self._parts[directory] += 1
+            written += len(group)
+        return written
+
+
+def export_table(session, spec, out_dir, file_format='parquet', chunk_size=50000,
+                 start=None, end=None, fresh=False):
+    """
+    Выгружает таблицу по разделам с продолжением с места остановки.
+
+    :return: Число выгруженных строк за этот запуск.
+    """
+    import pandas as pd
+
+    table_dir = os.path.join(out_dir, spec.name)
+    if fresh:
+        shutil.rmtree(table_dir, ignore_errors=True)
+    os.makedirs(table_dir, exist_ok=True)
+
+    # Продолжать можно только ту же выгрузку: порядок разделов зависит от периода
+    params = {
+        "format": file_format,
+        "start": start and start.isoformat(),
+        "end": end and end.isoformat(),
+    }
+    manifest = load_manifest(table_dir)
+    if manifest and any(manifest.get(key) != value for key, value in params.items()):
+        raise ValueError(
+            f"Выгрузка {table_dir} начата с другими параметрами (формат, период), используйте --fresh.")
+    manifest.update(params)
+
+    query = select(*spec.columns)
+    if start is not None:
+        query = query.where(spec.timestamp >= start)
+    if end is not None:
+        query = query.where(spec.timestamp < end)
+    if manifest.get('last_unit'):
+        logging.info(f"{spec.name}: продолжаем после раздела {manifest['last_unit']}.")
+        query = query.where(spec.resume_filter(manifest['last_unit']))
+    query = query.order_by(*spec.order_by).execution_options(yield_per=chunk_size)
+
+    writer = PartitionWriter(table_dir, file_format)
+    previous_rows = manifest.get('rows', 0)
+    exported = 0
+    buffer = []
+    current_unit = None
+
+    def flush():
+        nonlocal exported, buffer
+        if buffer:
+            exported += writer.write(spec.to_frame(pd, buffer))
+            buffer = []
+
+    for partition in session.execute(query).partitions(chunk_size):
+        for row in partition:
+            unit = spec.unit(row)
+            if current_unit is not None and unit != current_unit:
+                flush()
+                manifest['last_unit'] = current_unit
+                manifest['rows'] = previous_rows + exported
+                save_manifest(table_dir, manifest)
+            current_unit = unit
+            buffer.append(tuple(row))
+            if len(buffer) >= chunk_size:
+                flush()
+    flush()
+    if current_unit is not None:
+        manifest['last_unit'] = current_unit
+    manifest['rows'] = previous_rows + exported
+    manifest['finished_at'] = datetime.utcnow().isoformat()
+    save_manifest(table_dir, manifest)
+    logging.info(f"{spec.name}: выгружено строк {exported} (всего {manifest['rows']}).")
+    return exported
+
+
+def main():
+    from database import init_db, set_db_globals
+    from database.routing import read_only, replica_cutoff
+    from utils.logging_setup import setup_logging
+
+    parser = argparse.ArgumentParser(
+        description="Потоковая выгрузка сообщений и анализов в Parquet/CSV.")
+    parser.add_argument('--out', default='export', help="Каталог выгрузки.")
+    parser.add_argument('--tables', default='messages,analysis_results',
+                        help="Таблицы через запятую: messages, analysis_results.")
+    parser.add_argument('--format', choices=('parquet', 'csv'), default='parquet')
+    parser.add_argument('--chunk-size', type=int, default=50000,
+                        help="Строк в порции чтения и записи.")
+    parser.add_argument('--start', type=date.fromisoformat,
+                        help="Первый день (UTC, включительно).")
+    parser.add_argument('--end', type=date.fromisoformat,
+                        help="Последний день (UTC, не включительно); по умолчанию — сегодня.")
+    parser.add_argument('--fresh', action='store_true',
+                        help="Игнорировать манифест и выгрузить заново.")
+    args = parser.parse_args()
+
+    setup_logging()
+    engine, Session, Base = init_db(
+        os.getenv('DATABASE_URL'), pool_size=1, max_overflow=0,
+        replica_url=os.getenv('DATABASE_REPLICA_URL') or None)
+    set_db_globals(engine, Session, Base)
+
+    start = datetime.combine(args.start, datetime.min.time()) if args.start else None
+    end = datetime.combine(args.end or datetime.utcnow().date(), datetime.min.time())
+    for name in [name.strip() for name in args.tables.split(',') if name.strip()]:
+        if name not in SPECS:
+            raise SystemExit(f"Неизвестная таблица: {name} ({', '.join(SPECS)})")
+        with Session() as session:
+            # История не меняется: читаем с реплики, если она не отстаёт сверх допустимого
+            source = read_only(session) if replica_cutoff(
+                session) is not None else nullcontext()
+            with source:
+                export_table(session, SPECS[name](), args.out, args.format,
+                             args.chunk_size, start, end, args.fresh)
+
+
+if __name__ == '__main__':
+    main()
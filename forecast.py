@@ -0,0 +1,152 @@
+"""
+Прогноз нагрузки планировщика на ближайшие часы.
+
+    python forecast.py [--hours 24] [--workers N] [--json]
+
+Для каждого часа (по Новосибирску) показывает чаты с анализом и отправкой,
+ожидаемый объём сообщений (по последним суткам), оценку токенов и времени LLM
+по истории запусков (chat_run_stats) и итоги по часу.
+"""
+import argparse
+import heapq
+import json
+import os
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from pytz import timezone
+
+load_dotenv()
+
+novosibirsk_tz = timezone('Asia/Novosibirsk')
+
+# Символов на токен для русского текста (если по чату ещё нет статистики токенов)
+CHARS_PER_TOKEN = float(os.getenv('FORECAST_CHARS_PER_TOKEN', '3.5'))
+# Служебные поля сообщения при кодировании (пользователь, чат, время, JSON)
+MESSAGE_OVERHEAD_CHARS = 90
+
+
+def estimate_tokens(stats, message_count, chars):
+    """Оценивает число входных токенов анализа чата."""
+    if stats and stats.get("avg_tokens_per_message") and message_count:
+        return int(stats["avg_tokens_per_message"] * message_count)
+    return int((chars + MESSAGE_OVERHEAD_CHARS * message_count) / CHARS_PER_TOKEN)
+
+
+def makespan(durations, workers):
+    """Время выполнения задач на workers потоках при запуске самых долгих первыми."""
+    if not durations:
+        return 0.0
+    heap = [0.0] * max(workers, 1)
+    for duration in sorted(durations, reverse=True):
+        heapq.heappush(heap, heapq.heappop(heap) + duration)
+    return max(heap)
+
+
+def build_forecast(chats, volumes, stats, start, hours, workers, incremental=False):
+    """
+    Строит прогноз по часам.
+
+    :param chats: Чаты (объекты Chat).
+    :param volumes: dict chat_id -> (число сообщений, длина текстов) за сутки.
+    :param stats: dict chat_id -> статистика запусков.
+    :param start: Начало первого часа (aware, Новосибирск).
+    """
+    from utils.slots import estimate_cost
+
+    scheduled = [chat for chat in chats if chat.schedule_analysis]
+    forecast = []
+    for offset in range(hours):
+        hour_start = start + timedelta(hours=offset)
+        analyses = []
+        for chat in scheduled:
+            if not chat.analysis_time or chat.analysis_time.hour != hour_start.hour:
+                continue
+            count, chars = volumes.get(chat.chat_id, (0, 0))
+            chat_stats = stats.get(chat.chat_id)
+            analyses.append({
+                "chat_id": chat.chat_id,
+                "chat_name": chat.chat_name,
+                "messages": count,
+                "tokens_input": estimate_tokens(chat_stats, count, chars),
+                "tokens_output": int((chat_stats or {}).get("avg_tokens_output") or 0),
+                "llm_seconds": round(estimate_cost(chat_stats, count), 1),
+            })
+        analyses.sort(key=lambda item: -item["llm_seconds"])
+        sends = [chat.chat_id for chat in scheduled
+                 if chat.send_time and chat.send_time.hour == hour_start.hour]
+        llm_calls = len(analyses) + (len(scheduled) if incremental else 0)
+        forecast.append({
+            "hour": hour_start.strftime('%Y-%m-%d %H:00'),
+            "analyses": analyses,
+            "sends": sends,
+            "summaries": len(scheduled) if incremental else 0,
+            "llm_calls": llm_calls,
+            "messages": sum(item["messages"] for item in analyses),
+            "tokens_input": sum(item["tokens_input"] for item in analyses),
+            "tokens_output": sum(item["tokens_output"] for item in analyses),
+            "llm_seconds": round(sum(item["llm_seconds"] for item in analyses), 1),
+            "makespan_seconds": round(makespan(
+                [item["llm_seconds"] for item in analyses], workers), 1),
+        })
+    return forecast
+
+
+def print_forecast(forecast, workers):
+    for hour in forecast:
+        print(f"{hour['hour']}  анализов: {len(hour['analyses'])}, отправок: {len(hour['sends'])}, "
+              f"вызовов LLM: {hour['llm_calls']}, сообщений: {hour['messages']}, "
+              f"токенов: ~{hour['tokens_input']} / ~{hour['tokens_output']}, "
+              f"LLM: ~{hour['llm_seconds']} с, на {workers} потоках: ~{hour['makespan_seconds']} с")
+        for item in hour["analyses"]:
+            print(f"    {item['chat_id']:>16} {str(item['chat_name'] or '')[:30]:<30} "
+                  f"сообщений: {item['messages']:>6}  токенов: ~{item['tokens_input']:>7}  "
+                  f"LLM: ~{item['llm_seconds']} с")
+
+
+def main():
+    from database import init_db, set_db_globals, create_scheduler_tables, unit_of_work
+    from database.managers.activity_manager import ActivityManager
+    from database.managers.chat_manager import ChatManager
+    from database.managers.message_manager import MessageManager
+    from database.managers.run_stats_manager import RunStatsManager
+    from utils.env import env_flag, env_int
+    from utils.logging_setup import setup_logging
+
+    parser = argparse.ArgumentParser(
+        description="Прогноз нагрузки планировщика по часам.")
+    parser.add_argument('--hours', type=int, default=24,
+                        help="Сколько часов вперёд (по умолчанию 24).")
+    parser.add_argument('--workers', type=int, default=env_int('ANALYSIS_WORKERS', 4),
+                        help="Число потоков анализа для оценки времени тика.")
+    parser.add_argument('--json', action='store_true', help="Вывод в JSON.")
+    args = parser.parse_args()
+
+    # Без LOG_LEVEL — только предупреждения: вывод команды — таблица прогноза
+    setup_logging(os.getenv('LOG_LEVEL', 'WARNING').upper())
+    engine, Session, Base = init_db(
+        os.getenv('DATABASE_URL'), pool_size=1, max_overflow=0,
+        replica_url=os.getenv('DATABASE_REPLICA_URL') or None)
+    set_db_globals(engine, Session, Base)
+    create_scheduler_tables(engine)
+
+    now_utc = datetime.utcnow()
+    with unit_of_work() as session:
+        chats = ChatManager(session).get_all_chats()
+        volume_source = ActivityManager(session) if env_flag(
+            'ACTIVITY_ROLLUP') else MessageManager(session)
+        volumes = volume_source.get_volume_by_chat(
+            now_utc - timedelta(days=1), now_utc)
+        stats = RunStatsManager(session).get_stats(
+            [chat.chat_id for chat in chats if chat.schedule_analysis])
+
+    start = datetime.now(novosibirsk_tz).replace(minute=0, second=0, microsecond=0)
+    forecast = build_forecast(chats, volumes, stats, start, args.hours, args.workers,
+                              incremental=env_flag('INCREMENTAL_ANALYSIS'))
+    if args.json:
+        print(json.dumps(forecast, ensure_ascii=False, indent=2))
+    else:
+        print_forecast(forecast, args.workers)
+
+
+if __name__ == '__main__':
+    main()
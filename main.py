@@ -1,13 +1,31 @@
+import asyncio
 import logging
+import os
+import signal
+import sys
 import time
-from scheduler import start_scheduler, scheduler
+from dotenv import load_dotenv
+from utils.logging_setup import setup_logging
+
+load_dotenv()
 
 if __name__ == "__main__":
-    logging.basicConfig(level=logging.INFO)
-    start_scheduler()
-    try:
-        while True:
-            time.sleep(1)  # Оставляем приложение запущенным
-    except (KeyboardInterrupt, SystemExit):
-        scheduler.shutdown()
-        logging.info("Планировщик остановлен.")
+    setup_logging()
+    # threaded — BackgroundScheduler и пул потоков, async — один цикл событий asyncio
+    if os.getenv('SCHEDULER_MODE', 'threaded') == 'async':
+        from async_scheduler import run_async_scheduler
+        # SIGTERM и Ctrl+C обрабатывает цикл событий: выполняющиеся задачи
+        # дожидаются SHUTDOWN_DRAIN_SECONDS
+        asyncio.run(run_async_scheduler())
+    else:
+        from scheduler import start_scheduler, stop_scheduler
+        # SIGTERM (остановка сервиса) обрабатываем так же, как Ctrl+C
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        start_scheduler()
+        try:
+            while True:
+                time.sleep(1)  # Оставляем приложение запущенным
+        except (KeyboardInterrupt, SystemExit):
+            # Новые задачи не запускаются, выполняющиеся дожидаются SHUTDOWN_DRAIN_SECONDS
+            stop_scheduler()
+            logging.info("Планировщик остановлен.")
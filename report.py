@@ -0,0 +1,138 @@
+"""
+Отчёт по журналу запусков (job_runs): самые медленные чаты и перцентили этапов.
+
+    python report.py [--start 2025-01-01] [--end 2025-01-08] [--job analysis]
+                     [--top 10] [--json]
+
+Период — по времени начала запуска (UTC, end не включительно); по умолчанию
+последние 7 суток. Время этапов — собственное (без вложенных этапов), в мс.
+"""
+import argparse
+import json
+import os
+from collections import Counter
+from datetime import date, datetime, timedelta
+from dotenv import load_dotenv
+
+load_dotenv()
+
+STAGES = ('fetch', 'encode', 'llm', 'save', 'send', 'total')
+PERCENTILES = (50, 90, 99)
+
+
+def percentiles(values):
+    """dict p50/p90/p99/max по непустым значениям или None, если значений нет."""
+    import numpy as np
+
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    result = dict(zip((f"p{p}" for p in PERCENTILES),
+                      (round(float(v)) for v in np.percentile(values, PERCENTILES))))
+    result["max"] = max(values)
+    return result
+
+
+def stage_percentiles(runs):
+    """Перцентили времени по этапам (этапы, которых не было в запусках, пропускаются)."""
+    stages = {}
+    for name in STAGES:
+        stats = percentiles([run[f"{name}_ms"] for run in runs])
+        if stats:
+            stages[name] = stats
+    return stages
+
+
+def slowest_chats(runs, top):
+    """Чаты с наибольшим p90 полного времени запуска."""
+    by_chat = {}
+    for run in runs:
+        if run["chat_id"] is not None:
+            by_chat.setdefault(run["chat_id"], []).append(run)
+    chats = []
+    for chat_id, chat_runs in by_chat.items():
+        total = percentiles([run["total_ms"] for run in chat_runs])
+        messages = [run["message_count"] for run in chat_runs if run["message_count"]]
+        chats.append({
+            "chat_id": chat_id,
+            "runs": len(chat_runs),
+            "errors": sum(run["outcome"] == 'error' for run in chat_runs),
+            "total_ms": total,
+            "llm_ms": percentiles([run["llm_ms"] for run in chat_runs]),
+            "avg_messages": round(sum(messages) / len(messages)) if messages else None,
+        })
+    chats.sort(key=lambda item: -item["total_ms"]["p90"])
+    return chats[:top]
+
+
+def build_report(runs, start, end, top):
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "runs": len(runs),
+        "outcomes": dict(Counter(run["outcome"] for run in runs)),
+        "errors": dict(Counter(run["error_class"] for run in runs if run["error_class"])),
+        "stages": stage_percentiles(runs),
+        "slowest_chats": slowest_chats(runs, top),
+    }
+
+
+def _format_stats(stats):
+    if not stats:
+        return "—"
+    return " / ".join(f"{stats[key]}" for key in (*(f"p{p}" for p in PERCENTILES), "max"))
+
+
+def print_report(report):
+    print(f"Запуски {report['start']} — {report['end']}: {report['runs']}, "
+          f"исходы: {report['outcomes'] or '—'}")
+    if report["errors"]:
+        print(f"Ошибки: {report['errors']}")
+    print("\nЭтапы, мс (p50 / p90 / p99 / max):")
+    for name, stats in report["stages"].items():
+        print(f"    {name:<8} {_format_stats(stats)}")
+    print("\nСамые медленные чаты (по p90 полного времени):")
+    for item in report["slowest_chats"]:
+        print(f"    {item['chat_id']:>16}  запусков: {item['runs']:>4}  ошибок: {item['errors']:>3}  "
+              f"всего: {_format_stats(item['total_ms'])}  LLM: {_format_stats(item['llm_ms'])}  "
+              f"сообщений: {item['avg_messages'] if item['avg_messages'] is not None else '—'}")
+
+
+def main():
+    from database import init_db, set_db_globals, create_scheduler_tables
+    from database.managers.job_run_manager import JobRunManager
+    from utils.logging_setup import setup_logging
+
+    parser = argparse.ArgumentParser(
+        description="Медленные чаты и перцентили этапов по журналу запусков.")
+    parser.add_argument('--start', type=date.fromisoformat,
+                        help="Первый день (UTC, включительно); по умолчанию — 7 суток назад.")
+    parser.add_argument('--end', type=date.fromisoformat,
+                        help="Последний день (UTC, не включительно); по умолчанию — завтра.")
+    parser.add_argument('--job', default='analysis',
+                        help="Задача: analysis, analysis_batch, analysis_batch_chat (доли чатов пакета), send; all — все.")
+    parser.add_argument('--top', type=int, default=10, help="Сколько чатов показать.")
+    parser.add_argument('--json', action='store_true', help="Вывод в JSON.")
+    args = parser.parse_args()
+
+    # Без LOG_LEVEL — только предупреждения: вывод команды — отчёт
+    setup_logging(os.getenv('LOG_LEVEL', 'WARNING').upper())
+    engine, Session, Base = init_db(
+        os.getenv('DATABASE_URL'), pool_size=1, max_overflow=0)
+    set_db_globals(engine, Session, Base)
+    create_scheduler_tables(engine)
+
+    end = datetime.combine(
+        args.end or datetime.utcnow().date() + timedelta(days=1), datetime.min.time())
+    start = datetime.combine(args.start, datetime.min.time()) if args.start \
+        else end - timedelta(days=8)
+    runs = JobRunManager().get_runs(start, end, None if args.job == 'all' else args.job)
+    report = build_report(runs, start, end, args.top)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
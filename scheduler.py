@@ -1,143 +1,753 @@
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor as AnalysisPool, wait as wait_futures
+from datetime import datetime, timedelta, time as dt_time
 import logging
+import math
 import os
+import threading
+import time
 from dotenv import load_dotenv
-from pytz import timezone
+from pytz import UTC, timezone
 from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.jobstores.memory import MemoryJobStore
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.executors.pool import ThreadPoolExecutor, ProcessPoolExecutor
-from database import set_db_globals, init_db
-from utils import analyze, save_analysis_result, send_analysis_result
+from apscheduler.jobstores.base import JobLookupError
+from database import set_db_globals, init_db, create_scheduler_tables, unit_of_work
+from database.db_setup import pool_stats
+from utils import (
+    analyze, analyze_batch, get_chat_name, save_analysis_result, send_analysis_result, send_digest,
+    summarize_chat)
+from utils.tasks import (
+    INCREMENTAL_ANALYSIS, ACTIVITY_ROLLUP, BATCH_SMALL_CHATS, BATCH_MAX_MESSAGES, BATCH_MAX_CHATS)
+from utils import clock
+from utils.env import env_int, env_flag
+from utils.digest import DigestBuffer
+from utils.slots import build_hour_plan, early_start, estimate_cost, hash_offset, predict_duration
+from utils.schedule_cache import ScheduleCache, listen_schedule_changes
+from utils.pipeline import ChatDag
+from utils.logging_setup import log_context
+from utils.memory import measure_peak
+from utils.profiling import profiled
+from utils.run_ledger import JOB_LEDGER, JOB_LEDGER_RETENTION_DAYS, add_share, track_run
 
 load_dotenv()
 # Настройка таймзоны Новосибирска
 novosibirsk_tz = timezone('Asia/Novosibirsk')
 
-# Настройка логирования
-logging.basicConfig(level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s')
+# Параллелизм исполнителей: от него же считается размер пула соединений БД
+SCHEDULER_THREADS = env_int('SCHEDULER_THREADS', 10)
+SCHEDULER_PROCESSES = env_int('SCHEDULER_PROCESSES', 2)
+# Потоки, в которых выполняются анализы одного тика
+ANALYSIS_WORKERS = env_int('ANALYSIS_WORKERS', 4)
+# Порядок запуска по приоритету и оценке длительности (иначе — по минуте слота)
+COST_AWARE_ORDERING = env_flag('COST_AWARE_ORDERING', True)
 
 # Инициализация планировщика с использованием SQLAlchemy для хранения задач
 scheduler = BackgroundScheduler(
     jobstores={
         # База данных SQLite для хранения задач
-        'default': SQLAlchemyJobStore(url='sqlite:///jobs.sqlite')
+        'default': SQLAlchemyJobStore(url='sqlite:///jobs.sqlite'),
+        # Разовые задачи, порождённые завершением других (не переживают рестарт)
+        'memory': MemoryJobStore()
     },
     executors={
-        'default': ThreadPoolExecutor(10),  # 10 потоков для задач
-        'processpool': ProcessPoolExecutor(2)  # 2 процесса
+        'default': ThreadPoolExecutor(SCHEDULER_THREADS),  # Потоки для задач
+        'processpool': ProcessPoolExecutor(SCHEDULER_PROCESSES)  # Процессы
     },
     timezone='Asia/Novosibirsk'
 )
 
 
-def execute_analysis(chat_id, analysis_time):
+# Разнесение задач внутри часа: 0/1 — всё в начале часа, как раньше
+SCHEDULE_SPREAD_MINUTES = env_int('SCHEDULE_SPREAD_MINUTES', 0)
+# 'hash' — смещение по хешу chat_id, 'load' — балансировка по объёму сообщений
+SCHEDULE_SPREAD_MODE = os.getenv('SCHEDULE_SPREAD_MODE', 'hash')
+# Сколько минут отправка ждёт незавершённый анализ, прежде чем уйти без него
+ANALYSIS_WAIT_MINUTES = env_int('ANALYSIS_WAIT_MINUTES', 60)
+
+# Ранний запуск: анализ стартует раньше слота, если по прогнозу длительности не успевает к отправке
+EARLY_START = env_flag('EARLY_START')
+# Не раньше чем за столько минут до слота анализа
+EARLY_START_MAX_MINUTES = env_int('EARLY_START_MAX_MINUTES', 120)
+# Доля прошлых запусков, в которую должен уложиться прогноз, и запас сверх него
+EARLY_START_QUANTILE = float(os.getenv('EARLY_START_QUANTILE', '0.9'))
+EARLY_START_MARGIN_MINUTES = env_int('EARLY_START_MARGIN_MINUTES', 5)
+EARLY_START_HISTORY_DAYS = env_int('EARLY_START_HISTORY_DAYS', 14)
+
+# Сводки: результаты чатов, готовые в одном окне, уходят вместе в нескольких сообщениях
+DIGEST_MODE = env_flag('DIGEST_MODE')
+# Окно накопления (минут от первого результата); сводка уходит в ближайшем тике отправки после него
+DIGEST_WINDOW_MINUTES = env_int('DIGEST_WINDOW_MINUTES', 1)
+
+# Подписка на NOTIFY об изменении расписаний (PostgreSQL); без неё версия проверяется в каждом тике
+SCHEDULE_LISTEN = env_flag('SCHEDULE_LISTEN')
+
+# Пересчёт почасовых счётчиков (ACTIVITY_ROLLUP) по messages: сообщения пишет основной сервис
+ACTIVITY_REFRESH_MINUTES = env_int('ACTIVITY_REFRESH_MINUTES', 10)
+ACTIVITY_REFRESH_HOURS = env_int('ACTIVITY_REFRESH_HOURS', 2)
+
+# Чекпоинты ответов модели: запуск, прерванный рестартом, дозавершается без повторного запроса
+LLM_CHECKPOINTS = env_flag('LLM_CHECKPOINTS', True)
+# За сколько часов назад дозавершать при старте и сколько дней хранить
+LLM_CHECKPOINT_RESUME_HOURS = env_int('LLM_CHECKPOINT_RESUME_HOURS', 24)
+LLM_CHECKPOINT_RETENTION_DAYS = env_int('LLM_CHECKPOINT_RETENTION_DAYS', 7)
+# Сколько секунд при остановке ждать выполняющиеся анализы и задачи планировщика
+SHUTDOWN_DRAIN_SECONDS = env_int('SHUTDOWN_DRAIN_SECONDS', 60)
+
+_plan_lock = threading.Lock()
+_hour_plan = None
+# Снимок расписаний чатов: chats перечитывается при смене версии или по возрасту.
+# С триггером на chats (PostgreSQL) версия точна и возраст — лишь страховка;
+# без него правки основного сервиса видны только по возрасту — раз в минуту, как до снимка
+SCHEDULE_MAX_AGE_MINUTES = env_int('SCHEDULE_MAX_AGE_MINUTES', 60)
+SCHEDULE_FALLBACK_MAX_AGE_MINUTES = env_int('SCHEDULE_FALLBACK_MAX_AGE_MINUTES', 1)
+schedule_cache = ScheduleCache(max_age=SCHEDULE_FALLBACK_MAX_AGE_MINUTES * 60)
+_listener_stop = threading.Event()
+# Анализы, запущенные заранее: (chat_id, ключ часа планового запуска)
+_early_lock = threading.Lock()
+_early_started = set()
+# Зависимости шагов: отправка запускается по завершении анализа или в send_time
+chat_dag = ChatDag()
+# Очередь анализов: задачи берутся в порядке постановки (см. HourPlan.order_by_cost)
+analysis_pool = AnalysisPool(ANALYSIS_WORKERS, thread_name_prefix='analysis')
+# Поставленные в пул анализы: future -> (функция, аргументы, момент постановки).
+# При остановке выполняющиеся дожидаемся, остальные сохраняем для следующего старта
+_inflight_lock = threading.Lock()
+_inflight = {}
+# Результаты, ждущие отправки сводкой (DIGEST_MODE)
+digest_buffer = DigestBuffer()
+
+
+def db_pool_size():
+    """
+    Размер пула соединений: каждая задача в потоке (планировщика или пула анализов)
+    держит не больше одного соединения (единица работы).
+    Процессы пула processpool к БД не обращаются.
+    """
+    # Слушатель NOTIFY держит одно соединение постоянно
+    pool_size = env_int('DB_POOL_SIZE', SCHEDULER_THREADS + ANALYSIS_WORKERS +
+                        (1 if SCHEDULE_LISTEN else 0))
+    max_overflow = env_int('DB_MAX_OVERFLOW', 20)
+    return pool_size, max_overflow
+
+
+def _expected_volume(session, chat_id):
+    """
+    Ожидаемый объём сообщений чата: число сообщений за последние сутки.
+    """
+    from database.managers.activity_manager import ActivityManager
+    from database.managers.message_manager import MessageManager
+
+    now_utc = datetime.utcnow()
+    if ACTIVITY_ROLLUP:
+        count, _ = ActivityManager(session).get_volume(
+            chat_id, now_utc - timedelta(days=1), now_utc)
+        return count
+    return MessageManager(session).count_messages(
+        chat_id=chat_id,
+        start_date=now_utc - timedelta(days=1),
+        end_date=now_utc
+    )
+
+
+def get_hour_plan(now):
+    """
+    Возвращает план запусков на текущий час, строя его при первом обращении в часе
+    и перестраивая, если расписания чатов изменились.
+    """
+    global _hour_plan  # pylint: disable=global-statement
+    from database.managers.run_stats_manager import RunStatsManager
+
+    key = now.strftime('%Y-%m-%dT%H')
+    snapshot = schedule_cache.get()
+    with _plan_lock:
+        if _hour_plan is None or _hour_plan.key != key or _hour_plan.schedule_generation != snapshot.generation:
+            previous_plan = _hour_plan
+            with unit_of_work() as session:
+                chats = snapshot.chats_for_hour(now.hour)
+                volumes = {}
+
+                def volume(chat_id):
+                    if chat_id not in volumes:
+                        volumes[chat_id] = _expected_volume(session, chat_id)
+                    return volumes[chat_id]
+
+                _hour_plan = build_hour_plan(
+                    key, chats, now.hour, SCHEDULE_SPREAD_MINUTES,
+                    mode=SCHEDULE_SPREAD_MODE, volume_fn=volume)
+                if COST_AWARE_ORDERING or BATCH_SMALL_CHATS:
+                    chat_ids = list(_hour_plan.analysis_slots)
+                    stats = RunStatsManager(session).get_stats(chat_ids)
+                    for chat_id in chat_ids:
+                        chat_stats = stats.get(chat_id)
+                        _hour_plan.volumes[chat_id] = volume(chat_id)
+                        _hour_plan.costs[chat_id] = estimate_cost(
+                            chat_stats, volume(chat_id))
+                        _hour_plan.priorities[chat_id] = chat_stats["priority"] if chat_stats else 0
+                if EARLY_START:
+                    _plan_early_starts(_hour_plan, snapshot, now, session)
+            _hour_plan.schedule_generation = snapshot.generation
+            if previous_plan is None:
+                # После рестарта посреди часа не повторяем уже прошедшие слоты
+                _hour_plan.drop_before(now.minute)
+                expected = list(_hour_plan.analysis_slots)
+            elif previous_plan.key == key:
+                # Расписания изменились посреди часа: выданное не повторяем,
+                # новые чаты с прошедшим слотом запускаются в ближайшем тике
+                # Старый план выводится из оборота: тик, успевший его получить, задачу не повторит
+                expected, leftovers = _hour_plan.inherit_taken(previous_plan)
+                # Невыданные задачи старого плана переносим, если время анализа чата не менялось
+                analysis_times = {chat.chat_id: chat.analysis_time for chat in snapshot.chats}
+                carried = [(chat_id, analysis_time) for chat_id, analysis_time in leftovers
+                           if analysis_times.get(chat_id) == analysis_time]
+                _hour_plan.carry_over(carried)
+                expected += [chat_id for chat_id, _ in carried]
+                # Не запущенные и снятые с этого часа чаты не должны держать отправки в ожидании
+                for chat_id, _ in leftovers:
+                    if chat_id not in _hour_plan.analysis_slots:
+                        chat_dag.complete(chat_id, 'analysis')
+            else:
+                # Анализы, чьи тики в конце часа были пропущены, не теряем
+                _hour_plan.carry_over(previous_plan.retire()[2])
+                expected = list(_hour_plan.analysis_slots)
+            for chat_id in expected:
+                chat_dag.expect(chat_id, 'analysis', key)
+            logging.info(f"""План на {key}: анализов {len(_hour_plan.analysis_slots)}, отправок {
+                         len(_hour_plan.send_slots)}, окно {SCHEDULE_SPREAD_MINUTES} мин.""")
+            if previous_plan is None or previous_plan.key != key:
+                logging.info(
+                    f"Пул соединений за прошлый час: {pool_stats.snapshot(reset=True)}")
+        return _hour_plan
+
+
+def _send_moment(chat_id, analysis_at, send_time):
+    """
+    Слот отправки (в часе send_time, со смещением разнесения) — первый не раньше analysis_at.
+    """
+    hour = analysis_at.replace(minute=0, second=0, microsecond=0)
+    while hour.hour != send_time.hour:
+        hour += timedelta(hours=1)
+    return max(hour + timedelta(minutes=hash_offset(chat_id, SCHEDULE_SPREAD_MINUTES)), analysis_at)
+
+
+def _plan_early_starts(plan, snapshot, now, session):
+    """
+    Ранний запуск: анализ, который по прогнозу длительности (job_runs, квантиль
+    EARLY_START_QUANTILE плюс запас) не успевает к слоту отправки, ставится в план
+    раньше своего слота — в том числе из следующих часов. Окно анализа по-прежнему
+    заканчивается в analysis_time планового дня.
+    """
+    from database.managers.job_run_manager import JobRunManager
+    from database.managers.run_stats_manager import RunStatsManager
+
+    hour_start = now.replace(minute=0, second=0, microsecond=0)
+    with _early_lock:
+        _early_started.difference_update(
+            [item for item in _early_started if item[1] < plan.key])
+        started = set(_early_started)
+    # Анализы этого часа, уже запущенные в прошлых часах, не повторяем
+    for chat_id, key in started:
+        if key == plan.key:
+            plan.analysis_slots.pop(chat_id, None)
+
+    # (чат, час планового анализа, слот в нём)
+    candidates = []
+    for ahead in range(math.ceil(EARLY_START_MAX_MINUTES / 60) + 1):
+        hour = hour_start + timedelta(hours=ahead)
+        key = hour.strftime('%Y-%m-%dT%H')
+        for chat in snapshot.chats_for_hour(hour.hour):
+            if not (chat.analysis_time and chat.send_time) or chat.analysis_time.hour != hour.hour:
+                continue
+            if ahead == 0:
+                if chat.chat_id in plan.analysis_slots:
+                    candidates.append((chat, hour, plan.analysis_slots[chat.chat_id]))
+            elif chat.chat_id not in plan.analysis_slots and (chat.chat_id, key) not in started:
+                candidates.append(
+                    (chat, hour, hash_offset(chat.chat_id, SCHEDULE_SPREAD_MINUTES)))
+    if not candidates:
+        return
+
+    chat_ids = [chat.chat_id for chat, _, _ in candidates]
+    history = JobRunManager(session).get_chat_history(
+        chat_ids, datetime.utcnow() - timedelta(days=EARLY_START_HISTORY_DAYS))
+    stats = RunStatsManager(session).get_stats(chat_ids)
+    margin = timedelta(minutes=EARLY_START_MARGIN_MINUTES)
+    max_early = timedelta(minutes=EARLY_START_MAX_MINUTES)
+    moved = 0
+    for chat, hour, slot in candidates:
+        chat_stats = stats.get(chat.chat_id)
+        volume = plan.volumes.get(chat.chat_id) or (
+            chat_stats["last_message_count"] if chat_stats else None)
+        seconds = predict_duration(history.get(chat.chat_id, []), volume, EARLY_START_QUANTILE)
+        if seconds is None:
+            seconds = estimate_cost(chat_stats, volume)
+        analysis_at = hour + timedelta(minutes=slot)
+        send_at = _send_moment(chat.chat_id, analysis_at, chat.send_time)
+        start = early_start(analysis_at, send_at, timedelta(seconds=seconds) + margin, max_early)
+        new_slot = max(int((start - hour_start).total_seconds() // 60), 0)
+        if start >= hour_start + timedelta(hours=1) or new_slot >= plan.analysis_slots.get(chat.chat_id, 60):
+            continue
+        plan.analysis_slots[chat.chat_id] = new_slot
+        if hour != hour_start:
+            plan.analysis_times[chat.chat_id] = chat.analysis_time
+            plan.nominal[chat.chat_id] = hour.replace(minute=chat.analysis_time.minute)
+            plan.costs[chat.chat_id] = seconds
+            plan.priorities[chat.chat_id] = chat_stats["priority"] if chat_stats else 0
+        moved += 1
+        logging.debug("Ранний запуск чата %s: %s вместо %s (прогноз %.0f с, отправка %s).",
+                      chat.chat_id, start, analysis_at, seconds, send_at)
+    if moved:
+        logging.info(f"""Ранний запуск: {moved} анализов поставлено раньше слота, чтобы успеть к отправке.""")
+
+
+@profiled
+def execute_analysis(chat_id, analysis_time, message_count=None, nominal=None):
     """
     Выполняет анализ сообщений для указанного чата и отправляет результат.
+
+    :param message_count: Ожидаемое число сообщений (для статистики длительности).
+    :param nominal: Плановый момент анализа при раннем запуске (окно — до analysis_time этого дня).
     """
+    from database.managers.run_stats_manager import RunStatsManager
+
     try:
-        # Вызов функции анализа (замените на вашу логику)
-        logging.info(f"""Выполнение анализа для чата {
-                     chat_id} в {analysis_time}.""")
-        data = analyze(chat_id, analysis_time)
-        save_analysis_result(data)
-        logging.info(
-            f"Анализ завершён для чата {chat_id}.")
+        with log_context(job='analysis', chat_id=chat_id):
+            logging.info("Выполнение анализа для чата %s в %s.",
+                         chat_id, analysis_time)
+            started = time.monotonic()
+            with track_run('analysis', chat_id) as run, unit_of_work() as session:
+                with measure_peak(f"анализ чата {chat_id}"):
+                    data = analyze(chat_id, analysis_time, session, now_nsk=nominal)
+                checkpoint_id = checkpoint_llm_result(chat_id, data)
+                save_analysis_result(data, session)
+                mark_checkpoints([checkpoint_id], 'saved')
+                tokens_input = sum(item["tokens_input"] or 0 for item in data)
+                tokens_output = sum(item["tokens_output"] or 0 for item in data)
+                RunStatsManager(session).record_run(
+                    chat_id, message_count, time.monotonic() - started,
+                    tokens_input, tokens_output)
+                if run:
+                    run.set_counts(tokens_input=tokens_input, tokens_output=tokens_output)
+                    if not any(item["analysis_result"] for item in data):
+                        run.outcome = 'empty'
+            logging.info("Анализ завершён для чата %s за %.1f с.",
+                         chat_id, time.monotonic() - started)
     except Exception as e:
         logging.error(f"Ошибка при выполнении анализа для чата {chat_id}: {e}")
+    finally:
+        # Запускаем отправки, которые ждали этот анализ
+        for ready_chat_id, _ in chat_dag.complete(chat_id, 'analysis'):
+            dispatch_send(ready_chat_id)
 
 
+@profiled
+def execute_batch_analysis(tasks, volumes=None):
+    """
+    Выполняет пакетный анализ небольших чатов (см. utils.tasks.analyze_batch).
+
+    :param volumes: Ожидаемое число сообщений чатов (для статистики длительности).
+    """
+    chat_ids = [chat_id for chat_id, _ in tasks]
+    try:
+        with log_context(job='analysis_batch', chats=len(chat_ids)):
+            logging.info("Пакетный анализ чатов %s.", chat_ids)
+            started = time.monotonic()
+            started_at = datetime.utcnow()
+            # Одна запись журнала на пакет (chat_id не задан): запросы к модели общие
+            with track_run('analysis_batch') as run, unit_of_work() as session:
+                results = analyze_batch(tasks, session)
+                checkpoint_ids = [checkpoint_llm_result(chat_id, data)
+                                  for chat_id, data in results.items()]
+                for data in results.values():
+                    save_analysis_result(data, session)
+                mark_checkpoints(checkpoint_ids, 'saved')
+                _record_batch_shares(run, results, volumes or {}, started_at,
+                                     time.monotonic() - started, session)
+                if run:
+                    items = [item for data in results.values() for item in data]
+                    run.set_counts(
+                        tokens_input=sum(item["tokens_input"] or 0 for item in items),
+                        tokens_output=sum(item["tokens_output"] or 0 for item in items))
+            logging.info("Пакетный анализ завершён для %s чатов.", len(results))
+    except Exception as e:
+        logging.error(f"Ошибка при пакетном анализе чатов {chat_ids}: {e}")
+    finally:
+        for chat_id in chat_ids:
+            for ready_chat_id, _ in chat_dag.complete(chat_id, 'analysis'):
+                dispatch_send(ready_chat_id)
+
+
+def _record_batch_shares(run, results, volumes, started_at, seconds, session):
+    """
+    Статистика пакетного анализа по чатам (скользящие средние и доли в job_runs):
+    время пакета делится между чатами пропорционально их токенам запроса — так же,
+    как _run_batch делит токены общего запроса. Чаты без обращения к модели не учитываются,
+    чаты с неудавшимся запросом записываются с исходом error.
+    """
+    from database.managers.run_stats_manager import RunStatsManager
+
+    for chat_id, data in results.items():
+        error_class = next((item["error_class"] for item in data if item.get("error_class")), None)
+        if error_class:
+            # Неудавшийся запрос чата — отдельная запись с исходом error, без доли времени
+            add_share(run, chat_id, 0, started_at, seconds, volumes.get(chat_id),
+                      outcome='error', error_class=error_class)
+            if run:
+                run.outcome, run.error_class = 'error', error_class
+    tokens = {
+        chat_id: (sum(item["tokens_input"] or 0 for item in data),
+                  sum(item["tokens_output"] or 0 for item in data))
+        for chat_id, data in results.items() if any(item["analysis_result"] for item in data)
+    }
+    total = sum(tokens_input for tokens_input, _ in tokens.values())
+    for chat_id, (tokens_input, tokens_output) in tokens.items():
+        share = tokens_input / total if total else 1 / len(tokens)
+        RunStatsManager(session).record_run(
+            chat_id, volumes.get(chat_id), seconds * share, tokens_input, tokens_output)
+        add_share(run, chat_id, share, started_at, seconds, volumes.get(chat_id),
+                  tokens_input, tokens_output)
+
+
+@profiled
 def check_and_execute_tasks():
     """
-    Проверяет задачи, запланированные на текущий час, и выполняет их.
+    Проверяет задачи, запланированные на текущий час, и выполняет те, чей слот наступил.
     """
-    from database.managers.chat_manager import ChatManager
-    chat_manager = ChatManager()
-    now = datetime.now(novosibirsk_tz)
-    current_hour = now.hour
+    now = clock.now(novosibirsk_tz)
 
-    logging.info(f"Проверка задач для выполнения в {now.strftime('%H:%M')}.")
+    logging.debug("Проверка задач для выполнения в %s.", now)
 
     try:
-        # Получение всех чатов с активным расписанием
-        chats = chat_manager.get_all_chats()
-        tasks_to_execute = [
-            chat for chat in chats
-            if chat.schedule_analysis and chat.analysis_time.hour == current_hour
-        ]
+        plan = get_hour_plan(now)
+        tasks_to_execute = plan.take_due_analyses(now.minute)
+        early = [(chat_id, plan.nominal[chat_id].strftime('%Y-%m-%dT%H'))
+                 for chat_id, _ in tasks_to_execute if chat_id in plan.nominal]
+        if early:
+            # Плановый час этих чатов их уже не запустит
+            with _early_lock:
+                _early_started.update(early)
 
         if tasks_to_execute:
             logging.info(
                 f"Найдено {len(tasks_to_execute)} задач для выполнения.")
-            for chat in tasks_to_execute:
-                execute_analysis(chat.chat_id, chat.analysis_time)
+            if COST_AWARE_ORDERING:
+                tasks_to_execute = plan.order_by_cost(tasks_to_execute)
+            if BATCH_SMALL_CHATS and not INCREMENTAL_ANALYSIS:
+                small = [task for task in tasks_to_execute
+                         if plan.volumes.get(task[0], BATCH_MAX_MESSAGES + 1) <= BATCH_MAX_MESSAGES
+                         and task[0] not in plan.nominal]
+                tasks_to_execute = [
+                    task for task in tasks_to_execute if task not in small]
+                for start in range(0, len(small), BATCH_MAX_CHATS):
+                    batch = small[start:start + BATCH_MAX_CHATS]
+                    submit_analysis(
+                        execute_batch_analysis, batch,
+                        {chat_id: plan.volumes.get(chat_id) for chat_id, _ in batch})
+            for chat_id, analysis_time in tasks_to_execute:
+                submit_analysis(
+                    execute_analysis, chat_id, analysis_time, plan.volumes.get(chat_id),
+                    plan.nominal.get(chat_id))
         else:
-            logging.info("Нет задач для выполнения в текущий час.")
+            logging.debug("Нет задач для выполнения в текущую минуту.")
 
     except Exception as e:
         logging.error(f"Ошибка при проверке задач: {e}")
 
 
-def send_tasks():
+def submit_analysis(fn, *args):
     """
-    Проверяет задачи, запланированные на текущий час, и выполняет их.
+    Ставит анализ в пул, запоминая его до завершения (см. stop_scheduler).
+    """
+    future = analysis_pool.submit(fn, *args)
+    with _inflight_lock:
+        _inflight[future] = (fn, args, clock.now(novosibirsk_tz))
+
+    def forget(done):
+        # Снятые с очереди остаются: stop_scheduler сохраняет их в чекпоинтах
+        if not done.cancelled():
+            with _inflight_lock:
+                _inflight.pop(done, None)
+
+    future.add_done_callback(forget)
+    return future
+
+
+def checkpoint_llm_result(chat_id, data):
+    """
+    Сохраняет ответ модели отдельной транзакцией до сохранения результата и отправки.
+
+    :return: checkpoint_id или None (чекпоинты выключены или сохранять нечего).
+    """
+    if not LLM_CHECKPOINTS or not any(item["analysis_result"] for item in data):
+        return None
+    from database.managers.llm_checkpoint_manager import LlmCheckpointManager
+    return LlmCheckpointManager().add(chat_id, data)
+
+
+def mark_checkpoints(checkpoint_ids, status):
+    """
+    Переводит чекпоинты в следующий статус; ошибка не прерывает запуск.
+    """
+    if not LLM_CHECKPOINTS:
+        return
+    from database.managers.llm_checkpoint_manager import LlmCheckpointManager
+    try:
+        LlmCheckpointManager().mark(checkpoint_ids, status)
+    except Exception as e:
+        logging.error(f"Ошибка при обновлении чекпоинтов {checkpoint_ids}: {e}")
+
+
+def _queued_tasks(fn, args, queued_at):
+    """
+    Анализы задачи пула: [(chat_id, analysis_time, message_count, плановый момент)].
+    Плановый момент задаёт день окна; без раннего запуска — момент постановки.
+    """
+    if fn is execute_batch_analysis:
+        return [(chat_id, analysis_time, None, queued_at) for chat_id, analysis_time in args[0]]
+    chat_id, analysis_time, message_count, nominal = args
+    return [(chat_id, analysis_time, message_count, nominal or queued_at)]
+
+
+def checkpoint_queued(submitted):
+    """
+    Сохраняет анализы, снятые с очереди или не завершившиеся к сроку остановки:
+    resume_checkpoints поставит их снова при следующем старте.
+
+    :param submitted: Список (функция, аргументы, момент постановки) из submit_analysis.
+    """
+    if not LLM_CHECKPOINTS or not submitted:
+        return
+    from database.managers.llm_checkpoint_manager import LlmCheckpointManager
+    manager = LlmCheckpointManager()
+    for fn, args, queued_at in submitted:
+        for chat_id, analysis_time, message_count, nominal in _queued_tasks(fn, args, queued_at):
+            manager.add(chat_id, {
+                "analysis_time": analysis_time.isoformat(),
+                "message_count": message_count,
+                "nominal": nominal.isoformat(),
+            }, status='queued')
+
+
+def mark_sent(chat_ids):
+    """
+    Отмечает сохранённые результаты чатов отправленными.
+    """
+    if LLM_CHECKPOINTS:
+        from database.managers.llm_checkpoint_manager import LlmCheckpointManager
+        LlmCheckpointManager().mark_sent(chat_ids)
+
+
+def dispatch_send(chat_id):
+    """
+    Ставит отправку результата чата в пул потоков планировщика немедленно.
+    """
+    logging.info(f"Анализ чата {chat_id} завершён, запускаем отправку.")
+    scheduler.add_job(
+        run_send,
+        args=[chat_id],
+        id=f'send_{chat_id}',
+        jobstore='memory',
+        replace_existing=True
+    )
+
+
+@profiled
+def run_send(chat_id):
+    """
+    Отправляет результат чата, логируя ошибки.
+    """
+    try:
+        with log_context(job='send', chat_id=chat_id), track_run('send', chat_id):
+            send_chat_result(chat_id)
+    except Exception as e:
+        logging.error(f"""Ошибка при выполнении задачи для чата {chat_id}: {
+                      e}""", exc_info=True)
+
+
+def send_chat_result(chat_id):
+    """
+    Отправляет последний результат анализа чата за сутки.
     """
-    from database.managers.chat_manager import ChatManager
     from database.managers.analysis_manager import AnalysisManager
 
-    chat_manager = ChatManager()
-    analysis_manager = AnalysisManager()
+    logging.debug("Обработка чата: %s.", chat_id)
+    with unit_of_work() as session:
+        analysis_manager = AnalysisManager(session)
+        # Получаем результаты анализа за последние 24 часа (по одному на промпт)
+        analysis_results = analysis_manager.get_today_analyses(chat_id)
+        text = combine_results(chat_id, analysis_results, session) if analysis_results else None
+        if text:
+            deliver_result(chat_id, text, session)
+        else:
+            logging.warning(f"""Результат анализа для чата {
+                            chat_id} за последние 24 часа не найден.""")
+            deliver_result(
+                chat_id, "Результат анализа не найден.", session)
+    logging.debug("Задача выполнена для чата %s.", chat_id)
 
-    now = datetime.now(novosibirsk_tz)
-    current_hour = now.hour
 
-    logging.info(f"Проверка задач для выполнения в {now.strftime('%H:%M')}.")
+def deliver_result(chat_id, text, session=None):
+    """
+    Отправляет результат чата сразу или, в режиме сводок, откладывает в буфер.
+    """
+    if DIGEST_MODE:
+        digest_buffer.add(chat_id, get_chat_name(chat_id, session), text,
+                          clock.now(novosibirsk_tz))
+        logging.info(f"Результат чата {chat_id} добавлен в сводку.")
+    elif send_analysis_result(chat_id, text, session):
+        mark_sent([chat_id])
+
+
+def flush_digest(now=None, force=False):
+    """
+    Отправляет накопленную сводку, если её окно истекло (или force).
+    """
+    if now is None:
+        now = clock.now(novosibirsk_tz)
+    items = digest_buffer.take(
+        now, timedelta(minutes=DIGEST_WINDOW_MINUTES), force=force)
+    if not items:
+        return
+    with track_run('send_digest'):
+        sent, total = send_digest([(title, text) for _, title, text in items])
+    if sent == total:
+        mark_sent([chat_id for chat_id, _, _ in items])
+
+
+def combine_results(chat_id, analysis_results, session=None):
+    """
+    Склеивает результаты разных промптов чата в один текст в порядке промптов чата.
+    Результаты промптов, отключённых от чата после анализа, не отправляются;
+    удалённый промпт подписывается своим ID.
+
+    :return: Текст или None, если результатов подключённых промптов нет.
+    """
+    from database.managers.chat_manager import ChatManager
+    from database.managers.chat_prompt_manager import ChatPromptManager
+    from utils import get_prompt_name
+
+    chat = ChatManager(session).get_chat_by_id(chat_id)
+    order = ChatPromptManager(session).get_prompt_ids(
+        chat_id, chat['default_prompt_id'] if chat else None)
+    analysis_results = sorted(
+        (result for result in analysis_results if result.prompt_id in order),
+        key=lambda result: order.index(result.prompt_id))
+    if not analysis_results:
+        logging.warning(f"У чата {chat_id} нет результатов подключённых к нему промптов.")
+        return None
+    if len(analysis_results) == 1:
+        return analysis_results[0].result_text
+    return "\n\n".join(
+        f"{get_prompt_name(result.prompt_id, session) or f'Промпт {result.prompt_id}'}:\n"
+        f"{result.result_text}"
+        for result in analysis_results
+    )
+
+
+@profiled
+def send_tasks():
+    """
+    Проверяет задачи, запланированные на текущий час, и выполняет те, чей слот наступил.
+    Если анализ чата ещё не завершён, отправка запускается по его завершении.
+    """
+    now = clock.now(novosibirsk_tz)
+
+    logging.debug("Проверка задач для выполнения в %s.", now)
 
     try:
-        # Получение всех чатов с активным расписанием
-        chats = chat_manager.get_all_chats()
-        if chats is None:
-            logging.error(
-                "chat_manager.get_all_chats() вернул None. Ожидается список чатов.")
-            return
-        logging.info(f"Найдено {len(chats)} чатов для проверки.")
-
-        # Фильтрация чатов по текущему часу
+        plan = get_hour_plan(now)
         tasks_to_execute = [
-            chat for chat in chats
-            if chat.schedule_analysis and chat.send_time.hour == current_hour
+            chat_id for chat_id in plan.take_due_sends(now.minute)
+            if chat_dag.request(chat_id, 'send', now)
         ]
-        logging.info(f"""Чатов с задачами на текущий час: {
-                     len(tasks_to_execute)}.""")
+
+        # Страховка: отправка не ждёт анализ бесконечно
+        for chat_id, _ in chat_dag.expire(now, timedelta(minutes=ANALYSIS_WAIT_MINUTES)):
+            logging.warning(f"""Анализ чата {chat_id} не завершился за {
+                            ANALYSIS_WAIT_MINUTES} мин., отправляем без ожидания.""")
+            tasks_to_execute.append(chat_id)
 
         if tasks_to_execute:
-            for chat in tasks_to_execute:
-                try:
-                    logging.info(f"Обработка чата: {chat.chat_id}.")
-                    # Получаем результат анализа за последние 24 часа
-                    analysis_result = analysis_manager.get_today_analysis(
-                        chat.chat_id)
-                    if analysis_result:
-                        logging.info(f"""Результат анализа найден для чата {
-                            chat.chat_id}.""")
-                        send_analysis_result(
-                            chat.chat_id, analysis_result.result_text)
-                    else:
-                        logging.warning(f"""Результат анализа для чата {
-                                        chat.chat_id} за последние 24 часа не найден.""")
-                        send_analysis_result(
-                            chat.chat_id, "Результат анализа не найден.")
-                    logging.info(f"Задача выполнена для чата {chat.chat_id}.")
-                except Exception as e:
-                    logging.error(f"""Ошибка при выполнении задачи для чата {chat.chat_id}: {
-                                  e}""", exc_info=True)
-        else:
-            logging.info("Нет задач для выполнения в текущий час.")
+            logging.info(f"""Чатов с задачами на текущую минуту: {
+                         len(tasks_to_execute)}.""")
+        for chat_id in tasks_to_execute:
+            run_send(chat_id)
+        if DIGEST_MODE:
+            flush_digest(now)
 
     except Exception as e:
         logging.error(f"Ошибка при проверке задач: {e}", exc_info=True)
 
 
+@profiled
+def summarize_tasks():
+    """
+    Составляет часовые сводки для всех чатов с анализом по расписанию (инкрементальный режим).
+    """
+    from database.managers.summary_manager import SummaryManager
+    now = clock.now(novosibirsk_tz)
+
+    logging.info(f"Составление часовых сводок в {now.strftime('%H:%M')}.")
+
+    try:
+        chat_ids = schedule_cache.get().chat_ids()
+        with unit_of_work() as session:
+            # Сводки старше двух суток уже не попадут ни в одно окно анализа
+            SummaryManager(session).delete_older_than(
+                datetime.utcnow() - timedelta(days=2))
+
+        for chat_id in chat_ids:
+            try:
+                with log_context(job='summary', chat_id=chat_id), unit_of_work() as session:
+                    summarize_chat(chat_id, now, session=session)
+            except Exception as e:
+                logging.error(
+                    f"Ошибка при составлении сводки для чата {chat_id}: {e}")
+    except Exception as e:
+        logging.error(f"Ошибка при составлении сводок: {e}")
+
+
+def maintain_message_partitions():
+    """
+    Создаёт будущие месячные секции messages и применяет политику хранения.
+    """
+    from database import db_globals
+    from database.partitions import maintain_partitions
+    try:
+        maintain_partitions(db_globals.engine)
+    except Exception as e:
+        logging.error(f"Ошибка при обслуживании секций messages: {e}")
+
+
+def refresh_activity(hours=None):
+    """
+    Пересчитывает счётчики message_activity за последние hours часов
+    (по умолчанию ACTIVITY_REFRESH_HOURS), включая текущий.
+    """
+    from database.managers.activity_manager import ActivityManager
+    now_utc = datetime.utcnow()
+    try:
+        buckets = ActivityManager().rebuild(
+            now_utc - timedelta(hours=hours or ACTIVITY_REFRESH_HOURS), now_utc + timedelta(hours=1))
+        logging.debug("Счётчики активности пересчитаны: %s записей.", buckets)
+    except Exception as e:
+        logging.error(f"Ошибка при пересчёте счётчиков активности: {e}")
+
+
+def add_activity_refresh():
+    """
+    Добавляет периодический пересчёт счётчиков активности (не в минуту 0, когда идут тики анализа).
+    """
+    scheduler.add_job(
+        refresh_activity,
+        'cron',
+        minute=f'5-59/{ACTIVITY_REFRESH_MINUTES}',
+        id='Activity_refresh',
+        replace_existing=True
+    )
+    logging.info("Добавлена задача пересчёта счётчиков активности.")
+
+
 def add_hourly_analysis():
     """
     Добавляет задачу, которая выполняется каждый час в указанное время.
@@ -147,8 +757,9 @@ def add_hourly_analysis():
         check_and_execute_tasks,
         'cron',
         hour='*',  # Каждый час
-        minute=0,  # В начале часа
+        minute='*',  # Каждую минуту: слоты чатов разнесены внутри часа
         id='Analysis_schedule',
+        max_instances=5,  # Долгий тик не задерживает чаты следующих слотов
         replace_existing=True
     )
     logging.info("Добавлена задача для выполнения анализа по расписанию.")
@@ -163,28 +774,280 @@ def add_hourly_send():
         send_tasks,
         'cron',
         hour='*',  # Каждый час
-        minute=0,  # В начале часа
+        minute='*',  # Каждую минуту: слоты и отложенные отправки
         id='Send_schedule',
         replace_existing=True
     )
     logging.info("Добавлена задача для выполнения анализа по расписанию.")
 
 
+def add_hourly_summary():
+    """
+    Добавляет задачу составления часовых сводок (только в инкрементальном режиме).
+    """
+    scheduler.add_job(
+        summarize_tasks,
+        'cron',
+        hour='*',  # Каждый час
+        minute=0,  # В начале часа
+        id='Summary_schedule',
+        replace_existing=True
+    )
+    logging.info("Добавлена задача для составления часовых сводок.")
+
+
+def cleanup_job_runs():
+    """
+    Удаляет записи журнала запусков старше JOB_LEDGER_RETENTION_DAYS.
+    """
+    from database.managers.job_run_manager import JobRunManager
+    try:
+        deleted = JobRunManager().delete_older_than(
+            datetime.utcnow() - timedelta(days=JOB_LEDGER_RETENTION_DAYS))
+        logging.info(f"Удалено старых записей журнала запусков: {deleted}.")
+    except Exception as e:
+        logging.error(f"Ошибка при очистке журнала запусков: {e}")
+
+
+def add_daily_job_runs_cleanup():
+    """
+    Добавляет ежедневную очистку журнала запусков.
+    """
+    scheduler.add_job(
+        cleanup_job_runs,
+        'cron',
+        hour=3,
+        minute=45,
+        id='Job_runs_cleanup',
+        replace_existing=True
+    )
+    logging.info("Добавлена задача очистки журнала запусков.")
+
+
+def cleanup_llm_checkpoints():
+    """
+    Удаляет чекпоинты ответов модели старше LLM_CHECKPOINT_RETENTION_DAYS.
+    """
+    from database.managers.llm_checkpoint_manager import LlmCheckpointManager
+    try:
+        deleted = LlmCheckpointManager().delete_older_than(
+            datetime.utcnow() - timedelta(days=LLM_CHECKPOINT_RETENTION_DAYS))
+        logging.info(f"Удалено старых чекпоинтов: {deleted}.")
+    except Exception as e:
+        logging.error(f"Ошибка при очистке чекпоинтов: {e}")
+
+
+def add_daily_llm_checkpoints_cleanup():
+    """
+    Добавляет ежедневную очистку чекпоинтов ответов модели.
+    """
+    scheduler.add_job(
+        cleanup_llm_checkpoints,
+        'cron',
+        hour=3,
+        minute=50,
+        id='Llm_checkpoints_cleanup',
+        replace_existing=True
+    )
+    logging.info("Добавлена задача очистки чекпоинтов.")
+
+
+def resume_checkpoints():
+    """
+    Дозавершает запуски, прерванные остановкой, без повторного обращения к модели:
+    несохранённые ответы сохраняются (промпты, результат по которым за окно уже есть,
+    пропускаются), а отправка сохранённых, чей слот уже прошёл, ставится сразу.
+    Отправки с ещё не наступившим слотом выполнит обычный тик.
+    Анализы, не выполненные к остановке (queued), ставятся в пул снова.
+    """
+    from database.managers.analysis_manager import AnalysisManager
+    from database.managers.llm_checkpoint_manager import LlmCheckpointManager
+
+    manager = LlmCheckpointManager()
+    checkpoints = manager.get_unfinished(
+        datetime.utcnow() - timedelta(hours=LLM_CHECKPOINT_RESUME_HOURS))
+    if not checkpoints:
+        return
+    logging.info(f"Незавершённых запусков по чекпоинтам: {len(checkpoints)}.")
+    schedules = {chat.chat_id: chat for chat in schedule_cache.get().chats}
+    now = clock.now(novosibirsk_tz)
+    to_send = set()
+    for checkpoint in checkpoints:
+        chat_id = checkpoint["chat_id"]
+        if checkpoint["status"] == 'queued':
+            try:
+                _resume_queued(checkpoint, schedules.get(chat_id), now)
+            except Exception as e:
+                logging.error(f"Ошибка при повторной постановке анализа чата {chat_id}: {e}")
+            continue
+        try:
+            if checkpoint["status"] == 'llm':
+                data = checkpoint["data"]
+                filters = data[0]["filters"]
+                with unit_of_work() as session:
+                    existing = AnalysisManager(session).get_window_prompt_ids(
+                        chat_id, filters["start_date"], filters["end_date"])
+                    save_analysis_result(
+                        [item for item in data if item["prompt_id"] not in existing], session)
+                manager.mark([checkpoint["checkpoint_id"]], 'saved')
+                logging.info(f"Результат чата {chat_id} сохранён по чекпоинту.")
+        except Exception as e:
+            logging.error(f"Ошибка при дозавершении чекпоинта чата {chat_id}: {e}")
+            continue
+        chat = schedules.get(chat_id)
+        if not (chat and chat.send_time):
+            # Чат снят с расписания: отправлять некуда
+            manager.mark_sent([chat_id])
+            continue
+        created_at = UTC.localize(checkpoint["created_at"]).astimezone(novosibirsk_tz)
+        if _send_moment(chat_id, created_at, chat.send_time) <= now:
+            to_send.add(chat_id)
+    for chat_id in to_send:
+        dispatch_send(chat_id)
+
+
+def _resume_queued(checkpoint, chat, now):
+    """
+    Ставит в пул анализ, не выполненный к остановке, если его результата за окно ещё нет.
+    Если слот отправки уже прошёл, отправка уйдёт по завершении анализа.
+    """
+    from database.managers.analysis_manager import AnalysisManager
+    from database.managers.llm_checkpoint_manager import LlmCheckpointManager
+    from utils.tasks import analysis_window
+
+    chat_id = checkpoint["chat_id"]
+    task = checkpoint["data"]
+    analysis_time = dt_time.fromisoformat(task["analysis_time"])
+    nominal = datetime.fromisoformat(task["nominal"]).astimezone(novosibirsk_tz)
+    start, end = analysis_window(analysis_time, nominal)
+    if AnalysisManager().get_window_prompt_ids(chat_id, start.isoformat(), end.isoformat()):
+        # Анализ успел завершиться уже после срока остановки
+        logging.info(f"Анализ чата {chat_id} за окно уже выполнен, повторно не ставим.")
+    else:
+        chat_dag.expect(chat_id, 'analysis', 'resume')
+        if chat and chat.send_time and _send_moment(chat_id, nominal, chat.send_time) <= now:
+            chat_dag.request(chat_id, 'send', now)
+        submit_analysis(execute_analysis, chat_id, analysis_time, task["message_count"], nominal)
+        logging.info(f"Анализ чата {chat_id} от {nominal} поставлен снова.")
+    LlmCheckpointManager().mark([checkpoint["checkpoint_id"]], 'resumed')
+
+
+def stop_scheduler(timeout=None):
+    """
+    Плавная остановка: новые задачи не запускаются, анализы из очереди снимаются,
+    а выполняющиеся анализы и задачи планировщика дожидаются завершения не дольше
+    timeout секунд (по умолчанию SHUTDOWN_DRAIN_SECONDS). Ответы модели уже
+    завершённых запросов сохранены в чекпоинтах, а снятые и не завершившиеся
+    к сроку анализы — как queued: всё это дозавершит resume_checkpoints при
+    следующем старте.
+    """
+    deadline = time.monotonic() + (SHUTDOWN_DRAIN_SECONDS if timeout is None else timeout)
+    if scheduler.running:
+        scheduler.pause()
+    analysis_pool.shutdown(wait=False, cancel_futures=True)
+    with _inflight_lock:
+        submitted = dict(_inflight)
+    cancelled = [task for future, task in submitted.items() if future.cancelled()]
+    running = [future for future in submitted if not future.cancelled()]
+    logging.info(f"""Остановка: ждём выполняющиеся анализы ({len(running)}), снято с очереди: {
+                 len(cancelled)}.""")
+    _, not_done = wait_futures(running, timeout=max(deadline - time.monotonic(), 0))
+    checkpoint_queued(cancelled + [submitted[future] for future in not_done])
+    if scheduler.running:
+        # shutdown(wait=True) ждёт задачи исполнителей без ограничения — ограничиваем сами
+        stopper = threading.Thread(
+            target=scheduler.shutdown, name='scheduler-shutdown', daemon=True)
+        stopper.start()
+        stopper.join(max(deadline - time.monotonic(), 0))
+        if stopper.is_alive():
+            logging.warning("Задачи планировщика не завершились к сроку остановки.")
+    _listener_stop.set()
+    if not_done:
+        logging.warning(f"""Анализов не завершилось к сроку остановки: {
+                        len(not_done)}; при старте будут поставлены снова, если не успеют.""")
+    # Не теряем результаты, ждущие отправки сводкой
+    flush_digest(force=True)
+
+
+def add_daily_partition_maintenance():
+    """
+    Добавляет ежедневное обслуживание секций messages (если включено секционирование).
+    """
+    scheduler.add_job(
+        maintain_message_partitions,
+        'cron',
+        hour=3,
+        minute=30,
+        id='Partition_maintenance',
+        replace_existing=True
+    )
+    logging.info("Добавлена задача обслуживания секций messages.")
+
+
 def start_scheduler():
     """
     Запускает планировщик и добавляет задачи для всех активных чатов из базы данных.
     """
     database_url = os.getenv('DATABASE_URL')
-    engine, Session, Base = init_db(database_url)
+    pool_size, max_overflow = db_pool_size()
+    engine, Session, Base = init_db(
+        database_url, pool_size=pool_size, max_overflow=max_overflow,
+        replica_url=os.getenv('DATABASE_REPLICA_URL') or None)
     set_db_globals(engine, Session, Base)
+    if create_scheduler_tables(engine):
+        schedule_cache.max_age = SCHEDULE_MAX_AGE_MINUTES * 60
+    logging.info(f"Снимок расписаний перечитывается не реже раза в {schedule_cache.max_age // 60} мин.")
+    # Хранилище задач (jobs.sqlite) читается только после старта: стартуем на паузе,
+    # чтобы видеть задачи прошлого запуска при добавлении и удалении
+    scheduler.start(paused=True)
+    if SCHEDULE_LISTEN and engine.dialect.name == 'postgresql':
+        threading.Thread(
+            target=listen_schedule_changes, args=(engine, schedule_cache, _listener_stop),
+            name='schedule-listener', daemon=True).start()
     add_hourly_analysis()
     add_hourly_send()
+    if INCREMENTAL_ANALYSIS:
+        add_hourly_summary()
+    else:
+        remove_disabled_job('Summary_schedule')
+    if JOB_LEDGER:
+        add_daily_job_runs_cleanup()
+    else:
+        remove_disabled_job('Job_runs_cleanup')
+    if LLM_CHECKPOINTS:
+        add_daily_llm_checkpoints_cleanup()
+        resume_checkpoints()
+    else:
+        remove_disabled_job('Llm_checkpoints_cleanup')
+    if ACTIVITY_ROLLUP:
+        add_activity_refresh()
+        # Окна анализа — сутки: счётчики за них нужны сразу после старта
+        refresh_activity(hours=25)
+    else:
+        remove_disabled_job('Activity_refresh')
+    if env_flag('MESSAGES_PARTITIONING'):
+        add_daily_partition_maintenance()
+        # Секции на ближайшие месяцы нужны сразу, не дожидаясь ночного запуска
+        maintain_message_partitions()
+    else:
+        remove_disabled_job('Partition_maintenance')
     logging.info("Все задачи добавлены в планировщик.")
 
-    scheduler.start()
+    scheduler.resume()
     logging.info("Планировщик успешно запущен.")
 
 
+def remove_disabled_job(job_id):
+    """
+    Удаляет задачу, выключенную настройкой, если она сохранилась с прошлого запуска.
+    """
+    try:
+        scheduler.remove_job(job_id)
+        logging.info(f"Задача {job_id} выключена настройкой и удалена.")
+    except JobLookupError:
+        pass
+
+
 def list_scheduled_jobs():
     """
     Выводит список всех запланированных задач.
@@ -0,0 +1,459 @@
+"""
+Нагрузочный прогон планировщика на локальных заглушках YandexGPT и Telegram Bot API.
+
+    python soak.py [--chats 2000] [--messages 20] [--hours 2] [--speed 60]
+                   [--llm-latency 3] [--llm-sigma 0.5] [--llm-429 0.02] [--llm-5xx 0.01]
+                   [--tg-rate 20] [--send-offset 30] [--database-url URL] [--json]
+
+Поднимает заглушки на 127.0.0.1, направляет на них YANDEX_GPT_API_URL и
+TELEGRAM_API_URL, заполняет пустую БД чатами и сообщениями и запускает
+start_scheduler с ускоренными часами (utils.clock): тики анализа и отправки
+вызываются на каждой симулированной минуте. Все времена в параметрах и отчёте —
+симулированные секунды. Собственные задержки кода (запросы к БД, паузы
+между повторами, misfire_grace_time APScheduler) идут по настоящему времени и
+при ускорении растягиваются в speed раз — опоздания сравнивайте при одном speed.
+
+БД должна быть пустой (по умолчанию — новый SQLite-файл во временном каталоге);
+для правдоподобной картины начала часа используйте отдельный PostgreSQL.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+BOT_TOKEN = '123456:soak'
+TARGET_CHAT_ID = '-100'
+
+
+class FakeServer:
+    """
+    HTTP-заглушка в отдельном потоке; handle(method, path, query, body) -> (код, dict).
+    """
+
+    def __init__(self, handle):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _serve(self):
+                url = urlparse(self.path)
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                status, payload = server.handle(
+                    self.command, url.path, parse_qs(url.query), body)
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = _serve
+            do_POST = _serve
+
+            def log_message(self, *args):
+                pass
+
+        self.handle = handle
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever,
+                         name='soak-fake', daemon=True).start()
+
+    def stop(self):
+        self.httpd.shutdown()
+
+
+class FakeYandexGPT:
+    """
+    Заглушка completion-эндпоинта: логнормальная задержка, доля 429/5xx и блок usage.
+    На пакетные запросы (разделы «=== ключ ===») отвечает JSON-объектом по разделам.
+    """
+
+    def __init__(self, speed, latency, sigma, rate_429, rate_5xx, seed=None):
+        self.speed = speed
+        self.latency = latency
+        self.sigma = sigma
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.statuses = Counter()
+        self.latencies = []
+        self.tokens_input = 0
+        self.models = Counter()
+        self.server = FakeServer(self.handle)
+        self.url = self.server.url + '/foundationModels/v1/completion'
+
+    def handle(self, method, path, query, body):
+        request = json.loads(body or b'{}')
+        with self.lock:
+            roll = self.random.random()
+            delay = self.random.lognormvariate(math.log(max(self.latency, 1e-3)), self.sigma)
+        # Задержка в симулированных секундах
+        time.sleep(delay / self.speed)
+        if roll < self.rate_429:
+            status, payload = 429, {"error": {"grpcCode": 8, "httpCode": 429,
+                                              "message": "ai.textGenerationCompletionSessionsCount.count gauge quota limit exceed"}}
+        elif roll < self.rate_429 + self.rate_5xx:
+            status, payload = 503, {"error": {"grpcCode": 14, "httpCode": 503,
+                                              "message": "Service unavailable"}}
+        else:
+            user_text = next((m["text"] for m in request.get("messages", [])
+                              if m.get("role") == "user"), "")
+            keys = re.findall(r'^=== (.+?) ===$', user_text, flags=re.MULTILINE)
+            text = json.dumps({key: f"Итог по {key}." for key in keys}, ensure_ascii=False) \
+                if keys else "Итог анализа: обсуждались рабочие вопросы."
+            tokens_input = len(user_text) // 4 + 50
+            status, payload = 200, {"result": {
+                "alternatives": [{"message": {"role": "assistant", "text": text},
+                                  "status": "ALTERNATIVE_STATUS_FINAL"}],
+                "usage": {"inputTextTokens": str(tokens_input),
+                          "completionTokens": str(len(text) // 4 + 1),
+                          "totalTokens": str(tokens_input + len(text) // 4 + 1)},
+                "modelVersion": "soak",
+            }}
+            with self.lock:
+                self.tokens_input += tokens_input
+        with self.lock:
+            self.statuses[status] += 1
+            self.latencies.append(delay)
+            self.models[request.get("modelUri", "").rsplit('/', 1)[-1]] += 1
+        return status, payload
+
+    def stats(self):
+        from report import percentiles
+        with self.lock:
+            return {
+                "requests": sum(self.statuses.values()),
+                "statuses": {str(code): count for code, count in self.statuses.items()},
+                "latency_seconds": percentiles(self.latencies),
+                "tokens_input": self.tokens_input,
+                "models": dict(self.models),
+            }
+
+
+class FakeTelegram:
+    """
+    Заглушка Bot API: sendMessage с ограничением rate сообщений в минуту на чат
+    (429 и parameters.retry_after, как у Telegram).
+    """
+
+    def __init__(self, rate, clock=None):
+        # Часы задаются после импорта планировщика (адрес заглушки нужен ему раньше)
+        self.clock = clock
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.sent = []  # (симулированное время, текст)
+        self.rejected = 0
+        self._windows = {}
+        self._message_id = 0
+        self.server = FakeServer(self.handle)
+        self.url = self.server.url
+
+    def handle(self, method, path, query, body):
+        if not path.endswith('/sendMessage'):
+            return 404, {"ok": False, "error_code": 404, "description": "Not Found"}
+        params = {key: values[0] for key, values in query.items()}
+        if body:
+            params.update({key: values[0] for key, values in parse_qs(body.decode('utf-8')).items()})
+        chat_id = params.get("chat_id")
+        now = self.clock.now()
+        with self.lock:
+            window = self._windows.setdefault(chat_id, deque())
+            while window and now - window[0] >= timedelta(minutes=1):
+                window.popleft()
+            if self.rate and len(window) >= self.rate:
+                self.rejected += 1
+                retry_after = max(1, math.ceil(
+                    (window[0] + timedelta(minutes=1) - now).total_seconds()))
+                return 429, {"ok": False, "error_code": 429,
+                             "description": f"Too Many Requests: retry after {retry_after}",
+                             "parameters": {"retry_after": retry_after}}
+            window.append(now)
+            self.sent.append((now, params.get("text", "")))
+            self._message_id += 1
+            message_id = self._message_id
+        return 200, {"ok": True, "result": {
+            "message_id": message_id, "date": int(time.time()),
+            "chat": {"id": int(chat_id or 0), "type": "supergroup"},
+            "text": params.get("text", ""),
+        }}
+
+
+def seed(session_factory, chats, messages, start, hours, send_offset, window, seed_value=None):
+    """
+    Заполняет пустую БД: промпт, пользователи, чаты с анализом в каждом
+    симулированном часе (поровну) и сообщения за предшествующие сутки.
+
+    :param start: Начало прогона (aware, Новосибирск).
+    :param window: SCHEDULE_SPREAD_MINUTES планировщика.
+    :return: dict chat_id -> плановый момент отправки (aware): слот в часе send_time,
+        как его выдаёт build_hour_plan.
+    """
+    from sqlalchemy import insert
+    from utils.slots import hash_offset
+    from database.models.chat import Chat
+    from database.models.messages import Message
+    from database.models.prompt import Prompt
+    from database.models.user import User
+
+    rng = random.Random(seed_value)
+    users = list(range(1, 201))
+    sends = {}
+    start_utc = start.astimezone(timezone.utc).replace(tzinfo=None)
+    with session_factory() as session:
+        if session.query(Chat).count():
+            raise SystemExit("В БД уже есть чаты: для прогона нужна пустая БД.")
+        session.add(Prompt(prompt_id='soak', prompt_name='Сводка',
+                           text="Кратко перескажи переписку."))
+        session.execute(insert(User.__table__), [
+            {"user_id": user_id, "username": f"user{user_id}"} for user_id in users])
+        rows = []
+        for index in range(chats):
+            chat_id = 1_000_000 + index
+            analysis_at = start + timedelta(hours=index % hours)
+            send_at = analysis_at + timedelta(minutes=send_offset)
+            sends[chat_id] = send_at.replace(minute=0) + \
+                timedelta(minutes=hash_offset(chat_id, window))
+            rows.append({
+                "chat_id": chat_id, "chat_name": f"soak-{chat_id}",
+                "default_prompt_id": 'soak', "schedule_analysis": True,
+                "analysis_time": analysis_at.time().replace(second=0, microsecond=0),
+                "send_time": send_at.time().replace(second=0, microsecond=0),
+            })
+        session.execute(insert(Chat.__table__), rows)
+
+        batch = []
+        for chat_id in sends:
+            # Объёмы чатов сильно различаются: экспоненциальное распределение
+            for _ in range(int(rng.expovariate(1 / messages)) if messages else 0):
+                stamp = start_utc - timedelta(seconds=rng.uniform(60, 23 * 3600))
+                batch.append({
+                    "message_id": str(uuid.uuid4()), "timestamp": stamp,
+                    "user_id": rng.choice(users), "chat_id": chat_id,
+                    "text": f"Сообщение {rng.randint(1, 10 ** 6)} о задаче {rng.randint(1, 50)}",
+                })
+                if len(batch) >= 5000:
+                    session.execute(insert(Message.__table__), batch)
+                    batch = []
+        if batch:
+            session.execute(insert(Message.__table__), batch)
+        session.commit()
+    return sends
+
+
+def lateness_report(sends, sent):
+    """
+    Опоздание отправок относительно send_time (симулированные секунды) и пропуски.
+    Результат чата узнаётся по названию «soak-<chat_id>» в тексте сообщения
+    (в сводке — по всем названиям из сообщения).
+    """
+    from report import percentiles
+
+    first_sent = {}
+    for moment, text in sent:
+        for match in re.finditer(r'soak-(\d+)', text):
+            first_sent.setdefault(int(match.group(1)), moment)
+    delays = [(first_sent[chat_id] - send_at).total_seconds()
+              for chat_id, send_at in sends.items() if chat_id in first_sent]
+    return {
+        "expected": len(sends),
+        "delivered": len(delays),
+        "missing": len(sends) - len(delays),
+        "lateness_seconds": percentiles(delays),
+    }
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix='soak-')
+    # jobs.sqlite планировщика создаётся в текущем каталоге: не трогаем рабочий
+    os.chdir(workdir)
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'soak.sqlite')}"
+
+    import pytz
+    novosibirsk_tz = pytz.timezone('Asia/Novosibirsk')
+    # Прогон начинается с ближайшего часа (часы стартуют за минуту до него)
+    start = (datetime.now(novosibirsk_tz) + timedelta(hours=1)).replace(
+        minute=0, second=0, microsecond=0)
+
+    llm = FakeYandexGPT(args.speed, args.llm_latency, args.llm_sigma,
+                        args.llm_429, args.llm_5xx, args.seed)
+    telegram = FakeTelegram(args.tg_rate)
+    # Модули читают адреса при импорте: окружение задаём до импорта планировщика
+    os.environ.update({
+        "DATABASE_URL": database_url,
+        "YANDEX_GPT_API_URL": llm.url,
+        "TELEGRAM_API_URL": telegram.url,
+        "TG_API_TOKEN": BOT_TOKEN,
+        "CHAT_ID": TARGET_CHAT_ID,
+        "YANDEX_API_KEY": "soak",
+        "FOLDER_ID": "soak",
+    })
+    os.environ.pop("DATABASE_REPLICA_URL", None)
+
+    # Пакет utils читает адреса при импорте: логирование настраиваем после окружения
+    from utils.logging_setup import setup_logging
+    setup_logging(os.getenv('LOG_LEVEL', 'WARNING').upper())
+
+    from database import init_db
+    from database.db_setup import Base, create_scheduler_tables
+    from utils import clock as scheduler_clock
+    from utils.env import env_flag, env_int
+    import database.models.analysis  # noqa: F401 - таблицы для create_all
+    import database.models.chat  # noqa: F401
+    import database.models.messages  # noqa: F401
+    import database.models.prompt  # noqa: F401
+    import database.models.user  # noqa: F401
+
+    engine, Session, _ = init_db(database_url, pool_size=2, max_overflow=0)
+    Base.metadata.create_all(engine)
+    create_scheduler_tables(engine)
+    logging.warning("Заполнение БД: %s чатов.", args.chats)
+    sends = seed(Session, args.chats, args.messages, start,
+                 args.hours, args.send_offset,
+                 env_int('SCHEDULE_SPREAD_MINUTES', 0), args.seed)
+    engine.dispose()
+    if env_flag('ACTIVITY_ROLLUP'):
+        from database import set_db_globals
+        from database.managers.activity_manager import ActivityManager
+        engine, Session, _ = init_db(database_url, pool_size=1, max_overflow=0)
+        set_db_globals(engine, Session, Base)
+        ActivityManager().rebuild(datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=2),
+                                  datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(days=1))
+        engine.dispose()
+
+    # Часы запускаем после заполнения: первый тик должен прийтись на начало часа,
+    # иначе план, как после рестарта, отбросит прошедшие слоты
+    clock = scheduler_clock.SimulatedClock(start - timedelta(minutes=1), args.speed)
+    telegram.clock = clock
+    scheduler_clock.set_clock(clock)
+    import scheduler as scheduler_module
+    scheduler_module.start_scheduler()
+    from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_MISSED
+    job_events = Counter()
+    # Пропуски (misfire) разовых задач отправки в журнал запусков не попадают
+    scheduler_module.scheduler.add_listener(
+        lambda event: job_events.update(
+            [f"{event.job_id.split('_')[0]}:{'missed' if event.code == EVENT_JOB_MISSED else 'error'}"]),
+        EVENT_JOB_MISSED | EVENT_JOB_ERROR)
+    ticks = [scheduler_module.scheduler.get_job(job_id)
+             for job_id in ('Analysis_schedule', 'Send_schedule', 'Summary_schedule')]
+    ticks = [job for job in ticks if job is not None]
+    # Cron-задачи идут по настоящему времени: тики вызываем сами на каждой симулированной минуте
+    for job in ticks:
+        job.pause()
+
+    end = max([start + timedelta(hours=args.hours), *sends.values()])
+    started = time.monotonic()
+    minute = start - timedelta(minutes=1)
+    while minute < end:
+        minute += timedelta(minutes=1)
+        wait = (minute - clock.now()).total_seconds() / args.speed
+        if wait > 0:
+            time.sleep(wait)
+        for job in ticks:
+            if job.id == 'Summary_schedule' and minute.minute != 0:
+                continue
+            job.func()
+    # Дожидаемся анализов и отправок, запущенных в последних тиках
+    scheduler_module.analysis_pool.shutdown(wait=True)
+    deadline = time.monotonic() + args.drain_seconds
+    while time.monotonic() < deadline and scheduler_module.scheduler.get_jobs(jobstore='memory'):
+        time.sleep(0.2)
+    scheduler_module.scheduler.shutdown(wait=True)
+    scheduler_module.flush_digest(force=True)
+    elapsed = time.monotonic() - started
+
+    report = {
+        "chats": args.chats,
+        "simulated_minutes": int((end - start).total_seconds() // 60),
+        "real_seconds": round(elapsed, 1),
+        "llm": llm.stats(),
+        "telegram": {"sent": len(telegram.sent), "rejected_429": telegram.rejected},
+        "sends": lateness_report(sends, telegram.sent),
+        "scheduler_events": dict(job_events),
+    }
+    from utils.run_ledger import JOB_LEDGER
+    if JOB_LEDGER:
+        from database.managers.job_run_manager import JobRunManager
+        # Журнал пишет настоящее время: берём всё за последние сутки
+        utc_now = datetime.now(timezone.utc).replace(tzinfo=None)
+        runs = JobRunManager().get_runs(utc_now - timedelta(days=1), utc_now + timedelta(minutes=1))
+        outcomes = Counter(f"{run['job']}:{run['outcome']}" for run in runs)
+        report["runs"] = {
+            "outcomes": dict(outcomes.most_common()),
+            "errors": dict(Counter(run["error_class"] for run in runs if run["error_class"])),
+        }
+    report["throughput"] = {
+        "llm_requests_per_sim_minute": round(
+            report["llm"]["requests"] / max(report["simulated_minutes"], 1), 2),
+        "sends_per_sim_minute": round(len(telegram.sent) / max(report["simulated_minutes"], 1), 2),
+    }
+    llm.server.stop()
+    telegram.server.stop()
+    return report
+
+
+def print_report(report):
+    llm, sends = report["llm"], report["sends"]
+    print(f"Чатов: {report['chats']}, симулированных минут: {report['simulated_minutes']}, "
+          f"реального времени: {report['real_seconds']} с")
+    print(f"YandexGPT: запросов {llm['requests']}, ответы {llm['statuses']}, "
+          f"модели {llm['models']}, задержка (p50/p90/p99/max): {llm['latency_seconds']}")
+    print(f"Telegram: доставлено {report['telegram']['sent']}, "
+          f"отклонено 429: {report['telegram']['rejected_429']}")
+    print(f"Отправки: ожидалось {sends['expected']}, доставлено {sends['delivered']}, "
+          f"пропущено {sends['missing']}, опоздание, с: {sends['lateness_seconds']}")
+    print(f"Задачи APScheduler: {report['scheduler_events'] or '—'}")
+    if "runs" in report:
+        print(f"Запуски: {report['runs']['outcomes']}, ошибки: {report['runs']['errors'] or '—'}")
+    print(f"Пропускная способность (на симулированную минуту): {report['throughput']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Нагрузочный прогон планировщика на заглушках YandexGPT и Telegram.")
+    parser.add_argument('--chats', type=int, default=2000)
+    parser.add_argument('--messages', type=int, default=20,
+                        help="Среднее число сообщений чата за сутки.")
+    parser.add_argument('--hours', type=int, default=2, help="Симулированных часов.")
+    parser.add_argument('--speed', type=float, default=60,
+                        help="Во сколько раз симулированное время быстрее настоящего.")
+    parser.add_argument('--llm-latency', type=float, default=3.0,
+                        help="Медиана задержки YandexGPT, с.")
+    parser.add_argument('--llm-sigma', type=float, default=0.5,
+                        help="Разброс задержки (sigma логнормального распределения).")
+    parser.add_argument('--llm-429', type=float, default=0.02, help="Доля ответов 429.")
+    parser.add_argument('--llm-5xx', type=float, default=0.01, help="Доля ответов 503.")
+    parser.add_argument('--tg-rate', type=int, default=20,
+                        help="Сообщений в минуту на чат Telegram (0 — без ограничения).")
+    parser.add_argument('--send-offset', type=int, default=30,
+                        help="Через сколько минут после анализа отправка.")
+    parser.add_argument('--drain-seconds', type=float, default=30,
+                        help="Сколько реальных секунд ждать отправки после последнего тика.")
+    parser.add_argument('--database-url', help="Пустая БД (по умолчанию — новый SQLite).")
+    parser.add_argument('--seed', type=int, help="Seed генераторов для повторяемости.")
+    parser.add_argument('--json', action='store_true', help="Вывод в JSON.")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2, default=str))
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 from .db_get import get_chat_name, get_prompt, get_prompt_name, get_user_name
 from .yandex_funcs import chatgpt_analyze
-from .tasks import analyze, save_analysis_result, send_analysis_result
+from .tasks import (
+    analyze, analyze_batch, save_analysis_result, send_analysis_result, send_digest, summarize_chat)
 from .parse_time import parse_time
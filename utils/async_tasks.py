@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import os
+from database.managers.async_manager import AsyncManager
+from utils import clock
+from utils.model_routing import choose_model, seconds_until
+from utils.run_ledger import current_run, stage
+from utils.tasks import BOT_TOKEN, CHAT_ID, _analysis_results, analysis_window, novosibirsk_tz
+from utils.yandex_funcs import format_messages, request_completion_async
+
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org').rstrip('/')
+
+
+async def analyze_async(session, client, chat_id, analysis_time):
+    """
+    Асинхронный вариант utils.tasks.analyze (без инкрементального режима):
+    все промпты чата (по умолчанию и из chat_prompts), запросы к модели — параллельно.
+
+    :return: Список результатов — по одному на промпт.
+    """
+    logging.info(f"Начало анализа для чата {chat_id}")
+    manager = AsyncManager(session)
+
+    chat = await manager.get_chat_by_id(chat_id)
+    if not chat:
+        logging.error(f"Чат {chat_id} не найден.")
+        raise ValueError(f"Чат {chat_id} не найден.")
+
+    prompt_ids = await manager.get_prompt_ids(chat_id, chat['default_prompt_id'])
+    if not prompt_ids:
+        raise ValueError(f"У чата {chat_id} не задан ни один промпт.")
+
+    analysis_start, analysis_end = analysis_window(analysis_time)
+    logging.info(f"Диапазон анализа: {analysis_start} - {analysis_end}")
+
+    filters = {
+        "chat_id": chat_id,
+        "start_date": analysis_start.isoformat(),
+        "end_date": analysis_end.isoformat(),
+        "user_id": None
+    }
+
+    with stage('fetch'):
+        messages = await manager.get_filtered_messages(
+            analysis_start.replace(tzinfo=None), analysis_end.replace(tzinfo=None), chat_id)
+    if not messages:
+        logging.warning(f"""Нет сообщений для анализа в чате {
+                        chat_id} за период {analysis_start} - {analysis_end}.""")
+        return _analysis_results(chat_id, prompt_ids, filters)
+
+    logging.info(f"Сообщений для анализа найдено: {len(messages)}")
+    if current_run():
+        current_run().set_counts(message_count=len(messages))
+
+    prompts = []
+    for prompt_id in prompt_ids:
+        prompt = await manager.get_prompt_text(prompt_id)
+        if not prompt:
+            raise ValueError(f"Промпт с ID {prompt_id} не найден.")
+        prompts.append(prompt)
+
+    with stage('encode'):
+        user_names, chat_names = await manager.get_names(
+            {msg["user_id"] for msg in messages}, {msg["chat_id"] for msg in messages})
+        api_messages = format_messages(messages, user_names.get, chat_names.get)
+    # Соединение не держим на время запроса к модели
+    await session.commit()
+
+    # Приоритет чата здесь не учитывается: статистика запусков ведётся синхронным планировщиком
+    options = choose_model(sum(len(m) for m in api_messages), seconds_left=seconds_until(
+        chat['send_time'], clock.now(novosibirsk_tz)))
+    filters["model"] = options
+    with stage('llm'):
+        outputs = await asyncio.gather(*(
+            request_completion_async(client, prompt, f"{api_messages}", options)
+            for prompt in prompts))
+    logging.info(f"Анализ завершён для чата {chat_id}.")
+    return _analysis_results(chat_id, prompt_ids, filters, outputs)
+
+
+async def save_analysis_result_async(session, data):
+    """
+    Асинхронный вариант utils.tasks.save_analysis_result.
+    data — результат analyze_async: список (по одному на промпт).
+    """
+    manager = AsyncManager(session)
+    with stage('save'):
+        for item in data:
+            if item["analysis_result"]:
+                await manager.save_analysis_result(
+                    item["prompt_id"],
+                    item["analysis_result"],
+                    item['filters'],
+                    item["tokens_input"],
+                    item["tokens_output"]
+                )
+                logging.info(f"Результат анализа сохранён для чата {item['chat_id']}.")
+            else:
+                logging.info(f"Для чата {item['chat_id']} нет анализа для сохранения.")
+
+
+async def combine_results_async(session, chat_id, analysis_results):
+    """
+    Асинхронный вариант scheduler.combine_results: результаты подключённых к чату
+    промптов в их порядке; удалённый промпт подписывается своим ID.
+
+    :return: Текст или None, если результатов подключённых промптов нет.
+    """
+    manager = AsyncManager(session)
+    chat = await manager.get_chat_by_id(chat_id)
+    order = await manager.get_prompt_ids(chat_id, chat['default_prompt_id'] if chat else None)
+    analysis_results = sorted(
+        (result for result in analysis_results if result.prompt_id in order),
+        key=lambda result: order.index(result.prompt_id))
+    if not analysis_results:
+        return None
+    if len(analysis_results) == 1:
+        return analysis_results[0].result_text
+    parts = []
+    for result in analysis_results:
+        name = await manager.get_prompt_name(result.prompt_id) or f"Промпт {result.prompt_id}"
+        parts.append(f"{name}:\n{result.result_text}")
+    return "\n\n".join(parts)
+
+
+async def send_analysis_result_async(session, client, chat_id, analysis_result):
+    """
+    Отправляет результат анализа через Telegram Bot API (httpx).
+    """
+    chat = await AsyncManager(session).get_chat_by_id(chat_id)
+    chat_name = chat['chat_name'] if chat else None
+
+    message_text = f"""Результат анализа для чата {
+        chat_name}:\n\n{analysis_result}"""
+
+    try:
+        with stage('send'):
+            response = await client.post(
+                f"{TELEGRAM_API_URL}/bot{BOT_TOKEN}/sendMessage",
+                json={"chat_id": CHAT_ID, "text": message_text},
+                timeout=60
+            )
+            response.raise_for_status()
+        logging.info(f"""Результат анализа для чата {
+                     chat_id} успешно отправлен.""")
+    except Exception as e:
+        if current_run():
+            current_run().outcome = 'error'
+            current_run().error_class = type(e).__name__
+        logging.error(f"""Ошибка при отправке результата в Telegram для чата {
+                      chat_id}: {e}""", exc_info=True)
@@ -0,0 +1,46 @@
+import time
+from datetime import datetime, timedelta
+
+
+class SystemClock:
+    """Настоящее время (по умолчанию)."""
+
+    def now(self, tz=None):
+        return datetime.now(tz)
+
+
+class SimulatedClock:
+    """
+    Ускоренное время для нагрузочных прогонов: от start идёт в speed раз быстрее
+    настоящего (speed=60 — минута за секунду).
+
+    :param start: Начальный момент (aware datetime).
+    """
+
+    def __init__(self, start, speed=1.0):
+        self.start = start
+        self.speed = speed
+        self._started = time.monotonic()
+
+    def now(self, tz=None):
+        elapsed = (time.monotonic() - self._started) * self.speed
+        value = self.start + timedelta(seconds=elapsed)
+        return value.astimezone(tz) if tz else value
+
+    def to_simulated(self, monotonic_value):
+        """Переводит отметку time.monotonic() в момент симулированного времени."""
+        return self.start + timedelta(seconds=(monotonic_value - self._started) * self.speed)
+
+
+_clock = SystemClock()
+
+
+def now(tz=None):
+    """Текущее время планировщика: datetime.now(tz) или время установленных часов."""
+    return _clock.now(tz)
+
+
+def set_clock(clock):
+    """Подменяет часы планировщика (None — вернуть настоящее время)."""
+    global _clock  # pylint: disable=global-statement
+    _clock = clock or SystemClock()
@@ -1,23 +1,29 @@
 import logging
 
 
-def get_prompt(prompt_id):
+def get_prompt(prompt_id, session=None):
     from database.managers.prompt_manager import PromptManager
-    db = PromptManager()
+    db = PromptManager(session)
     prompt = db.get_prompt_by_prompt_id(prompt_id)
+    if not prompt:
+        logging.warning(f"Промпт с ID {prompt_id} не найден.")
+        return None
     return prompt['text']
 
 
-def get_prompt_name(prompt_id):
+def get_prompt_name(prompt_id, session=None):
     from database.managers.prompt_manager import PromptManager
-    db = PromptManager()
+    db = PromptManager(session)
     prompt = db.get_prompt_by_prompt_id(prompt_id)
+    if not prompt:
+        logging.warning(f"Промпт с ID {prompt_id} не найден.")
+        return None
     return prompt['prompt_name']
 
 
-def get_user_name(user_id):
+def get_user_name(user_id, session=None):
     from database.managers.user_manager import UserManager
-    db = UserManager()
+    db = UserManager(session)
     try:
         user = db.get_user_by_user_id(user_id)
         if user:
@@ -31,9 +37,9 @@ def get_user_name(user_id):
         raise
 
 
-def get_chat_name(chat_id):
+def get_chat_name(chat_id, session=None):
     from database.managers.chat_manager import ChatManager
-    db = ChatManager()
+    db = ChatManager(session)
     try:
         chat = db.get_chat_by_id(chat_id)
         if chat:
@@ -0,0 +1,129 @@
+import threading
+
+# Предел длины сообщения Telegram (в UTF-16 единицах, как считает Bot API)
+TELEGRAM_MESSAGE_LIMIT = 4096
+# Запас под заголовок «Сводка анализов, часть i из n»
+HEADER_RESERVE = 48
+
+
+def text_length(text):
+    """Длина текста так, как её считает Telegram: эмодзи занимают две единицы."""
+    return len(text.encode('utf-16-le')) // 2
+
+
+def render_digest(sections, header=''):
+    """
+    Собирает сообщение сводки: заголовок, оглавление и разделы чатов.
+
+    :param sections: Список (заголовок раздела, текст).
+    """
+    toc = "".join(f"{number}. {title}\n" for number, (title, _) in enumerate(sections, 1))
+    body = "".join(f"\n{number}. {title}\n{text}\n"
+                   for number, (title, text) in enumerate(sections, 1))
+    return f"{header}Содержание:\n{toc}{body}".rstrip('\n')
+
+
+def _split_text(text, size):
+    """
+    Делит текст на части не длиннее size, по возможности по границам строк.
+    """
+    parts, current = [], ''
+    for line in text.splitlines(keepends=True):
+        while text_length(line) > size:
+            # Строка сама длиннее части: режем по символам
+            cut = size
+            while text_length(line[:cut]) > size:
+                cut -= 1
+            if current:
+                parts.append(current)
+                current = ''
+            parts.append(line[:cut])
+            line = line[cut:]
+        if text_length(current + line) > size:
+            parts.append(current)
+            current = ''
+        current += line
+    if current or not parts:
+        parts.append(current)
+    return [part.rstrip('\n') for part in parts]
+
+
+def _fit_section(title, text, limit):
+    """
+    Раздел, не помещающийся в одно сообщение, делится на части «название (i/n)».
+    """
+    if text_length(render_digest([(title, text)])) <= limit:
+        return [(title, text)]
+    # Служебная часть сообщения: оглавление и заголовок раздела с номером части
+    overhead = text_length(render_digest([(f"{title} (99/99)", '')]))
+    parts = _split_text(text, max(limit - overhead, 1))
+    return [(f"{title} ({index}/{len(parts)})", part)
+            for index, part in enumerate(parts, 1)]
+
+
+def pack_digest(sections, limit=TELEGRAM_MESSAGE_LIMIT):
+    """
+    Упаковывает результаты нескольких чатов в как можно меньшее число сообщений
+    не длиннее limit (first-fit decreasing). В сообщении разделы идут в исходном
+    порядке, с оглавлением; если сообщений несколько — с номером части.
+
+    :param sections: Список (заголовок раздела, текст), например (название чата, результат).
+    :return: Список текстов сообщений.
+    """
+    budget = limit - HEADER_RESERVE
+    items = []
+    for title, text in sections:
+        items.extend(_fit_section(title, text, budget))
+
+    bins = []
+    order = sorted(range(len(items)), key=lambda index: -text_length(items[index][1]))
+    for index in order:
+        for bin_items in bins:
+            candidate = sorted(bin_items + [index])
+            if text_length(render_digest([items[i] for i in candidate])) <= budget:
+                bin_items.append(index)
+                break
+        else:
+            bins.append([index])
+
+    bins.sort(key=min)
+    messages = []
+    for number, bin_items in enumerate(bins, 1):
+        header = f"Сводка анализов, часть {number} из {len(bins)}\n\n" if len(bins) > 1 else ''
+        messages.append(render_digest([items[i] for i in sorted(bin_items)], header))
+    return messages
+
+
+class DigestBuffer:
+    """
+    Результаты чатов, ждущие отправки сводкой. Окно открывается первым
+    результатом; повторный результат чата в том же окне заменяет прежний.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items = {}
+        self._since = None
+
+    def add(self, chat_id, title, text, now):
+        with self._lock:
+            if self._since is None:
+                self._since = now
+            self._items.pop(chat_id, None)
+            self._items[chat_id] = (title, text)
+
+    def take(self, now, window, force=False):
+        """
+        Забирает накопленные результаты [(chat_id, заголовок, текст)],
+        если окно истекло (или force); иначе пустой список.
+        """
+        with self._lock:
+            if not self._items or (not force and now - self._since < window):
+                return []
+            items = [(chat_id, title, text) for chat_id, (title, text) in self._items.items()]
+            self._items = {}
+            self._since = None
+            return items
+
+    def __len__(self):
+        return len(self._items)
@@ -0,0 +1,25 @@
+import os
+
+
+def env_flag(name, default=False):
+    """
+    Читает булев флаг из переменной окружения ('1', 'true', 'yes', 'on').
+    """
+    value = os.getenv(name)
+    if value is None or value.strip() == '':
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_int(name, default):
+    """
+    Читает целое число из переменной окружения.
+    """
+    value = os.getenv(name)
+    if value is None or value.strip() == '':
+        return default
+    try:
+        return int(value)
+    except ValueError as e:
+        raise ValueError(
+            f"Переменная окружения {name} должна быть целым числом: {value}") from e
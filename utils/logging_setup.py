@@ -0,0 +1,157 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+# Контекст записи (job, chat_id, ...) — наследуется задачами asyncio, в потоках задаётся явно
+_log_context = contextvars.ContextVar('log_context', default={})
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+@contextmanager
+def log_context(**fields):
+    """
+    Добавляет поля ко всем записям лога внутри блока: with log_context(job='analysis', chat_id=1).
+    """
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Прикрепляет к записи текущий контекст (в потоке, где запись создана).
+    """
+
+    def filter(self, record):
+        record.context = _log_context.get()
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Ограничивает число записей ниже WARNING с одной строки кода:
+    не больше limit за interval секунд, о пропущенных сообщается в следующей записи.
+    """
+
+    def __init__(self, limit, interval):
+        super().__init__()
+        self.limit = limit
+        self.interval = interval
+        self._lock = threading.Lock()
+        # (pathname, lineno) -> [начало окна, записано, пропущено]
+        self._sites = {}
+
+    def filter(self, record):
+        if self.limit <= 0 or record.levelno >= logging.WARNING:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= self.interval:
+                suppressed = site[2] if site else 0
+                self._sites[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if site[1] < self.limit:
+                site[1] += 1
+                return True
+            site[2] += 1
+            return False
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler, не форматирующий запись в вызывающем потоке:
+    подстановка аргументов и сериализация выполняются в потоке слушателя.
+    """
+
+    def prepare(self, record):
+        return copy.copy(record)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        context = getattr(record, 'context', None)
+        if context:
+            line += ' [' + ' '.join(f"{key}={value}" for key,
+                                    value in context.items()) + ']'
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            line += f" (пропущено похожих записей: {suppressed})"
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        data.update(getattr(record, 'context', None) or {})
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            data["suppressed"] = suppressed
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def setup_logging(level=None):
+    """
+    Настраивает корневой логгер: неблокирующая очередь + слушатель в отдельном потоке.
+
+    Переменные окружения: LOG_LEVEL (INFO), LOG_FORMAT (text | json),
+    LOG_RATE_LIMIT (записей с одной строки за интервал, 0 — без ограничения),
+    LOG_RATE_INTERVAL (секунды).
+    """
+    global _listener  # pylint: disable=global-statement
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        level = level or os.getenv('LOG_LEVEL', 'INFO').upper()
+        if os.getenv('LOG_FORMAT', 'text') == 'json':
+            formatter = JsonFormatter()
+        else:
+            formatter = TextFormatter(
+                '%(asctime)s - %(levelname)s - %(message)s')
+
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(formatter)
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = LazyQueueHandler(log_queue)
+        queue_handler.addFilter(ContextFilter())
+        queue_handler.addFilter(RateLimitFilter(
+            int(os.getenv('LOG_RATE_LIMIT', '20')),
+            float(os.getenv('LOG_RATE_INTERVAL', '60'))
+        ))
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(level)
+
+        _listener = logging.handlers.QueueListener(
+            log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
@@ -0,0 +1,33 @@
+import logging
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from utils.env import env_flag
+
+# Замер пиковой памяти задач через tracemalloc (заметно замедляет выделение памяти)
+MEASURE_MEMORY = env_flag('MEASURE_MEMORY')
+
+_lock = threading.Lock()
+
+
+@contextmanager
+def measure_peak(label):
+    """
+    Логирует пик памяти Python-объектов внутри блока сверх памяти на входе.
+    Счётчик tracemalloc общий для процесса: для точных цифр запускайте
+    замер с одним потоком анализа (ANALYSIS_WORKERS=1).
+    """
+    if not MEASURE_MEMORY:
+        yield
+        return
+    with _lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        start, _ = tracemalloc.get_traced_memory()
+    try:
+        yield
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        logging.info("Пик памяти (%s): %.1f МБ.",
+                     label, (peak - start) / 2 ** 20)
@@ -0,0 +1,97 @@
+import os
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from utils.env import env_flag, env_int
+
+load_dotenv()
+
+# Выбор модели по объёму окна, приоритету чата и времени до отправки (иначе — lite, как раньше)
+MODEL_ROUTING = env_flag('MODEL_ROUTING')
+MODEL_LITE = os.getenv('MODEL_LITE', 'yandexgpt-lite')
+MODEL_FULL = os.getenv('MODEL_FULL', 'yandexgpt')
+# Окна меньше этого (в токенах) — короткий ответ на lite
+MODEL_SMALL_MAX_TOKENS = env_int('MODEL_SMALL_MAX_TOKENS', 1000)
+# Окна от этого размера (в токенах) — полная модель
+MODEL_FULL_MIN_TOKENS = env_int('MODEL_FULL_MIN_TOKENS', 6000)
+# Чаты с приоритетом не ниже этого — полная модель при любом объёме
+MODEL_FULL_MIN_PRIORITY = env_int('MODEL_FULL_MIN_PRIORITY', 1)
+# Предел maxTokens запроса (у пакетного бюджет ответа умножается на число чатов)
+MODEL_MAX_OUTPUT_TOKENS = env_int('MODEL_MAX_OUTPUT_TOKENS', 8000)
+
+CHARS_PER_TOKEN = 3.5
+
+# Грубые скорости обработки (токенов в секунду) для оценки, успеет ли модель к отправке
+MODEL_SPEED = {
+    'yandexgpt-lite': {'input': 4000, 'output': 60},
+    'yandexgpt': {'input': 2000, 'output': 30},
+}
+DEFAULT_SPEED = {'input': 2000, 'output': 30}
+
+DEFAULT_OPTIONS = {
+    "model": MODEL_LITE,
+    "maxTokens": 2000,
+    "temperature": 0.6,
+}
+
+
+def estimate_seconds(options, tokens_input):
+    """Оценка длительности запроса с такими параметрами (секунды)."""
+    speed = MODEL_SPEED.get(options["model"], DEFAULT_SPEED)
+    return tokens_input / speed['input'] + options["maxTokens"] / speed['output']
+
+
+def seconds_until(send_time, now_nsk):
+    """
+    Секунды до ближайшего наступления send_time (time или 'HH:MM:SS') после now_nsk.
+    """
+    if send_time is None:
+        return None
+    if isinstance(send_time, str):
+        send_time = datetime.strptime(send_time[:8], '%H:%M:%S').time()
+    send_at = now_nsk.replace(hour=send_time.hour, minute=send_time.minute,
+                              second=send_time.second, microsecond=0)
+    if send_at <= now_nsk:
+        send_at += timedelta(days=1)
+    return (send_at - now_nsk).total_seconds()
+
+
+def _per_sections(options, sections):
+    """Бюджет ответа на каждый раздел пакетного запроса, не больше MODEL_MAX_OUTPUT_TOKENS."""
+    if sections <= 1:
+        return options
+    return {**options, "maxTokens": min(options["maxTokens"] * sections, MODEL_MAX_OUTPUT_TOKENS)}
+
+
+def choose_model(chars, priority=0, seconds_left=None, sections=1):
+    """
+    Выбирает модель и параметры ответа для запроса.
+
+    :param chars: Объём пользовательского текста запроса в символах.
+    :param priority: Приоритет чата (ChatRunStats.priority).
+    :param seconds_left: Секунды до отправки результата (None — без ограничения).
+    :param sections: Разделов в ответе (чатов пакетного запроса): бюджет ответа — на каждый.
+    :return: dict model, maxTokens, temperature, reason — для build_payload и filters.
+    """
+    if not MODEL_ROUTING:
+        return _per_sections({**DEFAULT_OPTIONS, "reason": "default"}, sections)
+
+    tokens_input = chars / CHARS_PER_TOKEN
+    if tokens_input >= MODEL_FULL_MIN_TOKENS:
+        options = {"model": MODEL_FULL, "maxTokens": 4000,
+                   "temperature": 0.5, "reason": "large_window"}
+    elif priority >= MODEL_FULL_MIN_PRIORITY:
+        options = {"model": MODEL_FULL, "maxTokens": 2000,
+                   "temperature": 0.5, "reason": "priority"}
+    elif tokens_input < MODEL_SMALL_MAX_TOKENS:
+        options = {"model": MODEL_LITE, "maxTokens": 800,
+                   "temperature": 0.6, "reason": "small_window"}
+    else:
+        options = {**DEFAULT_OPTIONS, "reason": "medium_window"}
+    options = _per_sections(options, sections)
+
+    # Не успеваем к отправке — переходим на lite с коротким ответом
+    if seconds_left is not None and options["model"] != MODEL_LITE \
+            and estimate_seconds(options, tokens_input) > seconds_left:
+        options = {"model": MODEL_LITE, "maxTokens": min(options["maxTokens"], 2000 * sections),
+                   "temperature": 0.6, "reason": options["reason"] + "+deadline"}
+    return options
@@ -0,0 +1,73 @@
+import threading
+
+
+class ChatDag:
+    """
+    Граф зависимостей шагов чата: шаг запускается, когда наступило его время
+    и завершены все ожидаемые шаги, от которых он зависит (отправка ждёт анализ).
+    """
+
+    DEPENDENCIES = {
+        'analysis': (),
+        'send': ('analysis',),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (chat_id, step) -> цикл, в котором шаг ожидается, но ещё не завершён
+        self._pending = {}
+        # (chat_id, step) -> момент, с которого шаг ждёт зависимости
+        self._waiting = {}
+
+    def expect(self, chat_id, step, cycle):
+        """Отмечает, что шаг чата будет выполнен в этом цикле."""
+        with self._lock:
+            self._pending[(chat_id, step)] = cycle
+
+    def is_pending(self, chat_id, step):
+        with self._lock:
+            return (chat_id, step) in self._pending
+
+    def _blocked(self, chat_id, step):
+        return any((chat_id, dep) in self._pending for dep in self.DEPENDENCIES[step])
+
+    def request(self, chat_id, step, now):
+        """
+        Время шага наступило. Возвращает True, если шаг можно запускать сразу;
+        иначе шаг паркуется до завершения зависимостей.
+        """
+        with self._lock:
+            if self._blocked(chat_id, step):
+                self._waiting.setdefault((chat_id, step), now)
+                return False
+            return True
+
+    def complete(self, chat_id, step):
+        """
+        Отмечает шаг завершённым (успешно или нет) и возвращает [(chat_id, step)],
+        которые стали готовы к запуску.
+        """
+        with self._lock:
+            self._pending.pop((chat_id, step), None)
+            ready = [
+                key for key in self._waiting
+                if key[0] == chat_id and not self._blocked(*key)
+            ]
+            for key in ready:
+                del self._waiting[key]
+            return ready
+
+    def expire(self, now, timeout):
+        """
+        Снимает с ожидания шаги, ждущие дольше timeout, и возвращает их.
+        """
+        with self._lock:
+            expired = [key for key, since in self._waiting.items()
+                       if now - since >= timeout]
+            for key in expired:
+                del self._waiting[key]
+            return expired
+
+    def waiting_count(self):
+        with self._lock:
+            return len(self._waiting)
@@ -0,0 +1,81 @@
+import cProfile
+import functools
+import io
+import itertools
+import logging
+import os
+import pstats
+import threading
+import time
+from datetime import datetime
+from dotenv import load_dotenv
+from utils.env import env_int
+
+load_dotenv()
+
+# Профилируемые задачи планировщика через запятую (имена функций, '*' — все); пусто — выключено
+PROFILE_JOBS = {name.strip() for name in os.getenv(
+    'PROFILE_JOBS', '').split(',') if name.strip()}
+# Профилировать каждый N-й запуск задачи
+PROFILE_EVERY_N = max(env_int('PROFILE_EVERY_N', 1), 1)
+# Каталог для .prof и сводок горячих точек
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+# Число функций в сводке (по суммарному времени)
+PROFILE_TOP_N = env_int('PROFILE_TOP_N', 20)
+
+# Одновременно в процессе может работать только один cProfile
+_active = threading.Lock()
+
+
+def _enabled_for(name):
+    return '*' in PROFILE_JOBS or name in PROFILE_JOBS
+
+
+def _write_profile(name, profiler, elapsed):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(
+        PROFILE_DIR, f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}")
+    profiler.dump_stats(base + '.prof')
+
+    summary = io.StringIO()
+    summary.write(f"{name}: {elapsed * 1000:.0f} мс\n\n")
+    pstats.Stats(profiler, stream=summary).sort_stats(
+        'cumulative').print_stats(PROFILE_TOP_N)
+    with open(base + '.txt', 'w', encoding='utf-8') as f:
+        f.write(summary.getvalue())
+    logging.info("Профиль %s: %.0f мс, %s.prof", name, elapsed * 1000, base)
+
+
+def profiled(func):
+    """
+    Профилирует задачу через cProfile, если она указана в PROFILE_JOBS.
+    Профиль (.prof, открывается snakeviz/pstats) и сводка top-N (.txt) пишутся в PROFILE_DIR.
+    cProfile видит только свой поток: работу пула анализа профилируйте задачей execute_analysis.
+    Без PROFILE_JOBS функция возвращается как есть.
+    """
+    name = func.__name__
+    if not _enabled_for(name):
+        return func
+
+    runs = itertools.count(1)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if next(runs) % PROFILE_EVERY_N != 0 or not _active.acquire(blocking=False):
+            return func(*args, **kwargs)
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.disable()
+                try:
+                    _write_profile(name, profiler, time.perf_counter() - started)
+                except Exception as e:
+                    logging.error(f"Не удалось сохранить профиль {name}: {e}")
+        finally:
+            _active.release()
+
+    return wrapper
@@ -0,0 +1,199 @@
+import contextvars
+import logging
+import time
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime
+from dotenv import load_dotenv
+from utils.env import env_flag, env_int
+
+load_dotenv()
+
+# Журнал запусков (job_runs): время этапов, объёмы и исход каждого анализа и отправки
+JOB_LEDGER = env_flag('JOB_LEDGER', True)
+# Сколько дней хранить записи журнала
+JOB_LEDGER_RETENTION_DAYS = env_int('JOB_LEDGER_RETENTION_DAYS', 30)
+
+STAGES = ('fetch', 'encode', 'llm', 'save', 'send')
+
+# Текущий запуск — этапы внутри analyze и yandex_funcs находят его без передачи параметром
+_current_run = contextvars.ContextVar('current_run', default=None)
+
+
+class RunRecord:
+    """
+    Накопитель одного запуска: собственное время этапов и поля для job_runs.
+    """
+
+    def __init__(self, job, chat_id=None):
+        self.job = job
+        self.chat_id = chat_id
+        self.stage_seconds = dict.fromkeys(STAGES, 0.0)
+        self.message_count = None
+        self.tokens_input = None
+        self.tokens_output = None
+        self.outcome = 'ok'
+        self.error_class = None
+        # Стек времени вложенных этапов: объемлющему этапу засчитывается только своё
+        self._children = []
+
+    def _begin(self):
+        self._children.append(0.0)
+        return time.perf_counter()
+
+    def _end(self, name, started):
+        elapsed = time.perf_counter() - started
+        children = self._children.pop()
+        self.stage_seconds[name] += elapsed - children
+        if self._children:
+            self._children[-1] += elapsed
+
+    def set_counts(self, message_count=None, tokens_input=None, tokens_output=None):
+        if message_count is not None:
+            self.message_count = message_count
+        if tokens_input is not None:
+            self.tokens_input = tokens_input
+        if tokens_output is not None:
+            self.tokens_output = tokens_output
+
+    def fields(self, started_at, finished_at, total_seconds):
+        return {
+            "job": self.job,
+            "chat_id": self.chat_id,
+            "started_at": started_at,
+            "finished_at": finished_at,
+            **{f"{name}_ms": round(seconds * 1000) if seconds else None
+               for name, seconds in self.stage_seconds.items()},
+            "total_ms": round(total_seconds * 1000),
+            "message_count": self.message_count,
+            "tokens_input": self.tokens_input,
+            "tokens_output": self.tokens_output,
+            "outcome": self.outcome,
+            "error_class": self.error_class,
+        }
+
+
+def current_run():
+    """Текущий запуск или None (вне track_run или при JOB_LEDGER=false)."""
+    return _current_run.get()
+
+
+@contextmanager
+def track_run(job, chat_id=None):
+    """
+    Записывает запуск в job_runs по выходу из блока, в том числе при исключении
+    (исход error и причина — error_class исключения, если есть, иначе его класс;
+    исключение пробрасывается дальше).
+    """
+    if not JOB_LEDGER:
+        yield None
+        return
+    from database.managers.job_run_manager import JobRunManager
+
+    record = RunRecord(job, chat_id)
+    token = _current_run.set(record)
+    started_at = datetime.utcnow()
+    started = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record.outcome = 'error'
+        record.error_class = getattr(e, 'error_class', None) or type(e).__name__
+        raise
+    finally:
+        _current_run.reset(token)
+        try:
+            # Своя сессия: запись не зависит от отката единицы работы задачи
+            JobRunManager().add_run(**record.fields(
+                started_at, datetime.utcnow(), time.perf_counter() - started))
+        except Exception as e:
+            logging.error(f"Не удалось записать запуск {job} для чата {chat_id}: {e}")
+
+
+@asynccontextmanager
+async def track_run_async(job, chat_id, session_factory):
+    """
+    track_run для асинхронного режима: запись в job_runs — через AsyncManager
+    в своей сессии из session_factory.
+    """
+    if not JOB_LEDGER:
+        yield None
+        return
+    from database.managers.async_manager import AsyncManager
+
+    record = RunRecord(job, chat_id)
+    token = _current_run.set(record)
+    started_at = datetime.utcnow()
+    started = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record.outcome = 'error'
+        record.error_class = getattr(e, 'error_class', None) or type(e).__name__
+        raise
+    finally:
+        _current_run.reset(token)
+        try:
+            async with session_factory() as session:
+                await AsyncManager(session).add_run(**record.fields(
+                    started_at, datetime.utcnow(), time.perf_counter() - started))
+        except Exception as e:
+            logging.error(f"Не удалось записать запуск {job} для чата {chat_id}: {e}")
+
+
+def add_share(record, chat_id, share, started_at, total_seconds, message_count=None,
+              tokens_input=None, tokens_output=None, job='analysis_batch_chat',
+              outcome='ok', error_class=None):
+    """
+    Записывает в job_runs долю общего запуска (пакетного анализа), приходящуюся
+    на чат: время этапов и общее время — пропорционально share.
+    """
+    if record is None:
+        return
+    from database.managers.job_run_manager import JobRunManager
+
+    share_record = RunRecord(job, chat_id)
+    share_record.stage_seconds = {name: seconds * share
+                                  for name, seconds in record.stage_seconds.items()}
+    share_record.set_counts(message_count, tokens_input, tokens_output)
+    share_record.outcome = outcome
+    share_record.error_class = error_class
+    try:
+        JobRunManager().add_run(**share_record.fields(
+            started_at, datetime.utcnow(), total_seconds * share))
+    except Exception as e:
+        logging.error(f"Не удалось записать долю запуска {job} для чата {chat_id}: {e}")
+
+
+@contextmanager
+def stage(name):
+    """Засчитывает время блока этапу name текущего запуска (вне запуска — ничего)."""
+    record = _current_run.get()
+    if record is None:
+        yield
+        return
+    started = record._begin()
+    try:
+        yield
+    finally:
+        record._end(name, started)
+
+
+def timed_iter(name, iterable):
+    """
+    Засчитывает этапу name время получения каждого элемента (чтение курсора
+    внутри потокового кодирования).
+    """
+    record = _current_run.get()
+    if record is None:
+        yield from iterable
+        return
+    iterator = iter(iterable)
+    while True:
+        started = record._begin()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            record._end(name, started)
+        yield item
@@ -0,0 +1,117 @@
+import logging
+import select
+import threading
+import time
+from collections import namedtuple
+
+# Поля расписания чата в снимке (schedule_analysis всегда True: build_hour_plan его проверяет)
+ScheduledChat = namedtuple(
+    'ScheduledChat', 'chat_id schedule_analysis analysis_time send_time')
+
+
+class ScheduleSnapshot:
+    """
+    Неизменяемый снимок расписаний с индексом по часу анализа и отправки.
+    """
+
+    def __init__(self, version, chats, generation=0):
+        self.version = version
+        # Номер перечитывания: меняется при каждой загрузке, даже если версия та же
+        self.generation = generation
+        self.chats = chats
+        self._by_hour = {}
+        for chat in chats:
+            hours = {value.hour for value in (chat.analysis_time, chat.send_time) if value}
+            for hour in hours:
+                self._by_hour.setdefault(hour, []).append(chat)
+
+    def chats_for_hour(self, hour):
+        """Чаты, у которых в этот час анализ или отправка."""
+        return self._by_hour.get(hour, [])
+
+    def chat_ids(self):
+        return [chat.chat_id for chat in self.chats]
+
+
+class ScheduleCache:
+    """
+    Расписания чатов в памяти. Таблица chats перечитывается, только когда
+    изменилась версия расписаний (schedule_version) или пришёл NOTIFY;
+    в остальных тиках — одно чтение строки версии (или ни одного при LISTEN).
+    В PostgreSQL версию увеличивает триггер на chats (database.db_setup.create_schedule_trigger),
+    в том числе при записи основным сервисом; в других СУБД — только ChatManager, поэтому
+    снимок старше max_age секунд перечитывается в любом случае (без триггера
+    планировщик задаёт короткий max_age, с триггером — долгий).
+    """
+
+    def __init__(self, max_age=60):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._loaded_at = 0.0
+        self._dirty = False
+        # Пока слушатель NOTIFY подключён, версию в каждом тике не проверяем
+        self.listening = False
+
+    def invalidate(self):
+        self._dirty = True
+
+    def get(self):
+        from database.managers.chat_manager import ChatManager
+        from database.managers.schedule_version_manager import ScheduleVersionManager
+
+        with self._lock:
+            expired = time.monotonic() - self._loaded_at >= self.max_age
+            if self._snapshot is not None and not self._dirty and not expired and self.listening:
+                return self._snapshot
+            version = ScheduleVersionManager().get_version()
+            if self._snapshot is None or self._dirty or expired or version != self._snapshot.version:
+                # Флаг снимаем до чтения: NOTIFY во время чтения вызовет ещё одно
+                self._dirty = False
+                chats = [ScheduledChat(row.chat_id, True, row.analysis_time, row.send_time)
+                         for row in ChatManager().get_scheduled_chats()]
+                self._snapshot = ScheduleSnapshot(
+                    version, chats, self._snapshot.generation + 1 if self._snapshot else 1)
+                self._loaded_at = time.monotonic()
+                logging.info(f"""Расписания перечитаны: версия {
+                             version}, чатов по расписанию {len(chats)}.""")
+            return self._snapshot
+
+
+def listen_schedule_changes(engine, cache, stop_event, timeout=60, retry_seconds=30):
+    """
+    Слушает NOTIFY об изменениях расписаний (PostgreSQL) и сбрасывает снимок.
+    Работает в отдельном потоке на выделенном соединении; при разрыве
+    тики проверяют версию сами, пока соединение не восстановится.
+    """
+    from database.managers.schedule_version_manager import SCHEDULE_CHANNEL
+
+    while not stop_event.is_set():
+        connection = None
+        try:
+            connection = engine.raw_connection()
+            dbapi_connection = connection.driver_connection
+            dbapi_connection.autocommit = True
+            with dbapi_connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {SCHEDULE_CHANNEL}")
+            # Изменения, пропущенные до подписки, подхватит следующая проверка версии
+            cache.invalidate()
+            cache.listening = True
+            logging.info("Подписка на изменения расписаний (LISTEN) активна.")
+            while not stop_event.is_set():
+                if select.select([dbapi_connection], [], [], timeout) == ([], [], []):
+                    continue
+                dbapi_connection.poll()
+                if dbapi_connection.notifies:
+                    dbapi_connection.notifies.clear()
+                    cache.invalidate()
+        except Exception as e:
+            logging.error(f"Ошибка подписки на изменения расписаний: {e}")
+        finally:
+            cache.listening = False
+            if connection is not None:
+                try:
+                    connection.invalidate()
+                except Exception:
+                    pass
+        stop_event.wait(retry_seconds)
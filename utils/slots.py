@@ -0,0 +1,230 @@
+import hashlib
+import heapq
+import math
+import threading
+
+
+def hash_offset(chat_id, window):
+    """
+    Детерминированное смещение чата внутри окна (в минутах) по хешу chat_id.
+    """
+    if window <= 1:
+        return 0
+    digest = hashlib.sha1(str(chat_id).encode('utf-8')).hexdigest()
+    return int(digest, 16) % window
+
+
+def balance_slots(volumes, window):
+    """
+    Распределяет чаты по минутам окна так, чтобы ожидаемый объём сообщений
+    на минуту был примерно одинаковым (жадно: самые тяжёлые чаты — первыми).
+
+    :param volumes: dict chat_id -> ожидаемое число сообщений.
+    :param window: Ширина окна в минутах.
+    :return: dict chat_id -> минута.
+    """
+    if window <= 1:
+        return {chat_id: 0 for chat_id in volumes}
+
+    heap = [(0, slot) for slot in range(window)]
+    slots = {}
+    for chat_id, volume in sorted(volumes.items(), key=lambda item: (-item[1], str(item[0]))):
+        load, slot = heapq.heappop(heap)
+        slots[chat_id] = slot
+        # Пустые чаты тоже занимают слот, чтобы не собирались в одну минуту
+        heapq.heappush(heap, (load + max(volume, 1), slot))
+    return slots
+
+
+class HourPlan:
+    """
+    План запусков на один час: минута анализа и отправки для каждого чата.
+    Задачи выдаются один раз, с догоном пропущенных минут.
+    """
+
+    def __init__(self, key, analysis_slots, send_slots, analysis_times):
+        self.key = key
+        self.analysis_slots = analysis_slots
+        self.send_slots = send_slots
+        self.analysis_times = analysis_times
+        # Оценки для порядка запуска (заполняются при построении плана)
+        self.volumes = {}
+        self.costs = {}
+        self.priorities = {}
+        # Чаты следующих часов, запущенные заранее: chat_id -> плановый момент анализа
+        self.nominal = {}
+        # Снимок расписаний, по которому построен план (ScheduleSnapshot.generation)
+        self.schedule_generation = None
+        self._taken_analyses = set()
+        self._taken_sends = set()
+        # План заменён новым (retire): задачи из него больше не выдаются
+        self._retired = False
+        self._lock = threading.Lock()
+
+    def take_due_analyses(self, minute):
+        """Возвращает [(chat_id, analysis_time)] с наступившим слотом, ещё не выданные."""
+        with self._lock:
+            due = [
+                chat_id for chat_id, slot in self.analysis_slots.items()
+                if slot <= minute and chat_id not in self._taken_analyses
+            ] if not self._retired else []
+            self._taken_analyses.update(due)
+        due.sort(key=lambda chat_id: self.analysis_slots[chat_id])
+        return [(chat_id, self.analysis_times[chat_id]) for chat_id in due]
+
+    def take_due_sends(self, minute):
+        """Возвращает chat_id с наступившим слотом отправки, ещё не выданные."""
+        with self._lock:
+            due = [
+                chat_id for chat_id, slot in self.send_slots.items()
+                if slot <= minute and chat_id not in self._taken_sends
+            ] if not self._retired else []
+            self._taken_sends.update(due)
+        due.sort(key=lambda chat_id: self.send_slots[chat_id])
+        return due
+
+    def carry_over(self, leftovers):
+        """Добавляет невыданные анализы прошлого часа в начало этого."""
+        with self._lock:
+            for chat_id, analysis_time in leftovers:
+                self.analysis_slots.setdefault(chat_id, 0)
+                self.analysis_times.setdefault(chat_id, analysis_time)
+
+    def retire(self):
+        """
+        Выводит план из оборота при замене новым: тик, получивший его до замены,
+        из него уже ничего не возьмёт. Возвращает (выданные анализы, выданные
+        отправки, невыданные анализы [(chat_id, analysis_time)] по порядку слотов).
+        """
+        with self._lock:
+            self._retired = True
+            leftovers = sorted(
+                (chat_id for chat_id in self.analysis_slots if chat_id not in self._taken_analyses),
+                key=lambda chat_id: self.analysis_slots[chat_id])
+            self._taken_analyses.update(leftovers)
+            return (set(self._taken_analyses) - set(leftovers), set(self._taken_sends),
+                    [(chat_id, self.analysis_times[chat_id]) for chat_id in leftovers])
+
+    def inherit_taken(self, previous):
+        """
+        Заменяет план того же часа, построенный по старой версии расписаний:
+        старый выводится из оборота, уже выданные в нём задачи повторно не выдаются.
+        Возвращает (chat_id анализов, ещё не выданных в этом плане,
+        невыданные анализы старого плана [(chat_id, analysis_time)]).
+        """
+        taken_analyses, taken_sends, leftovers = previous.retire()
+        with self._lock:
+            self._taken_analyses |= taken_analyses
+            self._taken_sends |= taken_sends
+            return [chat_id for chat_id in self.analysis_slots
+                    if chat_id not in self._taken_analyses], leftovers
+
+    def drop_before(self, minute):
+        """
+        Убирает из плана слоты раньше указанной минуты. Они считаются выданными,
+        чтобы не вернуться при перестроении плана (inherit_taken).
+        """
+        with self._lock:
+            self._taken_analyses.update(
+                chat_id for chat_id, slot in self.analysis_slots.items() if slot < minute)
+            self._taken_sends.update(
+                chat_id for chat_id, slot in self.send_slots.items() if slot < minute)
+            self.analysis_slots = {
+                chat_id: slot for chat_id, slot in self.analysis_slots.items() if slot >= minute}
+            self.send_slots = {
+                chat_id: slot for chat_id, slot in self.send_slots.items() if slot >= minute}
+
+    def order_by_cost(self, tasks):
+        """
+        Упорядочивает [(chat_id, analysis_time)] для пула исполнителей:
+        сначала более высокий приоритет, внутри приоритета — самые долгие (LPT),
+        что сокращает время до завершения последней задачи тика.
+        """
+        return sorted(tasks, key=lambda task: (
+            -self.priorities.get(task[0], 0),
+            -self.costs.get(task[0], 0.0),
+            str(task[0])
+        ))
+
+
+def estimate_cost(stats, message_count, default_seconds=5.0, default_seconds_per_message=0.01):
+    """
+    Оценивает длительность анализа чата в секундах.
+
+    :param stats: Статистика прошлых запусков (dict из RunStatsManager) или None.
+    :param message_count: Ожидаемое число сообщений в окне анализа.
+    """
+    if stats and stats.get("avg_seconds_per_message") and message_count:
+        return stats["avg_seconds_per_message"] * message_count
+    if stats and stats.get("avg_seconds"):
+        return stats["avg_seconds"]
+    return default_seconds + default_seconds_per_message * (message_count or 0)
+
+
+def predict_duration(history, message_count=None, quantile=0.9):
+    """
+    Длительность анализа чата в секундах, которую запуск не превысит с
+    вероятностью quantile (по истории запусков из job_runs). Время ответа модели
+    берётся как есть, остальное (чтение, кодирование, сохранение) масштабируется
+    по отношению ожидаемого объёма к объёму прошлого запуска.
+
+    :param history: [(message_count, total_seconds, llm_seconds)] прошлых запусков.
+    :return: Секунды или None, если истории нет.
+    """
+    samples = []
+    for count, total, llm in history:
+        llm = min(llm or 0.0, total)
+        ratio = message_count / count if message_count and count else 1.0
+        samples.append(llm + (total - llm) * ratio)
+    if not samples:
+        return None
+    samples.sort()
+    return samples[min(len(samples) - 1, max(math.ceil(quantile * len(samples)) - 1, 0))]
+
+
+def early_start(analysis_at, send_at, duration, max_early):
+    """
+    Момент запуска анализа, при котором он успевает к send_at: не позже
+    analysis_at и не раньше, чем за max_early до него.
+
+    :param duration: Ожидаемая длительность с запасом (timedelta).
+    """
+    latest = send_at - duration
+    if latest >= analysis_at:
+        return analysis_at
+    return max(latest, analysis_at - max_early)
+
+
+def build_hour_plan(key, chats, hour, window, mode='hash', volume_fn=None):
+    """
+    Строит план на час для чатов с анализом по расписанию.
+
+    :param key: Ключ часа (например, '2025-01-01T05').
+    :param chats: Чаты (объекты Chat).
+    :param hour: Текущий час по Новосибирску.
+    :param window: Ширина окна разнесения в минутах (<= 1 — всё в начале часа).
+    :param mode: 'hash' — смещение по хешу chat_id, 'load' — балансировка по объёму.
+    :param volume_fn: Функция chat_id -> ожидаемый объём сообщений (для режима 'load').
+    """
+    analysis_chats = [
+        chat for chat in chats
+        if chat.schedule_analysis and chat.analysis_time and chat.analysis_time.hour == hour
+    ]
+    send_chats = [
+        chat for chat in chats
+        if chat.schedule_analysis and chat.send_time and chat.send_time.hour == hour
+    ]
+
+    if mode == 'load' and volume_fn is not None and window > 1:
+        analysis_slots = balance_slots(
+            {chat.chat_id: volume_fn(chat.chat_id) for chat in analysis_chats}, window)
+    else:
+        analysis_slots = {chat.chat_id: hash_offset(chat.chat_id, window)
+                          for chat in analysis_chats}
+
+    # Порядок анализ -> отправка обеспечивает ChatDag, а не минуты слотов
+    send_slots = {chat.chat_id: hash_offset(chat.chat_id, window)
+                  for chat in send_chats}
+
+    analysis_times = {chat.chat_id: chat.analysis_time for chat in analysis_chats}
+    return HourPlan(key, analysis_slots, send_slots, analysis_times)
@@ -4,8 +4,10 @@ import logging
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from pytz import timezone, UTC
-from telebot import TeleBot
-from utils import get_chat_name
+from telebot import TeleBot, apihelper
+from utils import clock, get_chat_name
+from utils.env import env_flag, env_int
+from utils.run_ledger import current_run, stage, timed_iter
 
 
 load_dotenv()
@@ -14,57 +16,131 @@ novosibirsk_tz = timezone('Asia/Novosibirsk')
 
 BOT_TOKEN = os.getenv('TG_API_TOKEN')
 CHAT_ID = os.getenv('CHAT_ID')
+# Адрес Bot API (по умолчанию api.telegram.org; для локальных заглушек и прогонов — свой)
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL')
+if TELEGRAM_API_URL:
+    apihelper.API_URL = TELEGRAM_API_URL.rstrip('/') + "/bot{0}/{1}"
 
+# Инкрементальный режим: дневной анализ собирается из часовых сводок
+INCREMENTAL_ANALYSIS = env_flag('INCREMENTAL_ANALYSIS')
+# Проверка пустоты окна по почасовым счётчикам (message_activity), без чтения messages
+ACTIVITY_ROLLUP = env_flag('ACTIVITY_ROLLUP')
 
-def analyze(chat_id, analysis_time):
-    """
-    Анализирует сообщения в чате за указанный временной промежуток.
-    """
-    logging.info(f"Начало анализа для чата {chat_id}")
-    from database.managers.chat_manager import ChatManager
-    from database.managers.message_manager import MessageManager
-    from utils import get_prompt
-    from utils import chatgpt_analyze
-    chat_manager = ChatManager()
-    message_manager = MessageManager()
+# Пакетный анализ небольших чатов: окна с общим промптом — одним запросом к модели
+BATCH_SMALL_CHATS = env_flag('BATCH_SMALL_CHATS')
+# Чат считается небольшим, если ожидаемое число сообщений за окно не больше этого
+BATCH_MAX_MESSAGES = env_int('BATCH_MAX_MESSAGES', 30)
+# Ограничения одного пакетного запроса: число чатов и символов сообщений
+BATCH_MAX_CHATS = env_int('BATCH_MAX_CHATS', 5)
+BATCH_MAX_CHARS = env_int('BATCH_MAX_CHARS', 30000)
 
-    chat = chat_manager.get_chat_by_id(chat_id)
-    if not chat:
-        logging.error(f"Чат {chat_id} не найден.")
-        raise ValueError(f"Чат {chat_id} не найден.")
 
-    now_nsk = datetime.now(novosibirsk_tz)
+def analysis_window(analysis_time, now_nsk=None):
+    """
+    Возвращает окно анализа (начало, конец) в UTC: сутки до analysis_time текущего дня.
+    """
+    if now_nsk is None:
+        now_nsk = clock.now(novosibirsk_tz)
 
     # now_nsk уже timezone-aware, значит можно безопасно заменять время и отнимать дни
-    analysis_start_nsk = now_nsk.replace(
-        hour=analysis_time.hour,
-        minute=analysis_time.minute,
-        second=analysis_time.second,
-        microsecond=0
-    ) - timedelta(days=1)
-
     analysis_end_nsk = now_nsk.replace(
         hour=analysis_time.hour,
         minute=analysis_time.minute,
         second=analysis_time.second,
         microsecond=0
     )
+    analysis_start_nsk = analysis_end_nsk - timedelta(days=1)
 
     # оба уже имеют tzinfo, можно переводить в UTC
-    analysis_start = analysis_start_nsk.astimezone(UTC)
-    analysis_end = analysis_end_nsk.astimezone(UTC)
+    return analysis_start_nsk.astimezone(UTC), analysis_end_nsk.astimezone(UTC)
 
-    logging.info(f"Диапазон анализа: {analysis_start} - {analysis_end}")
 
-    try:
-        messages = message_manager.get_filtered_messages(
-            start_date=analysis_start.isoformat(),
-            end_date=analysis_end.isoformat(),
-            chat_id=chat_id
-        )
-    except Exception as e:
-        logging.error(f"Ошибка при получении сообщений: {e}")
-        raise
+def _analysis_results(chat_id, prompt_ids, filters, outputs=None):
+    """
+    Собирает результаты анализа по промптам: один dict на промпт.
+    outputs — кортежи (текст, токены запроса, токены ответа) в порядке prompt_ids.
+    """
+    if outputs is None:
+        outputs = [(None, 0, 0)] * len(prompt_ids)
+    return [
+        {
+            "chat_id": chat_id,
+            "analysis_result": analysis_result,
+            "tokens_input": tokens_input,
+            "tokens_output": tokens_output,
+            "prompt_id": prompt_id,
+            "filters": filters
+        }
+        for prompt_id, (analysis_result, tokens_input, tokens_output) in zip(prompt_ids, outputs)
+    ]
+
+
+def _load_prompts(prompt_ids, session=None):
+    from utils import get_prompt
+    prompts = []
+    for prompt_id in prompt_ids:
+        prompt = get_prompt(prompt_id, session)
+        if not prompt:
+            raise ValueError(f"Промпт с ID {prompt_id} не найден.")
+        prompts.append(prompt)
+    return prompts
+
+
+def _route(chat, chars, session=None, deadline=True):
+    """
+    Выбирает модель для запроса по объёму текста, приоритету чата и времени до отправки.
+    """
+    from utils.model_routing import MODEL_ROUTING, choose_model, seconds_until
+    if not MODEL_ROUTING:
+        return choose_model(chars)
+    from database.managers.run_stats_manager import RunStatsManager
+    stats = RunStatsManager(session).get_stats([chat['chat_id']]).get(chat['chat_id']) or {}
+    # Для прошедших окон (дозаполнение) срок отправки не действует
+    seconds_left = seconds_until(
+        chat.get('send_time'), clock.now(novosibirsk_tz)) if deadline else None
+    options = choose_model(chars, stats.get('priority') or 0, seconds_left)
+    logging.info(f"""Чат {chat['chat_id']}: модель {options['model']}, maxTokens {
+                 options['maxTokens']} ({options['reason']}).""")
+    return options
+
+
+def analyze(chat_id, analysis_time, session=None, window=None, prompt_ids=None, encode=None,
+            now_nsk=None):
+    """
+    Анализирует сообщения в чате за указанный временной промежуток
+    всеми промптами чата (по умолчанию и из chat_prompts).
+    session — сессия единицы работы задачи (см. database.unit_of_work).
+
+    :param window: (начало, конец) в UTC для прошедших окон (дозаполнение, backfill.py);
+        по умолчанию — сутки до analysis_time текущего дня.
+    :param prompt_ids: Промпты вместо промптов чата.
+    :param encode: Функция (строки, session) -> JSON-строки вместо encode_rows.
+    :param now_nsk: День, к которому относится analysis_time (ранний запуск до полуночи).
+    :return: Список результатов — по одному на промпт.
+    """
+    logging.info(f"Начало анализа для чата {chat_id}")
+    from database.managers.chat_manager import ChatManager
+    from database.managers.chat_prompt_manager import ChatPromptManager
+    from database.managers.message_manager import MessageManager
+    from utils.yandex_funcs import chatgpt_analyze_encoded, encode_rows
+    chat_manager = ChatManager(session)
+    message_manager = MessageManager(session)
+
+    chat = chat_manager.get_chat_by_id(chat_id)
+    if not chat:
+        logging.error(f"Чат {chat_id} не найден.")
+        raise ValueError(f"Чат {chat_id} не найден.")
+
+    if prompt_ids is None:
+        prompt_ids = ChatPromptManager(session).get_prompt_ids(
+            chat_id, chat['default_prompt_id'])
+    if not prompt_ids:
+        raise ValueError(f"У чата {chat_id} не задан ни один промпт.")
+    encode = encode or encode_rows
+
+    analysis_start, analysis_end = window or analysis_window(analysis_time, now_nsk)
+
+    logging.info(f"Диапазон анализа: {analysis_start} - {analysis_end}")
 
     filters = {
         "chat_id": chat_id,
@@ -72,82 +148,396 @@ def analyze(chat_id, analysis_time):
         "end_date": analysis_end.isoformat(),
         "user_id": None
     }
+    if window:
+        # Результаты за прошедшие дни не отправляются как сегодняшние
+        filters["backfill"] = True
 
-    if not messages:
+    if ACTIVITY_ROLLUP:
+        from database.managers.activity_manager import ActivityManager
+        if not ActivityManager(session).has_activity(chat_id, analysis_start, analysis_end):
+            logging.info(f"""Нет активности в чате {
+                         chat_id} за период {analysis_start} - {analysis_end}, анализ пропущен.""")
+            return _analysis_results(chat_id, prompt_ids, filters)
+
+    if INCREMENTAL_ANALYSIS:
+        return _analyze_incremental(
+            chat, prompt_ids, analysis_start, analysis_end, filters, session, encode)
+
+    try:
+        # Сообщения кодируются по мере чтения, без промежуточных ORM-объектов и dict
+        with stage('encode'):
+            api_messages = encode(timed_iter('fetch', message_manager.iter_filtered_messages(
+                start_date=analysis_start,
+                end_date=analysis_end,
+                chat_id=chat_id
+            )), session)
+    except Exception as e:
+        logging.error(f"Ошибка при получении сообщений: {e}")
+        raise
+
+    if not api_messages:
         logging.warning(f"""Нет сообщений для анализа в чате {
                         chat_id} за период {analysis_start} - {analysis_end}.""")
-        return {
-            "chat_id": chat_id,
-            "analysis_result": None,
-            "tokens_input": 0,
-            "tokens_output": 0,
-            "prompt_id": chat['default_prompt_id'],
-            "filters": filters
-        }
+        return _analysis_results(chat_id, prompt_ids, filters)
 
-    logging.info(f"Сообщений для анализа найдено: {len(messages)}")
+    logging.info(f"Сообщений для анализа найдено: {len(api_messages)}")
+    if current_run():
+        current_run().set_counts(message_count=len(api_messages))
 
     try:
-        messages = [msg.to_dict() for msg in messages]
-        prompt = get_prompt(chat['default_prompt_id'])
-        if not prompt:
-            raise ValueError(
-                f"Промпт с ID {chat['default_prompt_id']} не найден.")
+        prompts = _load_prompts(prompt_ids, session)
+        options = _route(chat, sum(len(m) for m in api_messages), session, deadline=not window)
+        # Выбранная модель сохраняется вместе с результатом
+        filters["model"] = options
+        with stage('llm'):
+            outputs = chatgpt_analyze_encoded(prompts, api_messages, session, options)
+    except Exception as e:
+        logging.error(f"Ошибка при анализе сообщений: {e}")
+        raise
+
+    logging.info(f"Анализ завершён для чата {chat_id}.")
+    return _analysis_results(chat_id, prompt_ids, filters, outputs)
+
+
+def _analyze_incremental(chat, prompt_ids, analysis_start, analysis_end, filters, session=None,
+                         encode=None):
+    """
+    Собирает дневной анализ из часовых сводок и сообщений, которые в сводки не попали.
+    """
+    from database.managers.message_manager import MessageManager
+    from database.managers.summary_manager import SummaryManager
+    from utils.yandex_funcs import chatgpt_compose_encoded, encode_rows
+    message_manager = MessageManager(session)
+    summary_manager = SummaryManager(session)
+    chat_id = chat['chat_id']
+
+    # Сводки хранятся в naive UTC, как и сообщения
+    window_start = analysis_start.replace(tzinfo=None)
+    window_end = analysis_end.replace(tzinfo=None)
+
+    with stage('fetch'):
+        summaries = summary_manager.get_summaries(
+            chat_id, window_start, window_end)
 
-        analysis_result, tokens_input, tokens_output = chatgpt_analyze(
-            prompt, messages)
+    # Промежутки окна, не покрытые сводками, дочитываем сырыми сообщениями
+    gaps = []
+    cursor = window_start
+    covered = []
+    for summary in summaries:
+        period_start = datetime.fromisoformat(summary["period_start"])
+        period_end = datetime.fromisoformat(summary["period_end"])
+        if period_start < cursor:
+            continue
+        if period_start > cursor:
+            gaps.append((cursor, period_start - timedelta(microseconds=1)))
+        covered.append(summary)
+        cursor = period_end
+    if cursor <= window_end:
+        gaps.append((cursor, window_end))
+    encode = encode or encode_rows
+    with stage('encode'):
+        messages = encode(timed_iter(
+            'fetch',
+            (row for gap_start, gap_end in gaps
+             for row in message_manager.iter_filtered_messages(
+                 start_date=gap_start, end_date=gap_end, chat_id=chat_id))),
+            session)
+
+    summarized_count = sum(s["message_count"] for s in covered)
+    if current_run():
+        current_run().set_counts(message_count=summarized_count + len(messages))
+    logging.info(f"""Чат {chat_id}: {len(covered)} сводок ({
+                 summarized_count} сообщений), несвёрнутых сообщений: {len(messages)}.""")
+
+    if not messages and summarized_count == 0:
+        logging.warning(f"""Нет сообщений для анализа в чате {
+                        chat_id} за период {analysis_start} - {analysis_end}.""")
+        return _analysis_results(chat_id, prompt_ids, filters)
+
+    try:
+        prompts = _load_prompts(prompt_ids, session)
+        options = _route(chat, sum(len(m) for m in messages) +
+                         sum(len(s["summary_text"] or '') for s in covered), session,
+                         deadline=not filters.get("backfill"))
+        filters["model"] = options
+        with stage('llm'):
+            outputs = chatgpt_compose_encoded(
+                prompts, covered, messages, session, options)
     except Exception as e:
         logging.error(f"Ошибка при анализе сообщений: {e}")
         raise
 
     logging.info(f"Анализ завершён для чата {chat_id}.")
-    return {
-        "chat_id": chat_id,
-        "analysis_result": analysis_result,
-        "tokens_input": tokens_input,
-        "tokens_output": tokens_output,
-        "prompt_id": chat['default_prompt_id'],
-        "filters": filters
-    }
+    return _analysis_results(chat_id, prompt_ids, filters, outputs)
+
+
+def _pack_batches(items):
+    """Делит [(chat_id, номер промпта, сообщения)] на пакеты по BATCH_MAX_CHATS/BATCH_MAX_CHARS."""
+    batches = []
+    batch, batch_chars = [], 0
+    for item in items:
+        chars = sum(len(message) for message in item[2])
+        if batch and (len(batch) >= BATCH_MAX_CHATS or batch_chars + chars > BATCH_MAX_CHARS):
+            batches.append(batch)
+            batch, batch_chars = [], 0
+        batch.append(item)
+        batch_chars += chars
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _run_batch(prompt, batch, session=None, options=None):
+    """
+    Выполняет пакет одним запросом; при неразобранном или неудавшемся ответе —
+    отдельными запросами. Ошибка отдельного запроса не прерывает остальные чаты.
+
+    :return: Кортежи (результат, токены запроса, токены ответа, причина ошибки или None)
+             в порядке batch.
+    """
+    from utils.yandex_funcs import CompletionError, chatgpt_analyze_batch, chatgpt_analyze_encoded
+
+    if len(batch) > 1:
+        sections = [(f"chat_{chat_id}", api_messages)
+                    for chat_id, _, api_messages in batch]
+        try:
+            parsed, tokens_input, tokens_output = chatgpt_analyze_batch(
+                prompt, sections, session, options)
+        except CompletionError as e:
+            logging.warning(f"Пакетный запрос по {len(batch)} чатам не выполнен: {e}")
+            parsed = None
+        if parsed is not None:
+            # Токены общего запроса делим пропорционально объёму разделов
+            sizes = [max(sum(len(m) for m in api_messages), 1)
+                     for _, _, api_messages in batch]
+            total = sum(sizes)
+            return [
+                (parsed[key],
+                 round((tokens_input or 0) * size / total),
+                 round((tokens_output or 0) * size / total),
+                 None)
+                for (key, _), size in zip(sections, sizes)
+            ]
+        logging.warning(
+            f"Ответ пакетного запроса по {len(batch)} чатам не получен, анализируем по отдельности.")
+    outputs = []
+    for chat_id, _, api_messages in batch:
+        try:
+            outputs.append((*chatgpt_analyze_encoded([prompt], api_messages, session, options)[0], None))
+        except CompletionError as e:
+            logging.error(f"Ошибка анализа чата {chat_id} в пакете: {e}")
+            outputs.append((None, None, None, e.error_class))
+    return outputs
+
+
+def analyze_batch(tasks, session=None):
+    """
+    Анализирует несколько небольших чатов, объединяя окна с одинаковым промптом
+    в общие запросы к модели.
 
+    :param tasks: Список (chat_id, analysis_time).
+    :return: dict chat_id -> список результатов по промптам (как у analyze; у результатов,
+             запрос по которым не выполнен, есть error_class).
+    """
+    from database.managers.activity_manager import ActivityManager
+    from database.managers.chat_manager import ChatManager
+    from database.managers.chat_prompt_manager import ChatPromptManager
+    from database.managers.message_manager import MessageManager
+    from utils.model_routing import choose_model
+    from utils.yandex_funcs import encode_rows
+    chat_manager = ChatManager(session)
+    chat_prompt_manager = ChatPromptManager(session)
+    message_manager = MessageManager(session)
+
+    results = {}
+    # prompt_id -> [(chat_id, номер промпта в результатах чата, сообщения)]
+    groups = {}
+    for chat_id, analysis_time in tasks:
+        chat = chat_manager.get_chat_by_id(chat_id)
+        if not chat:
+            logging.error(f"Чат {chat_id} не найден.")
+            continue
+        prompt_ids = chat_prompt_manager.get_prompt_ids(
+            chat_id, chat['default_prompt_id'])
+        analysis_start, analysis_end = analysis_window(analysis_time)
+        filters = {
+            "chat_id": chat_id,
+            "start_date": analysis_start.isoformat(),
+            "end_date": analysis_end.isoformat(),
+            "user_id": None
+        }
+        results[chat_id] = _analysis_results(chat_id, prompt_ids, filters)
+
+        if ACTIVITY_ROLLUP and not ActivityManager(session).has_activity(
+                chat_id, analysis_start, analysis_end):
+            continue
+        with stage('encode'):
+            api_messages = encode_rows(timed_iter('fetch', message_manager.iter_filtered_messages(
+                start_date=analysis_start, end_date=analysis_end, chat_id=chat_id)), session)
+        if not api_messages:
+            logging.info(f"Нет сообщений для анализа в чате {chat_id}.")
+            continue
+        for index, prompt_id in enumerate(prompt_ids):
+            groups.setdefault(prompt_id, []).append(
+                (chat_id, index, api_messages))
+
+    for prompt_id, items in groups.items():
+        prompt = _load_prompts([prompt_id], session)[0]
+        for batch in _pack_batches(items):
+            # Пакеты небольшие по построению: модель выбираем только по объёму,
+            # а длину ответа — на каждый чат пакета (ответ — JSON с разделом на чат)
+            options = choose_model(
+                sum(len(m) for _, _, api_messages in batch for m in api_messages),
+                sections=len(batch))
+            with stage('llm'):
+                outputs = _run_batch(prompt, batch, session, options)
+            for (chat_id, index, _), (analysis_result, tokens_input, tokens_output, error_class) \
+                    in zip(batch, outputs):
+                result = results[chat_id][index]
+                result.update({
+                    "analysis_result": analysis_result,
+                    "tokens_input": tokens_input,
+                    "tokens_output": tokens_output,
+                    "filters": {**result["filters"], "model": options},
+                })
+                if error_class:
+                    result["error_class"] = error_class
+    return results
 
-def save_analysis_result(data):
+
+def summarize_chat(chat_id, now_nsk=None, max_backlog_hours=24, session=None):
+    """
+    Составляет сводки за все завершённые часы чата, которые ещё не просуммированы.
+    Пустые часы сохраняются без обращения к модели, чтобы покрытие окна было непрерывным.
+    """
+    from database.managers.activity_manager import ActivityManager
+    from database.managers.message_manager import MessageManager
+    from database.managers.summary_manager import SummaryManager
+    from utils.yandex_funcs import CompletionError, chatgpt_summarize
+    activity_manager = ActivityManager(session)
+    message_manager = MessageManager(session)
+    summary_manager = SummaryManager(session)
+
+    if now_nsk is None:
+        now_nsk = clock.now(novosibirsk_tz)
+    current_hour = now_nsk.astimezone(UTC).replace(
+        minute=0, second=0, microsecond=0, tzinfo=None)
+
+    last_end = summary_manager.get_last_period_end(chat_id)
+    earliest = current_hour - timedelta(hours=max_backlog_hours)
+    period_start = max(last_end, earliest) if last_end else current_hour - \
+        timedelta(hours=1)
+
+    created = 0
+    while period_start < current_hour:
+        period_end = period_start + timedelta(hours=1)
+        if ACTIVITY_ROLLUP and not activity_manager.has_activity(
+                chat_id, period_start, period_end - timedelta(microseconds=1)):
+            messages = []
+        else:
+            messages = message_manager.get_filtered_messages(
+                start_date=period_start,
+                end_date=period_end - timedelta(microseconds=1),
+                chat_id=chat_id
+            )
+        if messages:
+            try:
+                summary_text, _, _ = chatgpt_summarize(
+                    [msg.to_dict() for msg in messages], session)
+            except CompletionError as e:
+                # Не сохраняем пробел: дневной анализ дочитает эти сообщения сам
+                logging.warning(f"""Не удалось составить сводку для чата {
+                                chat_id} за {period_start} - {period_end}: {e}""")
+                break
+        else:
+            summary_text = ''
+        summary_manager.save_summary(
+            chat_id, period_start, period_end, summary_text, len(messages))
+        created += 1
+        period_start = period_end
+
+    return created
+
+
+def save_analysis_result(data, session=None):
     """
     Сохраняет результат анализа в базу данных.
+    data — результат analyze: список (по одному на промпт) или отдельный dict.
     """
-    logging.info(f"Сохранение результата анализа для чата {data['chat_id']}.")
     from database.managers.analysis_manager import AnalysisManager
-    analysis_manager = AnalysisManager()
-    if data["analysis_result"]:
-        analysis_manager.save_analysis_result(
-            data["prompt_id"],
-            data["analysis_result"],
-            data['filters'],
-            data["tokens_input"],
-            data["tokens_output"]
-        )
-        logging.info(f"Результат анализа сохранён для чата {data['chat_id']}.")
-    else:
-        logging.info(f"Для чата {data['chat_id']} нет анализа для сохранения.")
-
-
-def send_analysis_result(chat_id, analysis_result):
+    analysis_manager = AnalysisManager(session)
+    with stage('save'):
+        for item in data if isinstance(data, list) else [data]:
+            logging.info(f"Сохранение результата анализа для чата {item['chat_id']}.")
+            if item["analysis_result"]:
+                analysis_manager.save_analysis_result(
+                    item["prompt_id"],
+                    item["analysis_result"],
+                    item['filters'],
+                    item["tokens_input"],
+                    item["tokens_output"]
+                )
+                logging.info(f"Результат анализа сохранён для чата {item['chat_id']}.")
+            else:
+                logging.info(f"Для чата {item['chat_id']} нет анализа для сохранения.")
+
+
+def send_analysis_result(chat_id, analysis_result, session=None):
     """
     Отправляет результат анализа в Telegram.
+
+    :return: True, если сообщение отправлено.
     """
     bot = TeleBot(BOT_TOKEN)
 
-    chat = get_chat_name(chat_id)
+    chat = get_chat_name(chat_id, session)
 
     message_text = f"""Результат анализа для чата {
         chat}:\n\n{analysis_result}"""
 
     try:
-        bot.send_message(chat_id=CHAT_ID, text=message_text)
+        with stage('send'):
+            bot.send_message(chat_id=CHAT_ID, text=message_text)
         logging.info(f"""Результат анализа для чата {
                      chat_id} успешно отправлен.""")
+        return True
     except Exception as e:
+        if current_run():
+            current_run().outcome = 'error'
+            current_run().error_class = type(e).__name__
         logging.error(f"""Ошибка при отправке результата в Telegram для чата {
                       chat_id}: {e}""", exc_info=True)
+        return False
+    finally:
+        bot.stop_bot()
+
+
+def send_digest(sections):
+    """
+    Отправляет результаты нескольких чатов сводкой: упаковывает их в как можно
+    меньшее число сообщений (utils.digest.pack_digest).
+
+    :param sections: Список (название чата, результат анализа).
+    :return: (число отправленных сообщений, всего сообщений).
+    """
+    from utils.digest import pack_digest
+
+    bot = TeleBot(BOT_TOKEN)
+    messages = pack_digest(sections)
+    sent = 0
+    try:
+        for message_text in messages:
+            try:
+                with stage('send'):
+                    bot.send_message(chat_id=CHAT_ID, text=message_text)
+                sent += 1
+            except Exception as e:
+                if current_run():
+                    current_run().outcome = 'error'
+                    current_run().error_class = type(e).__name__
+                logging.error(f"""Ошибка при отправке сводки в Telegram: {e}""", exc_info=True)
     finally:
         bot.stop_bot()
+    logging.info(f"""Сводка по {len(sections)} чатам: отправлено {
+                 sent} из {len(messages)} сообщений.""")
+    return sent, len(messages)
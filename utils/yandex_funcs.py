@@ -1,9 +1,12 @@
 import os
 import logging
 import json
+from concurrent.futures import ThreadPoolExecutor
 import requests
 from dotenv import load_dotenv
 from utils import get_chat_name, get_user_name
+from database.db_globals import release_connection
+from utils.model_routing import DEFAULT_OPTIONS
 
 
 load_dotenv()
@@ -14,68 +17,394 @@ YANDEX_GPT_API_URL = os.getenv('YANDEX_GPT_API_URL')
 YANDEX_API_KEY = os.getenv('YANDEX_API_KEY')
 FOLDER_ID = os.getenv('FOLDER_ID')
 
+# Системный промпт для часовых сводок (инкрементальный режим)
+SUMMARY_PROMPT = os.getenv(
+    'SUMMARY_PROMPT',
+    "Кратко перескажи переписку за час: ключевые темы, решения, договорённости, "
+    "вопросы без ответа и участников, которые их подняли. Не добавляй ничего от себя."
+)
 
-# Функция анализа текста через YandexGPT
+
+class CompletionError(Exception):
+    """
+    Запрос к YandexGPT не выполнен: ошибка HTTP, сети или ответ без результата.
+    error_class — короткая причина для журнала запусков (например, «HTTP 429»).
+    """
+
+    def __init__(self, message, error_class):
+        super().__init__(message)
+        self.error_class = error_class
 
 
-def chatgpt_analyze(prompt, messages):
+def _message_json(user, chat, timestamp, text):
+    return json.dumps({
+        "user": user,
+        "chat": chat,
+        "timestamp": timestamp,
+        "text": text,
+    }, ensure_ascii=False)
+
+
+def format_messages(messages, user_name, chat_name):
     """
-    Анализирует сообщения через YandexGPT.
+    Превращает сообщения в JSON-строки для YandexGPT.
 
-    :param prompt: Текст системного промпта.
     :param messages: Список сообщений (JSON).
-    :return: Результат анализа.
+    :param user_name: Функция user_id -> имя пользователя.
+    :param chat_name: Функция chat_id -> название чата.
+    :return: Список JSON-строк с пользователем, чатом, временем и текстом.
     """
-    logging.info("Начало анализа набора сообщений.")
-
     api_messages = []
 
     for msg in messages:
         if "text" in msg and msg["text"]:
-            user = get_user_name(msg.get("user_id"))
-            chat = get_chat_name(msg.get("chat_id"))
-
-            message_data = {
-                "user": user,
-                "chat": chat,
-                "timestamp": msg.get("timestamp", "Неизвестно"),
-                "text": msg.get("text", "Пустое сообщение"),
-            }
-            api_messages.append(json.dumps(message_data, ensure_ascii=False))
-
-    headers = {
-        "Authorization": f"Api-Key {YANDEX_API_KEY}",
-        "Content-Type": "application/json"
-    }
+            api_messages.append(_message_json(
+                user_name(msg.get("user_id")),
+                chat_name(msg.get("chat_id")),
+                msg.get("timestamp", "Неизвестно"),
+                msg.get("text", "Пустое сообщение"),
+            ))
+
+    return api_messages
+
+
+def format_rows(rows, user_name, chat_name):
+    """
+    То же, что format_messages, для лёгких строк (user_id, chat_id, timestamp, text)
+    из MessageManager.iter_filtered_messages: строки кодируются по мере чтения.
+    """
+    return [
+        _message_json(
+            user_name(user_id),
+            chat_name(chat_id),
+            timestamp.isoformat() if timestamp else "Неизвестно",
+            text,
+        )
+        for user_id, chat_id, timestamp, text in rows if text
+    ]
+
+
+def format_rows_named(rows, user_names, chat_names):
+    """
+    format_rows со словарями имён вместо функций: кодирование можно вынести
+    в отдельный процесс, куда сессия БД не передаётся (backfill.py).
+    """
+    return format_rows(rows, user_names.get, chat_names.get)
+
+
+def _name_lookups(session):
+    # Имена запрашиваем один раз на пользователя/чат, а не на каждое сообщение
+    user_names = {}
+    chat_names = {}
+
+    def user_name(user_id):
+        if user_id not in user_names:
+            user_names[user_id] = get_user_name(user_id, session)
+        return user_names[user_id]
+
+    def chat_name(chat_id):
+        if chat_id not in chat_names:
+            chat_names[chat_id] = get_chat_name(chat_id, session)
+        return chat_names[chat_id]
+
+    return user_name, chat_name
+
+
+def encode_messages(messages, session=None):
+    """
+    Готовит список сообщений к отправке в YandexGPT.
+
+    :param messages: Список сообщений (JSON).
+    :param session: Сессия единицы работы (необязательно).
+    :return: Список JSON-строк с пользователем, чатом, временем и текстом.
+    """
+    return format_messages(messages, *_name_lookups(session))
 
-    payload = {
-        "modelUri": f"gpt://{FOLDER_ID}/yandexgpt-lite",
+
+def encode_rows(rows, session=None):
+    """
+    Готовит поток строк (user_id, chat_id, timestamp, text) к отправке в YandexGPT.
+
+    :return: Список JSON-строк, как у encode_messages.
+    """
+    return format_rows(rows, *_name_lookups(session))
+
+
+def build_payload(system_text, user_text, options=None):
+    """
+    Собирает тело запроса к YandexGPT.
+
+    :param options: Модель и параметры ответа (utils.model_routing.choose_model);
+                    по умолчанию — yandexgpt-lite.
+    """
+    options = options or DEFAULT_OPTIONS
+    return {
+        "modelUri": f"gpt://{FOLDER_ID}/{options['model']}",
         "completionOptions": {
             "stream": False,
-            "temperature": 0.6,
-            "maxTokens": 2000
+            "temperature": options["temperature"],
+            "maxTokens": options["maxTokens"]
         },
         "messages": [
-            {"role": "system", "text": prompt},
-            {"role": "user", "text": f"{api_messages}"}
+            {"role": "system", "text": system_text},
+            {"role": "user", "text": user_text}
         ]
     }
 
+
+def request_headers():
+    return {
+        "Authorization": f"Api-Key {YANDEX_API_KEY}",
+        "Content-Type": "application/json"
+    }
+
+
+def parse_response(response_data):
+    """
+    Извлекает текст ответа из ответа YandexGPT.
+
+    :return: Кортеж (текст ответа, токены запроса, токены ответа).
+    :raises CompletionError: В ответе нет результата.
+    """
+    if "result" in response_data:
+        analysis = response_data["result"]["alternatives"][0]["message"]["text"]
+        usage = response_data["result"].get("usage") or {}
+        # Счётчики токенов YandexGPT приходят строками
+        tokens_input = usage.get("inputTextTokens")
+        tokens_output = usage.get("completionTokens")
+        return (
+            analysis,
+            int(tokens_input) if tokens_input is not None else None,
+            int(tokens_output) if tokens_output is not None else None
+        )
+    else:
+        logging.error(f"Ошибка анализа: {response_data}")
+        raise CompletionError(f"Ответ YandexGPT без результата: {response_data}", 'NoResult')
+
+
+def _check_status(status_code, body):
+    if status_code >= 400:
+        raise CompletionError(
+            f"YandexGPT ответил {status_code}: {body[:200]}", f"HTTP {status_code}")
+
+
+def request_completion(system_text, user_text, options=None):
+    """
+    Отправляет запрос в YandexGPT.
+
+    :param system_text: Текст системного промпта.
+    :param user_text: Текст пользовательского сообщения.
+    :param options: Модель и параметры ответа (см. build_payload).
+    :return: Кортеж (текст ответа, токены запроса, токены ответа).
+    :raises CompletionError: Запрос не выполнен (HTTP-статус, сеть, ответ без результата).
+    """
     try:
         response = requests.post(
             YANDEX_GPT_API_URL,
-            headers=headers,
-            json=payload,
+            headers=request_headers(),
+            json=build_payload(system_text, user_text, options),
+            timeout=300
+        )
+        _check_status(response.status_code, response.text)
+        return parse_response(response.json())
+    except CompletionError:
+        raise
+    except Exception as e:
+        logging.error(f"Ошибка при вызове YandexGPT API: {e}")
+        raise CompletionError(f"Ошибка при вызове YandexGPT API: {e}", type(e).__name__) from e
+
+
+async def request_completion_async(client, system_text, user_text, options=None):
+    """
+    Асинхронный вариант request_completion.
+
+    :param client: httpx.AsyncClient.
+    """
+    try:
+        response = await client.post(
+            YANDEX_GPT_API_URL,
+            headers=request_headers(),
+            json=build_payload(system_text, user_text, options),
             timeout=300
         )
-        response_data = response.json()
-
-        if "result" in response_data:
-            analysis = response_data["result"]["alternatives"][0]["message"]["text"]
-            return analysis, None, None  # В YandexGPT пока нет токенов
-        else:
-            logging.error(f"Ошибка анализа: {response_data}")
-            return None, None, None
+        _check_status(response.status_code, response.text)
+        return parse_response(response.json())
+    except CompletionError:
+        raise
     except Exception as e:
         logging.error(f"Ошибка при вызове YandexGPT API: {e}")
-        return None, None, None
+        raise CompletionError(f"Ошибка при вызове YandexGPT API: {e}", type(e).__name__) from e
+
+
+# Дополнение системного промпта для пакетного запроса по нескольким чатам
+BATCH_INSTRUCTION = (
+    "\n\nНиже переписка нескольких независимых чатов, каждый в своём разделе "
+    "«=== ключ ===». Выполни инструкцию выше отдельно для каждого раздела, не смешивая чаты. "
+    "Ответь только JSON-объектом без пояснений: ключи — ключи разделов, "
+    "значения — строки с результатом для раздела."
+)
+
+
+def parse_batch_response(text, keys):
+    """
+    Разбирает ответ пакетного запроса.
+
+    :return: dict ключ раздела -> текст или None, если ответ не разобран
+             или в нём нет результата хотя бы для одного раздела.
+    """
+    if not text:
+        return None
+    # Модель иногда оборачивает JSON в ```json ... ``` или добавляет текст вокруг
+    body = text[text.find('{'):text.rfind('}') + 1]
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    results = {}
+    for key in keys:
+        value = data.get(key)
+        if not isinstance(value, str) or not value.strip():
+            return None
+        results[key] = value.strip()
+    return results
+
+
+def request_completions(prompts, user_text, options=None):
+    """
+    Отправляет один и тот же пользовательский текст с несколькими системными промптами
+    параллельно.
+
+    :return: Список кортежей (текст ответа, токены запроса, токены ответа) в порядке prompts.
+    :raises CompletionError: Хотя бы один запрос не выполнен.
+    """
+    if len(prompts) == 1:
+        return [request_completion(prompts[0], user_text, options)]
+    with ThreadPoolExecutor(max_workers=len(prompts)) as executor:
+        return list(executor.map(
+            lambda prompt: request_completion(prompt, user_text, options), prompts))
+
+
+# Функция анализа текста через YandexGPT
+
+
+def chatgpt_analyze(prompt, messages, session=None):
+    """
+    Анализирует сообщения через YandexGPT.
+
+    :param prompt: Текст системного промпта.
+    :param messages: Список сообщений (JSON).
+    :param session: Сессия единицы работы (необязательно).
+    :return: Результат анализа.
+    """
+    return chatgpt_analyze_many([prompt], messages, session)[0]
+
+
+def chatgpt_analyze_many(prompts, messages, session=None):
+    """
+    Анализирует один набор сообщений несколькими промптами: сообщения кодируются
+    один раз, запросы к модели идут параллельно.
+
+    :param prompts: Тексты системных промптов.
+    :return: Список кортежей (результат анализа, токены запроса, токены ответа).
+    """
+    return chatgpt_analyze_encoded(prompts, encode_messages(messages, session), session)
+
+
+def chatgpt_analyze_encoded(prompts, api_messages, session=None, options=None):
+    """
+    Анализирует уже закодированные сообщения (encode_messages / encode_rows).
+
+    :param options: Модель и параметры ответа (см. build_payload).
+
+    :return: Список кортежей (результат анализа, токены запроса, токены ответа).
+    """
+    logging.info(
+        f"Анализ {len(api_messages)} сообщений ({len(prompts)} промптов).")
+
+    release_connection(session)
+    return request_completions(prompts, f"{api_messages}", options)
+
+
+def chatgpt_summarize(messages, session=None):
+    """
+    Составляет сводку сообщений за один час.
+
+    :param messages: Список сообщений (JSON).
+    :param session: Сессия единицы работы (необязательно).
+    :return: Кортеж (текст сводки, токены запроса, токены ответа).
+    """
+    logging.info("Составление часовой сводки сообщений.")
+
+    api_messages = encode_messages(messages, session)
+    release_connection(session)
+    return request_completion(SUMMARY_PROMPT, f"{api_messages}")
+
+
+def chatgpt_compose(prompt, summaries, messages, session=None):
+    """
+    Выполняет итоговый анализ по часовым сводкам и несвёрнутому хвосту сообщений.
+
+    :param prompt: Текст системного промпта.
+    :param summaries: Список сводок (dict с period_start, period_end, summary_text).
+    :param messages: Сообщения, не покрытые сводками (JSON).
+    :param session: Сессия единицы работы (необязательно).
+    :return: Кортеж (результат анализа, токены запроса, токены ответа).
+    """
+    return chatgpt_compose_many([prompt], summaries, messages, session)[0]
+
+
+def chatgpt_compose_many(prompts, summaries, messages, session=None):
+    """
+    То же, что chatgpt_compose, для нескольких промптов над одними данными.
+
+    :return: Список кортежей (результат анализа, токены запроса, токены ответа).
+    """
+    return chatgpt_compose_encoded(
+        prompts, summaries, encode_messages(messages, session), session)
+
+
+def chatgpt_compose_encoded(prompts, summaries, api_messages, session=None, options=None):
+    """
+    То же, что chatgpt_compose_many, для уже закодированных сообщений.
+
+    :param options: Модель и параметры ответа (см. build_payload).
+    """
+    logging.info(
+        f"Анализ по {len(summaries)} сводкам и {len(api_messages)} сообщениям.")
+
+    api_summaries = [
+        json.dumps({
+            "period_start": s["period_start"],
+            "period_end": s["period_end"],
+            "summary": s["summary_text"],
+        }, ensure_ascii=False)
+        for s in summaries if s["summary_text"]
+    ]
+
+    user_text = (
+        f"Сводки переписки по часам:\n{api_summaries}\n\n"
+        f"Сообщения, не вошедшие в сводки:\n{api_messages}"
+    )
+    release_connection(session)
+    return request_completions(prompts, user_text, options)
+
+
+def chatgpt_analyze_batch(prompt, sections, session=None, options=None):
+    """
+    Анализирует несколько небольших чатов одним запросом с общим системным промптом.
+
+    :param sections: Список (ключ раздела, закодированные сообщения).
+    :param options: Модель и параметры ответа (см. build_payload).
+    :return: Кортеж (dict ключ -> результат или None, если ответ не разобран,
+             токены запроса, токены ответа).
+    """
+    logging.info(f"Пакетный анализ {len(sections)} чатов одним запросом.")
+
+    user_text = "\n\n".join(
+        f"=== {key} ===\n{api_messages}" for key, api_messages in sections)
+    release_connection(session)
+    text, tokens_input, tokens_output = request_completion(
+        prompt + BATCH_INSTRUCTION, user_text, options)
+    return parse_batch_response(text, [key for key, _ in sections]), tokens_input, tokens_output